@@ -1,14 +1,17 @@
 from django.contrib import admin
 
 from .models import (
-    EmailCampaign, EmailLog, EmailSendCandidate, EmailTemplate,
-    Recipient, UserProfile, EmailEvent, CampaignStatistics
+    DerivedEmailLog, EmailCampaign, EmailLog, EmailSendCandidate, EmailTemplate,
+    Recipient, UserProfile, EmailEvent, CampaignStatistics, RecipientImportJob, Segment,
+    SuppressedAddress
 )
+from .segments import delete_recipients, refresh_segments
 
 
 @admin.register(EmailEvent)
 class EmailEventAdmin(admin.ModelAdmin):
     list_display = ('email_candidate', 'event_type', 'timestamp', 'ip_address')
+    list_select_related = ('email_candidate__recipient', 'email_candidate__template')
     list_filter = ('event_type', 'timestamp')
     search_fields = ('email_candidate__recipient__email',)
     readonly_fields = ('timestamp',)
@@ -20,6 +23,7 @@ class CampaignStatisticsAdmin(admin.ModelAdmin):
         'campaign', 'sent_count', 'delivered_count', 'unique_opens',
         'unique_clicks', 'open_rate', 'click_rate', 'bounce_rate', 'last_updated'
     )
+    list_select_related = ('campaign',)
     readonly_fields = ('last_updated',)
     actions = ['refresh_statistics']
 
@@ -30,9 +34,78 @@ class CampaignStatisticsAdmin(admin.ModelAdmin):
     refresh_statistics.short_description = "Refresh selected campaign statistics"
 
 
+@admin.register(RecipientImportJob)
+class RecipientImportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'original_name', 'user_profile', 'status', 'rows_done', 'inserted_count',
+        'updated_count', 'failed_count', 'created_at', 'completed_at'
+    )
+    list_select_related = ('user_profile__user',)
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'updated_at', 'completed_at')
+
+
+@admin.register(Segment)
+class SegmentAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user_profile', 'member_count', 'refreshed_at', 'created_at')
+    list_select_related = ('user_profile__user',)
+    readonly_fields = ('member_count', 'refreshed_at', 'created_at')
+
+
+@admin.register(SuppressedAddress)
+class SuppressedAddressAdmin(admin.ModelAdmin):
+    list_display = ('email', 'user_profile', 'reason', 'created_at')
+    list_select_related = ('user_profile__user',)
+    list_filter = ('reason',)
+    search_fields = ('email',)
+    readonly_fields = ('created_at',)
+
+
+@admin.register(DerivedEmailLog)
+class DerivedEmailLogAdmin(admin.ModelAdmin):
+    """Email logs read from sent/failed events; used when EMAIL_LOG_FROM_EVENTS is set."""
+    list_display = ('recipient', 'status', 'campaign', 'user_profile', 'sent_time')
+    list_select_related = ('campaign', 'user_profile__user')
+    list_filter = ('status',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(EmailSendCandidate)
+class EmailSendCandidateAdmin(admin.ModelAdmin):
+    # Read by EmailSendCandidate.__str__
+    list_select_related = ('recipient', 'template')
+
+
+@admin.register(Recipient)
+class RecipientAdmin(admin.ModelAdmin):
+    list_select_related = ('user_profile__user',)
+    search_fields = ('email',)
+
+    # Segment membership is kept in step here rather than by signals on Recipient
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        refresh_segments(obj.user_profile_id, Recipient.objects.filter(pk=obj.pk))
+
+    def delete_model(self, request, obj):
+        delete_recipients(Recipient.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_recipients(queryset)
+
+
+@admin.register(UserProfile)
+class UserProfileAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)
+
+
 admin.site.register(EmailTemplate)
-admin.site.register(EmailSendCandidate)
 admin.site.register(EmailLog)
-admin.site.register(Recipient)
 admin.site.register(EmailCampaign)
-admin.site.register(UserProfile)
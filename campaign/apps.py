@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class CampaignConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "campaign"
+
+    def ready(self):
+        from campaign import lookups  # noqa: F401 (registers the lookups)
+        from campaign.derived_logs import create_log_view, drop_log_view
+
+        pre_migrate.connect(drop_log_view, sender=self)
+        post_migrate.connect(create_log_view, sender=self)
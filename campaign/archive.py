@@ -0,0 +1,233 @@
+"""
+Cold archive of old EmailEvent rows in compressed local files.
+
+Events from whole months before a cutoff are streamed into one gzip file per
+campaign per month. A file starts with a JSON header line and is followed by
+row groups, each a JSON object with one list per column, so similar values
+sit next to each other and compress well and reports can read only the
+columns they need. A file is written under a temporary name, read back and
+checked against the rows written, and only then moved into place. Its rows
+are then deleted from the database in short transactions.
+
+Archived events still count in CampaignStatistics: each chunk deletion adds
+its totals per event type to archived_event_counts and records the archived
+event types on the affected EmailSendCandidate rows, for unique counts.
+"""
+import gzip
+import json
+import os
+from collections import Counter, defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Concat, TruncMonth
+from django.utils import timezone
+
+from campaign.models import CampaignStatistics, EmailEvent, EmailSendCandidate
+from campaign.partitions import month_start, next_month
+
+ARCHIVE_FORMAT = "djangomailer-events"
+ARCHIVE_VERSION = 1
+
+ARCHIVE_COLUMNS = [
+    "id",
+    "email_candidate_id",
+    "recipient_email",
+    "event_type",
+    "timestamp",
+    "ip_address",
+    "user_agent",
+    "metadata",
+]
+
+# Rows per row group, which is also the database fetch size
+ROW_GROUP_SIZE = 5000
+
+# Rows deleted per transaction
+DELETE_CHUNK_SIZE = 1000
+
+
+class ArchiveVerificationError(Exception):
+    """Raised when an archive file does not read back as written."""
+
+
+def archive_root():
+    return Path(settings.EVENT_ARCHIVE_ROOT)
+
+
+def archive_cutoff(days, now=None):
+    """Start of the month containing the instant `days` ago; only earlier months are archived."""
+    return month_start((now or timezone.now()) - timedelta(days=days))
+
+
+def campaign_archive_dir(root, user_profile_id, campaign_id):
+    return Path(root) / f"user_{user_profile_id}" / f"campaign_{campaign_id or 'none'}"
+
+
+def archive_files(root, user_profile_id, campaign_id, month=None):
+    """Archive files of a campaign, optionally of one month, in name order."""
+    pattern = f"{month:%Y-%m}*.events.jsonl.gz" if month else "*.events.jsonl.gz"
+    return sorted(campaign_archive_dir(root, user_profile_id, campaign_id).glob(pattern))
+
+
+def _month_events(user_profile_id, campaign_id, month):
+    # The timestamp range lets PostgreSQL scan only the month's partition
+    return EmailEvent.objects.filter(
+        email_candidate__user_profile_id=user_profile_id,
+        email_candidate__campaign_id=campaign_id,
+        timestamp__gte=month,
+        timestamp__lt=next_month(month),
+    )
+
+
+def write_archive(path, rows):
+    """
+    Write rows (dicts keyed by ARCHIVE_COLUMNS) to an archive file and verify it.
+
+    Returns:
+        List of the ids written, in order
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    ids = []
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+        fh.write(json.dumps({"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION, "columns": ARCHIVE_COLUMNS}))
+        fh.write("\n")
+        group = []
+        for row in rows:
+            group.append(row)
+            ids.append(row["id"])
+            if len(group) >= ROW_GROUP_SIZE:
+                _write_row_group(fh, group)
+                group = []
+        if group:
+            _write_row_group(fh, group)
+
+    archived_ids = [event_id for group in read_row_groups(tmp_path, ["id"]) for event_id in group["id"]]
+    if archived_ids != ids:
+        os.remove(tmp_path)
+        raise ArchiveVerificationError(f"{path} does not match the {len(ids)} rows written")
+    os.replace(tmp_path, path)
+    return ids
+
+
+def _write_row_group(fh, group):
+    columns = {column: [row[column] for row in group] for column in ARCHIVE_COLUMNS}
+    fh.write(json.dumps({"rows": len(group), "columns": columns}, cls=DjangoJSONEncoder))
+    fh.write("\n")
+
+
+def read_row_groups(path, columns=None):
+    """
+    Yield the row groups of an archive file as dicts of column lists.
+
+    Args:
+        path: Archive file
+        columns: Optional list of the columns to return (default: all)
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        header = json.loads(fh.readline())
+        if header.get("format") != ARCHIVE_FORMAT:
+            raise ArchiveVerificationError(f"{path} is not an event archive")
+        for line in fh:
+            group = json.loads(line)
+            if any(len(values) != group["rows"] for values in group["columns"].values()):
+                raise ArchiveVerificationError(f"{path} has a row group with uneven columns")
+            yield {column: group["columns"][column] for column in columns or header["columns"]}
+
+
+def read_archive(path):
+    """Yield the events of an archive file as dicts, one per row."""
+    for group in read_row_groups(path):
+        columns = list(group)
+        for values in zip(*group.values()):
+            yield dict(zip(columns, values))
+
+
+def delete_archived(path, user_profile_id, campaign_id, month):
+    """
+    Delete the events listed in an archive file from the database.
+
+    Runs one transaction per DELETE_CHUNK_SIZE ids and only counts rows that
+    are still present, so resuming after an interrupted run is safe.
+
+    Returns:
+        Number of events deleted
+    """
+    ids = [event_id for group in read_row_groups(path, ["id"]) for event_id in group["id"]]
+    deleted = 0
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        with transaction.atomic():
+            chunk = ids[start:start + DELETE_CHUNK_SIZE]
+            events = _month_events(user_profile_id, campaign_id, month).filter(id__in=chunk)
+            present = list(events.values_list("email_candidate_id", "event_type"))
+            if not present:
+                continue
+            if campaign_id:
+                _record_archived(campaign_id, present)
+            deleted += events.delete()[0]
+    return deleted
+
+
+def _record_archived(campaign_id, events):
+    """Keep the campaign's statistics counting events that leave the database."""
+    stats, _ = CampaignStatistics.objects.select_for_update().get_or_create(campaign_id=campaign_id)
+    counts = Counter(stats.archived_event_counts)
+    counts.update(event_type for _, event_type in events)
+    stats.archived_event_counts = dict(counts)
+    stats.save(update_fields=["archived_event_counts"])
+
+    candidates_by_type = defaultdict(set)
+    for candidate_id, event_type in events:
+        candidates_by_type[event_type].add(candidate_id)
+    for event_type, candidate_ids in candidates_by_type.items():
+        marker = f",{event_type},"
+        EmailSendCandidate.objects.filter(id__in=candidate_ids).exclude(
+            archived_event_types__contains=marker
+        ).update(archived_event_types=Case(
+            When(archived_event_types="", then=Value(marker)),
+            default=Concat(F("archived_event_types"), Value(f"{event_type},")),
+        ))
+
+
+def archivable_months(cutoff):
+    """(user_profile_id, campaign_id, month) of every campaign month with events before cutoff."""
+    return (
+        EmailEvent.objects.filter(timestamp__lt=cutoff)
+        .annotate(month=TruncMonth("timestamp", tzinfo=dt_timezone.utc))
+        .values_list("email_candidate__user_profile_id", "email_candidate__campaign_id", "month")
+        .distinct()
+        .order_by("email_candidate__user_profile_id", "email_candidate__campaign_id", "month")
+    )
+
+
+def archive_campaign_month(root, user_profile_id, campaign_id, month):
+    """
+    Archive and delete one campaign's events for one month.
+
+    Files left by an interrupted run are finished first; rows still in the
+    database afterwards go into a new numbered part file.
+
+    Returns:
+        Tuple of (events archived, events deleted)
+    """
+    deleted = sum(
+        delete_archived(path, user_profile_id, campaign_id, month)
+        for path in archive_files(root, user_profile_id, campaign_id, month)
+    )
+    events = _month_events(user_profile_id, campaign_id, month).order_by("id")
+    if not events.exists():
+        return 0, deleted
+
+    parts = len(archive_files(root, user_profile_id, campaign_id, month))
+    name = f"{month:%Y-%m}.{parts}.events.jsonl.gz" if parts else f"{month:%Y-%m}.events.jsonl.gz"
+    path = campaign_archive_dir(root, user_profile_id, campaign_id) / name
+    columns = [column for column in ARCHIVE_COLUMNS if column != "recipient_email"]
+    rows = events.values(*columns, recipient_email=F("email_candidate__recipient_email"))
+    archived = len(write_archive(path, rows.iterator(chunk_size=ROW_GROUP_SIZE)))
+    return archived, deleted + delete_archived(path, user_profile_id, campaign_id, month)
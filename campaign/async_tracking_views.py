@@ -0,0 +1,187 @@
+"""
+Async versions of the tracking views, for deployments under an ASGI server.
+
+They answer the same URLs with the same responses as campaign.tracking_views
+and are routed instead of them when settings.TRACKING_ASYNC is set. The
+open pixel and click redirect return at once and leave their event to the
+batched background writer in campaign.event_writer, so an open storm does
+not hold a worker per request. The webhooks wait for their writes, since
+providers retry on anything but a final answer.
+
+Run them under ASGI only: under WSGI every request gets its own event loop,
+which is closed before the background writer can finish.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from campaign import metrics
+from campaign.event_writer import TrackingHit, get_event_writer
+from campaign.models import EmailEvent, EmailSendCandidate, Recipient
+from campaign.suppression import should_suppress, suppress_addresses
+from campaign.tracking_views import TRACKING_PIXEL, get_client_ip
+from campaign.webhooks import (
+    MAX_BATCH_EVENTS, WebhookPayloadError, alatest_sent_candidate, build_event, event_sender_domain, parse_events,
+    process_events
+)
+
+
+async def record_hit(request, tracking_id, event_type, metadata):
+    """Hand an open or click to the background writer; errors never reach the recipient."""
+    try:
+        await get_event_writer().record(TrackingHit(
+            tracking_id=tracking_id,
+            event_type=event_type,
+            ip_address=get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            metadata={**metadata, 'timestamp': timezone.now().isoformat()},
+        ))
+    except Exception:
+        pass
+
+
+@require_http_methods(["GET"])
+async def tracking_pixel(request, tracking_id):
+    """
+    Serve a 1x1 transparent pixel and queue an email open event.
+
+    Args:
+        request: Django request object
+        tracking_id: UUID tracking ID of the email
+
+    Returns:
+        1x1 transparent GIF image
+    """
+    metrics.TRACKING_HITS.inc(kind="open")
+    # first_open is decided when the batch is written
+    await record_hit(request, tracking_id, 'opened', {})
+    return HttpResponse(TRACKING_PIXEL, content_type='image/gif')
+
+
+@require_http_methods(["GET"])
+async def tracking_click(request, tracking_id):
+    """
+    Queue a link click event and redirect to the original URL.
+
+    Args:
+        request: Django request object
+        tracking_id: UUID tracking ID of the email
+
+    Returns:
+        Redirect to the original URL
+    """
+    original_url = request.GET.get('url', '/')
+    metrics.TRACKING_HITS.inc(kind="click")
+    await record_hit(request, tracking_id, 'clicked', {'url': original_url})
+    return HttpResponseRedirect(original_url)
+
+
+async def find_candidate(data):
+    """The email a bounce or delivery notification refers to, by tracking_id or address."""
+    tracking_id = data.get('tracking_id')
+    if tracking_id:
+        try:
+            return await EmailSendCandidate.objects.aget(tracking_id=tracking_id)
+        except (EmailSendCandidate.DoesNotExist, ValidationError, ValueError):
+            # An unknown or malformed tracking_id falls back to the address
+            pass
+    recipient_email = data.get('email')
+    if recipient_email:
+        return await alatest_sent_candidate(recipient_email, event_sender_domain(data))
+    return None
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def bounce_webhook(request):
+    """
+    Handle bounce notifications; see campaign.tracking_views.bounce_webhook.
+
+    Returns:
+        JSON response with status
+    """
+    try:
+        data = json.loads(request.body)
+        email_candidate = await find_candidate(data)
+        if not email_candidate:
+            return JsonResponse({'status': 'error', 'message': 'Email candidate not found'}, status=404)
+
+        event_type = data.get('event', 'bounced')
+        if event_type not in ['bounced', 'complained', 'failed']:
+            event_type = 'bounced'
+
+        # A retried notification hits the unique idempotency key and is ignored
+        await EmailEvent.objects.abulk_create(
+            [build_event(event_type, email_candidate.id, data)], ignore_conflicts=True
+        )
+
+        # Hard bounces and complaints are never sent to again
+        if should_suppress(event_type, data.get('bounce_type')):
+            # recipient_email is only filled in once sent; fall back to the recipient as the sync view reads it
+            address = email_candidate.recipient_email or await Recipient.objects.filter(
+                id=email_candidate.recipient_id
+            ).values_list("email", flat=True).afirst()
+            await sync_to_async(suppress_addresses)(email_candidate.user_profile_id, [address], event_type)
+
+        return JsonResponse({'status': 'success', 'message': 'Event recorded'})
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def delivery_webhook(request):
+    """
+    Handle delivery confirmations; see campaign.tracking_views.delivery_webhook.
+
+    Returns:
+        JSON response with status
+    """
+    try:
+        data = json.loads(request.body)
+        email_candidate = await find_candidate(data)
+        if not email_candidate:
+            return JsonResponse({'status': 'error', 'message': 'Email candidate not found'}, status=404)
+
+        # Recorded once per candidate: repeats hit the unique idempotency key and are ignored
+        await EmailEvent.objects.abulk_create(
+            [build_event('delivered', email_candidate.id, data)], ignore_conflicts=True
+        )
+        return JsonResponse({'status': 'success', 'message': 'Delivery recorded'})
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def events_webhook(request):
+    """
+    Handle a batch of delivery, bounce and complaint events; see
+    campaign.tracking_views.events_webhook.
+
+    Returns:
+        JSON response with one result per event, in request order
+    """
+    try:
+        items = parse_events(request.body)
+    except WebhookPayloadError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    if len(items) > MAX_BATCH_EVENTS:
+        return JsonResponse(
+            {'status': 'error', 'message': f'At most {MAX_BATCH_EVENTS} events per request'},
+            status=413
+        )
+
+    # process_events writes the batch in a transaction, which the async ORM does not offer
+    results = await sync_to_async(process_events)(items)
+    return JsonResponse({
+        'status': 'success',
+        'recorded': sum(1 for result in results if result['status'] == 'recorded'),
+        'results': results,
+    })
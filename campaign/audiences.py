@@ -0,0 +1,236 @@
+"""
+Campaign audience selection.
+
+Candidates for a campaign are created inside the database with a single
+INSERT ... SELECT over the recipient queryset, so selecting a large audience
+never pulls recipient rows into Python.
+"""
+import functools
+import sqlite3
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+
+from campaign.models import EmailCampaign, EmailSendCandidate, Recipient
+from campaign.suppression import exclude_suppressed
+
+# Columns of RecipientFilterForm that are matched with a substring search
+RECIPIENT_FILTER_FIELDS = [
+    "first_name",
+    "last_name",
+    "company",
+    "email",
+    "country",
+    "city",
+    "free_field1",
+    "free_field2",
+    "free_field3",
+]
+
+# FTS5 trigram side table created on SQLite by migration 0013
+RECIPIENT_SEARCH_TABLE = "campaign_recipient_search"
+
+# The trigram index can only serve terms of at least three characters
+MIN_TRIGRAM_LENGTH = 3
+
+# Batch size of the bulk_create fallback for databases without INSERT ... SELECT support
+CANDIDATE_BATCH_SIZE = 5000
+
+# SQL expressions generating a random tracking_id inside the database
+TRACKING_ID_SQL = {
+    "postgresql": "gen_random_uuid()",
+    # UUIDField is stored as 32 hex characters on SQLite
+    "sqlite": "lower(hex(randomblob(16)))",
+}
+
+
+def filter_recipients_queryset(user_profile, filters):
+    """
+    Recipients of a user profile matching RecipientFilterForm data.
+
+    Every filter is a case-insensitive substring match. On PostgreSQL the
+    trigram_contains lookup is served by the pg_trgm indexes; on SQLite the
+    matching ids are looked up in the FTS5 trigram table first.
+
+    Args:
+        user_profile: The UserProfile that owns the recipients
+        filters: Cleaned data of a RecipientFilterForm
+
+    Returns:
+        Recipient queryset
+    """
+    qs = Recipient.objects.filter(user_profile=user_profile)
+    terms = {field: filters[field] for field in RECIPIENT_FILTER_FIELDS if filters.get(field)}
+    for field, term in terms.items():
+        qs = qs.filter(**{f"{field}__trigram_contains": term})
+
+    search_sql, search_params = _search_table_filter(terms)
+    if search_sql:
+        qs = qs.filter(id__in=RawSQL(search_sql, search_params))
+    return qs
+
+
+def _search_table_filter(terms):
+    """
+    SQL selecting the ids of recipients matching `terms` from the SQLite
+    trigram table, or (None, None) when the table cannot serve the search.
+    """
+    if connection.vendor != "sqlite" or not sqlite_has_trigram_fts():
+        return None, None
+
+    conditions = []
+    params = []
+    for field, term in terms.items():
+        # Short terms and LIKE wildcards are left to the plain filter
+        if len(term) < MIN_TRIGRAM_LENGTH or any(char in term for char in "%_\\"):
+            continue
+        conditions.append(f"{field} LIKE %s")
+        params.append(f"%{term}%")
+    if not conditions:
+        return None, None
+    return f"SELECT rowid FROM {RECIPIENT_SEARCH_TABLE} WHERE {' AND '.join(conditions)}", params
+
+
+@functools.cache
+def sqlite_has_trigram_fts():
+    """
+    Whether the SQLite library has FTS5 with the trigram tokenizer, the check
+    migration 0013 makes before creating the search table.
+
+    Probed on a private in-memory database, so the answer never depends on
+    which queries ran first and costs no query on the Django connection.
+    """
+    probe = sqlite3.connect(":memory:")
+    try:
+        probe.execute("CREATE VIRTUAL TABLE fts5_probe USING fts5(x, tokenize='trigram')")
+    except sqlite3.Error:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def campaign_audience_queryset(campaign):
+    """
+    Recipients a just-in-time campaign draws its batches from: the members of
+    its segment, or the matches of its stored filter.
+    """
+    if campaign.segment_id:
+        return Recipient.objects.filter(segment_memberships__segment_id=campaign.segment_id)
+    return filter_recipients_queryset(campaign.user_profile_id, campaign.audience_filter)
+
+
+def parse_recipient_ids(value):
+    """
+    Parse the comma-separated recipient IDs posted by the campaign form.
+    """
+    return [int(part) for part in value.split(",") if part.strip().isdigit()]
+
+
+def create_candidates(campaign, recipients):
+    """
+    Create an EmailSendCandidate for every recipient in a queryset.
+
+    On PostgreSQL and SQLite this is one INSERT ... SELECT statement; other
+    databases stream recipient IDs and use chunked bulk_create. Suppressed
+    addresses are left out in both cases.
+
+    Args:
+        campaign: The EmailCampaign to create candidates for
+        recipients: Recipient queryset (already scoped to the campaign's owner)
+
+    Returns:
+        Number of candidates created
+    """
+    recipients = exclude_suppressed(recipients)
+    tracking_id_sql = TRACKING_ID_SQL.get(connection.vendor)
+    if tracking_id_sql is None:
+        return _bulk_create_candidates(campaign, recipients)
+
+    opts = EmailSendCandidate._meta
+    quote = connection.ops.quote_name
+    columns = [
+        "user_profile_id", "recipient_id", "template_id", "scheduled_time", "sent", "campaign_id",
+        "recipient_email", "sender_domain", "archived_event_types", "tracking_id",
+    ]
+    recipient_sql, recipient_params = (
+        recipients.order_by().values("id", email_lower=Lower("email")).query.sql_with_params()
+    )
+    scheduled_time = opts.get_field("scheduled_time").get_db_prep_value(campaign.scheduled_time, connection)
+
+    sql = (
+        f"INSERT INTO {quote(opts.db_table)} ({', '.join(quote(column) for column in columns)}) "
+        f"SELECT %s, audience.id, %s, %s, %s, %s, audience.email_lower, %s, %s, {tracking_id_sql} "
+        f"FROM ({recipient_sql}) audience"
+    )
+    params = [campaign.user_profile_id, campaign.template_id, scheduled_time, False, campaign.id, "", ""]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params + list(recipient_params))
+        return cursor.rowcount
+
+
+def _bulk_create_candidates(campaign, recipients):
+    created = 0
+    batch = []
+    rows = recipients.order_by().values_list("id", Lower("email")).iterator(chunk_size=CANDIDATE_BATCH_SIZE)
+    with transaction.atomic():
+        for recipient_id, recipient_email in rows:
+            batch.append(EmailSendCandidate(
+                user_profile_id=campaign.user_profile_id,
+                recipient_id=recipient_id,
+                recipient_email=recipient_email,
+                template_id=campaign.template_id,
+                scheduled_time=campaign.scheduled_time,
+                campaign=campaign,
+            ))
+            if len(batch) >= CANDIDATE_BATCH_SIZE:
+                EmailSendCandidate.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            EmailSendCandidate.objects.bulk_create(batch)
+            created += len(batch)
+    return created
+
+
+def materialize_candidates(campaign, limit):
+    """
+    Create candidates for the next `limit` recipients of a just-in-time audience.
+
+    The campaign's cursor is advanced with a conditional UPDATE in the same
+    transaction as the insert, so two concurrent senders never queue the
+    same recipients twice.
+
+    Args:
+        campaign: An EmailCampaign with an audience_filter
+        limit: Maximum number of candidates to create
+
+    Returns:
+        Number of candidates created
+    """
+    if limit <= 0 or campaign.audience_exhausted:
+        return 0
+
+    remaining = campaign_audience_queryset(campaign).filter(id__gt=campaign.audience_cursor)
+    # Id of the last recipient in this batch; None when fewer than `limit` are left
+    boundary = remaining.order_by("id").values_list("id", flat=True)[limit - 1:limit].first()
+    if boundary is None:
+        batch = remaining
+        new_cursor = remaining.order_by("-id").values_list("id", flat=True).first() or campaign.audience_cursor
+    else:
+        batch = remaining.filter(id__lte=boundary)
+        new_cursor = boundary
+    exhausted = boundary is None
+
+    with transaction.atomic():
+        claimed = EmailCampaign.objects.filter(
+            pk=campaign.pk, audience_cursor=campaign.audience_cursor
+        ).update(audience_cursor=new_cursor, audience_exhausted=exhausted)
+        if not claimed:
+            return 0
+        created = create_candidates(campaign, batch)
+
+    campaign.audience_cursor = new_cursor
+    campaign.audience_exhausted = exhausted
+    return created
@@ -0,0 +1,283 @@
+"""
+Shared plumbing for the benchmark_* management commands.
+
+Benchmarks seed their own data into a freshly migrated test database (never
+the configured one), measure wall time, query counts and peak RSS, and save
+their results as JSON. A previous result file can be passed as a baseline;
+metrics that got worse by more than the allowed percentage are reported as
+regressions.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from campaign.models import EmailCampaign, EmailSendCandidate, EmailTemplate, Recipient
+
+# Default directory for result files
+RESULTS_DIR = "benchmark-results"
+
+BENCHMARK_USERNAME = "bench-tenant-{index}"
+
+
+@contextmanager
+def benchmark_database():
+    """Run the block against a new, migrated test database that is destroyed afterwards."""
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class QueryCounter:
+    """
+    Counts the SQL statements run inside the block, on this thread's
+    connection and on any connection that worker threads open meanwhile.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+        with self._lock:
+            self._connections.append(connection)
+
+    @contextmanager
+    def counting(self):
+        self._install(None, connection)
+        connection_created.connect(self._install)
+        try:
+            yield self
+        finally:
+            connection_created.disconnect(self._install)
+            for wrapper in self._connections:
+                if self in wrapper.execute_wrappers:
+                    wrapper.execute_wrappers.remove(self)
+
+
+class Stopwatch:
+    """Wall-clock seconds spent inside the block."""
+
+    seconds = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self._started
+
+
+def per_second(count, seconds):
+    """Rate of `count` things over `seconds`, or None when the run was too short to time."""
+    return round(count / seconds, 1) if seconds else None
+
+
+def peak_rss_mb():
+    """Highest resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed_tenants(count, first_index=0, **profile_fields):
+    """
+    Create benchmark users, each with a template and a campaign.
+
+    Returns:
+        List of (UserProfile, EmailTemplate, EmailCampaign) tuples
+    """
+    tenants = []
+    for index in range(first_index, first_index + count):
+        user = User.objects.create_user(username=BENCHMARK_USERNAME.format(index=index))
+        profile = user.profile
+        profile.from_email = f"sender@tenant{index}.example.com"
+        for field, value in profile_fields.items():
+            setattr(profile, field, value)
+        profile.save()
+        template = EmailTemplate.objects.create(
+            user_profile=profile,
+            name="Benchmark",
+            subject="Benchmark for {first_name}",
+            body="Hello {first_name} {last_name} of {company},\n\nRead more at https://example.com/offer?id=1\n",
+        )
+        campaign = EmailCampaign.objects.create(
+            user_profile=profile, name="Benchmark", template=template, scheduled_time=timezone.now()
+        )
+        tenants.append((profile, template, campaign))
+    return tenants
+
+
+def seed_recipients(profile, count, domain="example.com", batch_size=1000):
+    """Create `count` recipients for a user profile, yielding each created batch."""
+    for start in range(0, count, batch_size):
+        yield Recipient.objects.bulk_create(
+            Recipient(
+                user_profile=profile,
+                first_name=f"First{number}",
+                last_name=f"Last{number}",
+                company=f"Company {number % 100}",
+                email=f"recipient{number}@{domain}",
+            )
+            for number in range(start, min(start + batch_size, count))
+        )
+
+
+def seed_candidates(tenants, count, batch_size=1000):
+    """
+    Queue `count` emails spread evenly over the tenants, one new recipient each.
+
+    Returns:
+        Number of candidates created
+    """
+    created = 0
+    scheduled_time = timezone.now()
+    for position, (profile, template, campaign) in enumerate(tenants):
+        share = count // len(tenants) + (1 if position < count % len(tenants) else 0)
+        for recipients in seed_recipients(profile, share, f"tenant{position}.example.com", batch_size):
+            EmailSendCandidate.objects.bulk_create(
+                EmailSendCandidate(
+                    user_profile=profile,
+                    recipient=recipient,
+                    template=template,
+                    campaign=campaign,
+                    scheduled_time=scheduled_time,
+                    recipient_email=recipient.email,
+                )
+                for recipient in recipients
+            )
+            created += len(recipients)
+    return created
+
+
+def add_result_arguments(parser, name):
+    """Add the --output, --baseline and --max-regression options of a benchmark command."""
+    parser.add_argument("--output", help=f"Result file (default: {RESULTS_DIR}/{name}-<timestamp>.json)")
+    parser.add_argument("--baseline", help="Result file of an earlier run to compare with")
+    parser.add_argument(
+        "--max-regression", type=float, default=10, help="Allowed change against --baseline in percent"
+    )
+
+
+def write_results(name, parameters, results, output=None):
+    """
+    Save a benchmark run as JSON.
+
+    Args:
+        name: Benchmark name, e.g. "send"
+        parameters: Dict of the options the run used
+        results: Dict of measured values
+        output: File path (default: RESULTS_DIR/<name>-<timestamp>.json)
+
+    Returns:
+        (path written, full result document)
+    """
+    started_at = timezone.now()
+    document = {
+        "benchmark": name,
+        "created_at": started_at.isoformat(),
+        "commit": git_commit(),
+        "database": connection.vendor,
+        "python": sys.version.split()[0],
+        "parameters": parameters,
+        "results": results,
+    }
+    if output is None:
+        output = os.path.join(RESULTS_DIR, f"{name}-{started_at:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(document, handle, indent=2)
+        handle.write("\n")
+    return output, document
+
+
+def compare_results(baseline_path, results, higher_is_better, lower_is_better, max_regression):
+    """
+    Compare results with a saved run of the same benchmark.
+
+    Args:
+        baseline_path: Result file written by write_results
+        results: Dict of measured values of this run
+        higher_is_better: Result keys where a drop is a regression
+        lower_is_better: Result keys where a rise is a regression
+        max_regression: Allowed change in percent before it counts as a regression
+
+    Returns:
+        (lines describing every compared metric, list of regressed metric names)
+    """
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)["results"]
+
+    lines, regressions = [], []
+    for key in (*higher_is_better, *lower_is_better):
+        before, after = baseline.get(key), results.get(key)
+        if not before or after is None:
+            continue
+        change = 100 * (after - before) / before
+        worse = -change if key in higher_is_better else change
+        regressed = worse > max_regression
+        if regressed:
+            regressions.append(key)
+        lines.append(f"  {key}: {before} -> {after} ({change:+.1f}%){' REGRESSION' if regressed else ''}")
+    return lines, regressions
+
+
+def save_results(command, name, parameters, results, options, higher_is_better=(), lower_is_better=()):
+    """
+    Write a benchmark run and compare it with --baseline when one was given.
+
+    Args:
+        command: The management command, whose stdout gets the report
+        name: Benchmark name, e.g. "send"
+        parameters: Dict of the options the run used
+        results: Dict of measured values
+        options: Command options holding the add_result_arguments values
+        higher_is_better: Result keys where a drop is a regression
+        lower_is_better: Result keys where a rise is a regression
+
+    Raises:
+        CommandError: If a metric regressed by more than --max-regression
+    """
+    path, _ = write_results(name, parameters, results, options["output"])
+    command.stdout.write(f"Results written to {path}")
+    if not options["baseline"]:
+        return
+
+    lines, regressions = compare_results(
+        options["baseline"], results, higher_is_better, lower_is_better, options["max_regression"]
+    )
+    command.stdout.write(f"Compared with {options['baseline']}:")
+    for line in lines:
+        command.stdout.write(line)
+    if regressions:
+        raise CommandError(f"Regressed by more than {options['max_regression']}%: {', '.join(regressions)}")
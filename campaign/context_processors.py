@@ -1,12 +1,14 @@
-from .models import EmailLog, EmailSendCandidate, EmailTemplate, Recipient
+from .counters import send_counts
+from .models import EmailSendCandidate, EmailTemplate, Recipient
 
 
 def statistics(request):
+    totals = send_counts()
     return {
         "recipient_count": Recipient.objects.count(),
         "template_count": EmailTemplate.objects.count(),
         "email_count": EmailSendCandidate.objects.count(),
         "email_sent_count": EmailSendCandidate.objects.filter(sent=True).count(),
         "email_pending_count": EmailSendCandidate.objects.filter(sent=False).count(),
-        "email_log_count": EmailLog.objects.count(),
+        "email_log_count": totals["sent"] + totals["failed"],
     }
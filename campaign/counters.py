@@ -0,0 +1,123 @@
+"""
+Rolling per-tenant send counters.
+
+Every send result adds to the SendCounter row of its user profile and minute,
+inside the same transaction as the result itself. Windowed counts for quotas
+and dashboards are sums over those rows instead of counts over EmailLog.
+Minute rows older than a day are folded into one row per hour, so a month
+is at most about 2,200 rows per tenant.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce, TruncHour
+
+from campaign.models import SendCounter
+from campaign.partitions import month_start
+
+# Minute rows older than this are compacted into hourly rows
+COMPACT_AFTER = timedelta(days=1)
+
+
+def minute_bucket(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+def day_start(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_to_counter(user_profile_id, bucket, sent=0, failed=0):
+    """
+    Atomically add to the counter row of a user profile and bucket, creating it if needed.
+    """
+    counters = SendCounter.objects.filter(user_profile_id=user_profile_id, minute=bucket)
+    increment = {"sent": F("sent") + sent, "failed": F("failed") + failed}
+    if counters.update(**increment):
+        return
+    try:
+        with transaction.atomic():
+            SendCounter.objects.create(user_profile_id=user_profile_id, minute=bucket, sent=sent, failed=failed)
+    except IntegrityError:
+        # Created by a concurrent sender between the update and the insert
+        counters.update(**increment)
+
+
+def record_send(user_profile_id, now, sent=False):
+    """Count one send result, sent or failed, in the minute it happened."""
+    add_to_counter(user_profile_id, minute_bucket(now), sent=int(sent), failed=int(not sent))
+
+
+def send_counts(user_profile=None, since=None, until=None):
+    """
+    Emails sent and failed, for one user profile or everyone.
+
+    Args:
+        user_profile: Optional UserProfile to count for
+        since: Optional start of the window (default: all time)
+        until: Optional end of the window, exclusive
+
+    Returns:
+        Dict with "sent" and "failed" totals
+    """
+    counters = SendCounter.objects.all()
+    if since is not None:
+        counters = counters.filter(minute__gte=minute_bucket(since))
+    if until is not None:
+        counters = counters.filter(minute__lt=until)
+    if user_profile is not None:
+        counters = counters.filter(user_profile=user_profile)
+    return counters.aggregate(sent=Coalesce(Sum("sent"), 0), failed=Coalesce(Sum("failed"), 0))
+
+
+def send_attempts(since, user_profile=None):
+    """Sent plus failed emails since a moment; what the sending limits count."""
+    counts = send_counts(user_profile, since=since)
+    return counts["sent"] + counts["failed"]
+
+
+def quota_windows(now):
+    """Start of each quota window, keyed by the UserProfile limit it applies to."""
+    return {
+        "max_emails_per_hour": now - timedelta(hours=1),
+        "max_emails_per_day": day_start(now),
+        "max_emails_per_month": month_start(now),
+    }
+
+
+def emails_remaining(user_profile, now):
+    """
+    Emails a user profile may still send now under its hourly, daily and
+    monthly limits; limits left empty are not enforced.
+    """
+    remaining = None
+    for limit_field, since in quota_windows(now).items():
+        limit = getattr(user_profile, limit_field)
+        if limit is None:
+            continue
+        left = limit - send_attempts(since, user_profile)
+        remaining = left if remaining is None else min(remaining, left)
+    return remaining
+
+
+def compact_send_counters(now):
+    """
+    Fold minute rows older than COMPACT_AFTER into one row per user profile and hour.
+
+    Returns:
+        Number of minute rows folded
+    """
+    cutoff = (now - COMPACT_AFTER).replace(minute=0, second=0, microsecond=0)
+    with transaction.atomic():
+        minute_rows = SendCounter.objects.filter(minute__lt=cutoff).exclude(minute__minute=0)
+        hours = list(
+            minute_rows.annotate(hour=TruncHour("minute")).values("user_profile_id", "hour")
+            .annotate(sent_total=Sum("sent"), failed_total=Sum("failed")).order_by()
+        )
+        if not hours:
+            return 0
+        folded = minute_rows.delete()[0]
+        for row in hours:
+            add_to_counter(row["user_profile_id"], row["hour"], row["sent_total"], row["failed_total"])
+    return folded
@@ -0,0 +1,58 @@
+"""
+The campaign_emaillog_derived view behind DerivedEmailLog.
+
+The view derives EmailLog rows from 'sent' and 'failed' EmailEvents. SQLite
+refuses to rebuild a table a view depends on, and its migrations rebuild
+tables for many column changes, so the view is not created by a migration:
+it is dropped before every migrate and created again afterwards, once the
+schema is final. Databases other than PostgreSQL and SQLite get no view.
+"""
+from django.apps import apps as global_apps
+from django.db import connections
+
+VIEW_NAME = "campaign_emaillog_derived"
+
+ERROR_MESSAGE_SQL = {
+    "postgresql": "e.metadata ->> 'error'",
+    "sqlite": "json_extract(e.metadata, '$.error')",
+}
+
+VIEW_SQL = """
+CREATE VIEW {view} AS
+SELECT
+    e.id AS id,
+    c.user_profile_id AS user_profile_id,
+    r.email AS recipient,
+    c.campaign_id AS campaign_id,
+    CASE e.event_type WHEN 'sent' THEN 'Sent' ELSE 'Failed' END AS status,
+    CASE e.event_type WHEN 'failed' THEN {error_message} END AS error_message,
+    e."timestamp" AS sent_time
+FROM campaign_emailevent e
+JOIN campaign_emailsendcandidate c ON c.id = e.email_candidate_id
+JOIN campaign_recipient r ON r.id = c.recipient_id
+WHERE e.event_type IN ('sent', 'failed')
+"""
+
+
+def drop_log_view(sender, using, **kwargs):
+    """pre_migrate receiver: drop the view so migrations can rebuild the tables under it."""
+    connection = connections[using]
+    if connection.vendor in ERROR_MESSAGE_SQL:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP VIEW IF EXISTS {VIEW_NAME}")
+
+
+def create_log_view(sender, using, apps=global_apps, **kwargs):
+    """post_migrate receiver: create the view once the migrated state has DerivedEmailLog."""
+    connection = connections[using]
+    error_message = ERROR_MESSAGE_SQL.get(connection.vendor)
+    if error_message is None:
+        return
+    try:
+        apps.get_model("campaign", "DerivedEmailLog")
+    except LookupError:
+        # Migrated back to before the model existed
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP VIEW IF EXISTS {VIEW_NAME}")
+        cursor.execute(VIEW_SQL.format(view=VIEW_NAME, error_message=error_message))
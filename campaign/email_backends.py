@@ -1,13 +1,57 @@
 import dns.resolver
 import smtplib
 import logging
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formatdate, make_msgid
 from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.smtp import EmailBackend
+
+from campaign import metrics
 
 logger = logging.getLogger(__name__)
 
+# Seconds a domain's MX records are reused before they are looked up again
+MX_CACHE_TTL = 300
+
+_mx_cache = {}  # domain -> (expires at, MX records)
+
+
+class SMTPTimingMixin:
+    """
+    Records connect (including the SSL handshake for SMTP_SSL), STARTTLS and
+    DATA latency of an smtplib connection in the SMTP metrics histograms.
+    """
+
+    def connect(self, *args, **kwargs):
+        with metrics.SMTP_CONNECT_SECONDS.time():
+            return super().connect(*args, **kwargs)
+
+    def starttls(self, *args, **kwargs):
+        with metrics.SMTP_TLS_SECONDS.time():
+            return super().starttls(*args, **kwargs)
+
+    def data(self, msg):
+        with metrics.SMTP_DATA_SECONDS.time():
+            return super().data(msg)
+
+
+class TimedSMTP(SMTPTimingMixin, smtplib.SMTP):
+    pass
+
+
+class TimedSMTPSSL(SMTPTimingMixin, smtplib.SMTP_SSL):
+    pass
+
+
+class InstrumentedEmailBackend(EmailBackend):
+    """Django's SMTP backend with connect, STARTTLS and DATA latency metrics."""
+
+    @property
+    def connection_class(self):
+        return TimedSMTPSSL if self.use_ssl else TimedSMTP
+
 
 class DirectEmailBackend(BaseEmailBackend):
     """
@@ -102,9 +146,25 @@ class DirectEmailBackend(BaseEmailBackend):
 
     def _get_mx_records(self, domain):
         """
-        Get MX records for a domain, sorted by priority.
+        Get MX records for a domain, sorted by priority, from the cache when
+        they were looked up less than MX_CACHE_TTL seconds ago.
         Returns list of (priority, hostname) tuples.
         """
+        cached = _mx_cache.get(domain)
+        if cached and cached[0] > time.monotonic():
+            metrics.MX_CACHE_HITS.inc()
+            return cached[1]
+        metrics.MX_CACHE_MISSES.inc()
+        records = self._resolve_mx_records(domain)
+        if records is not None:
+            _mx_cache[domain] = (time.monotonic() + MX_CACHE_TTL, records)
+        return records or []
+
+    def _resolve_mx_records(self, domain):
+        """
+        Look up MX records for a domain in DNS. Returns None on errors that
+        may be transient, so that they are not cached.
+        """
         try:
             mx_records = dns.resolver.resolve(domain, 'MX')
             records = [(record.preference, str(record.exchange).rstrip('.'))
@@ -118,14 +178,14 @@ class DirectEmailBackend(BaseEmailBackend):
             return []
         except Exception as e:
             logger.error(f"Error looking up MX records for {domain}: {str(e)}")
-            return []
+            return None
 
     def _send_to_mx(self, mx_host, from_email, recipients, message):
         """
         Send email to a specific MX server.
         """
         # Try port 25 (standard SMTP)
-        with smtplib.SMTP(mx_host, 25, timeout=30) as smtp:
+        with TimedSMTP(mx_host, 25, timeout=30) as smtp:
             smtp.ehlo()
 
             # Try to use STARTTLS if available
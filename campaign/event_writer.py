@@ -0,0 +1,150 @@
+"""
+Batched background writes of tracking hits for the async tracking views.
+
+Under ASGI the open pixel and click redirect answer without waiting for the
+database: each hit is queued on the writer of the process's event loop and
+a background task takes the queue in batches of up to
+TRACKING_WRITE_BATCH_SIZE. A batch resolves its tracking IDs and its
+already opened emails with one query each and is inserted with one
+bulk_create, so an open storm turns into a few large writes instead of a
+database round trip per request. When the queue holds
+TRACKING_WRITE_QUEUE_SIZE hits, further hits are written by their own
+request until it drains.
+
+Hits still queued when the process is killed are lost. Keep
+TRACKING_WRITE_INTERVAL short, and stop servers gracefully.
+"""
+import asyncio
+import logging
+import weakref
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from campaign.models import EmailEvent, EmailSendCandidate
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TrackingHit:
+    """An open or click waiting to be written as an EmailEvent."""
+    tracking_id: object
+    event_type: str
+    ip_address: str = None
+    user_agent: str = ""
+    metadata: dict = field(default_factory=dict)
+
+
+async def write_hits(hits):
+    """
+    Write tracking hits as EmailEvents with three queries.
+
+    Hits with an unknown tracking ID are skipped, as the sync views do. An
+    open is the first open of its email unless the email already has an
+    open event or an earlier hit in the batch opened it.
+
+    Returns:
+        Number of events written
+    """
+    tracking_ids = {hit.tracking_id for hit in hits}
+    candidates = {
+        tracking_id: candidate_id
+        async for candidate_id, tracking_id in EmailSendCandidate.objects.filter(
+            tracking_id__in=tracking_ids
+        ).values_list("id", "tracking_id")
+    }
+    opened_ids = {
+        candidates[hit.tracking_id] for hit in hits if hit.event_type == "opened" and hit.tracking_id in candidates
+    }
+    already_opened = set()
+    if opened_ids:
+        already_opened = {
+            candidate_id
+            async for candidate_id in EmailEvent.objects.filter(
+                email_candidate_id__in=opened_ids, event_type="opened"
+            ).values_list("email_candidate_id", flat=True).distinct()
+        }
+
+    events = []
+    for hit in hits:
+        candidate_id = candidates.get(hit.tracking_id)
+        if candidate_id is None:
+            continue
+        metadata = dict(hit.metadata)
+        if hit.event_type == "opened":
+            metadata["first_open"] = candidate_id not in already_opened
+            already_opened.add(candidate_id)
+        events.append(EmailEvent(
+            email_candidate_id=candidate_id,
+            event_type=hit.event_type,
+            ip_address=hit.ip_address,
+            user_agent=hit.user_agent,
+            metadata=metadata,
+        ))
+    if events:
+        await EmailEvent.objects.abulk_create(events)
+    return len(events)
+
+
+class EventWriter:
+    """
+    Queue of tracking hits drained in batches by a background task on one event loop.
+    """
+
+    def __init__(self, batch_size=None, interval=None, queue_size=None):
+        self.batch_size = batch_size or settings.TRACKING_WRITE_BATCH_SIZE
+        self.interval = settings.TRACKING_WRITE_INTERVAL if interval is None else interval
+        self.queue = asyncio.Queue(maxsize=queue_size or settings.TRACKING_WRITE_QUEUE_SIZE)
+        self._task = None
+
+    async def record(self, hit):
+        """Queue a hit, or write it right away when the queue is full."""
+        try:
+            self.queue.put_nowait(hit)
+        except asyncio.QueueFull:
+            await write_hits([hit])
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def drain(self):
+        """Wait until every queued hit has been written."""
+        await self.queue.join()
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.interval:
+                # Let a burst of hits gather into one batch
+                await asyncio.sleep(self.interval)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await write_hits(batch)
+            except Exception:
+                # Like the sync views, a failed write never breaks the pixel or the redirect
+                logger.exception("Could not record %d tracking events", len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+
+# One writer per event loop; ASGI servers run one loop per process
+_writers = weakref.WeakKeyDictionary()
+
+
+def get_event_writer():
+    """The EventWriter of the running event loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = _writers[loop] = EventWriter()
+    return writer
+
+
+async def drain_event_writer():
+    """Wait for the running loop's queued hits to be written, if it has a writer."""
+    writer = _writers.get(asyncio.get_running_loop())
+    if writer is not None:
+        await writer.drain()
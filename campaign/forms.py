@@ -5,7 +5,7 @@ import bleach
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Field, Layout, Submit
 
-from .models import EmailCampaign, EmailSendCandidate, EmailTemplate, UserProfile
+from .models import EmailCampaign, EmailSendCandidate, EmailTemplate, Segment, UserProfile
 
 
 class EmailTemplateForm(forms.ModelForm):
@@ -86,6 +86,12 @@ class RecipientUploadForm(forms.Form):
 
 
 class EmailCampaignForm(forms.ModelForm):
+    AUDIENCE_CHOICES = [
+        ("selected", "Selected recipients"),
+        ("filter", "All recipients matching the current filter"),
+        ("segment", "Saved segment"),
+    ]
+
     scheduled_time = forms.DateTimeField(
         widget=forms.DateTimeInput(
             attrs={
@@ -94,9 +100,21 @@ class EmailCampaignForm(forms.ModelForm):
         ),
         required=True,
     )
+    audience = forms.ChoiceField(choices=AUDIENCE_CHOICES, initial="selected", widget=forms.RadioSelect)
+    segment = forms.ModelChoiceField(queryset=Segment.objects.none(), required=False)
+    just_in_time = forms.BooleanField(
+        required=False,
+        label="Queue filter matches just in time",
+        help_text="Store the filter and create queue entries batch by batch while sending, "
+                  "instead of all at once. Recipients added while the campaign is sending are included; "
+                  "once every match has been queued the audience is fixed.",
+    )
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, user_profile=None, **kwargs):
         super(EmailCampaignForm, self).__init__(*args, **kwargs)
+        if user_profile is not None:
+            self.fields["template"].queryset = EmailTemplate.objects.filter(user_profile=user_profile)
+            self.fields["segment"].queryset = Segment.objects.filter(user_profile=user_profile)
         self.helper = FormHelper()
         self.helper.form_method = "post"
 
@@ -105,6 +123,9 @@ class EmailCampaignForm(forms.ModelForm):
             "name",
             "template",
             "scheduled_time",
+            "audience",
+            "segment",
+            "just_in_time",
             # Hidden field to store selected recipient IDs
             Field("recipients", type="hidden", id="selected_recipients"),
             Submit(
@@ -114,6 +135,12 @@ class EmailCampaignForm(forms.ModelForm):
             ),
         )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get("audience") == "segment" and not cleaned_data.get("segment"):
+            self.add_error("segment", "Choose the segment to send to.")
+        return cleaned_data
+
     class Meta:
         model = EmailCampaign
         fields = ["name", "template", "scheduled_time"]
@@ -164,6 +191,60 @@ class RecipientFilterForm(forms.Form):
         ]
 
 
+class SegmentForm(forms.ModelForm):
+    class Meta:
+        model = Segment
+        fields = ["name"]
+
+
+class RecipientListFilterForm(RecipientFilterForm):
+    ORDER_CHOICES = [
+        ("id", "Oldest first"),
+        ("-id", "Newest first"),
+        ("email", "Email"),
+        ("last_name", "Last name"),
+    ]
+
+    order = forms.ChoiceField(choices=ORDER_CHOICES, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super(RecipientListFilterForm, self).__init__(*args, **kwargs)
+        self.helper.layout.fields.insert(-1, "order")
+
+
+class EmailLogFilterForm(forms.Form):
+    STATUS_CHOICES = [("", "Any status"), ("Sent", "Sent"), ("Failed", "Failed")]
+    ORDER_CHOICES = [("-sent_time", "Newest first"), ("sent_time", "Oldest first")]
+
+    status = forms.ChoiceField(choices=STATUS_CHOICES, required=False)
+    recipient = forms.EmailField(required=False)
+    campaign = forms.ModelChoiceField(queryset=EmailCampaign.objects.none(), required=False)
+    sent_after = forms.DateTimeField(
+        widget=forms.DateTimeInput(attrs={"type": "datetime-local"}), required=False
+    )
+    sent_before = forms.DateTimeField(
+        widget=forms.DateTimeInput(attrs={"type": "datetime-local"}), required=False
+    )
+    order = forms.ChoiceField(choices=ORDER_CHOICES, required=False)
+
+    def __init__(self, *args, user_profile=None, **kwargs):
+        super(EmailLogFilterForm, self).__init__(*args, **kwargs)
+        if user_profile is not None:
+            self.fields["campaign"].queryset = EmailCampaign.objects.filter(user_profile=user_profile)
+        self.helper = FormHelper()
+        self.helper.form_method = "get"
+        self.helper.form_class = "mb-4"
+        self.helper.layout = Layout(
+            "status",
+            "recipient",
+            "campaign",
+            "sent_after",
+            "sent_before",
+            "order",
+            Submit("filter", "Apply Filters", css_class="px-4 py-2 bg-green-500 text-white rounded", attrs={"value": "1"}),
+        )
+
+
 class UserProfileForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super(UserProfileForm, self).__init__(*args, **kwargs)
@@ -210,6 +291,8 @@ class UserProfileForm(forms.ModelForm):
             "use_ssl",
             "from_email",
             "max_emails_per_hour",
+            "max_emails_per_day",
+            "max_emails_per_month",
         ]
         widgets = {
             "smtp_password": forms.PasswordInput(),
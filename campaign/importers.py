@@ -0,0 +1,431 @@
+"""
+Streaming CSV import of recipients.
+
+Rows are decoded line by line from the uploaded file and upserted in batches,
+so memory use stays flat regardless of the size of the file.
+"""
+import codecs
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from campaign.models import Recipient
+from campaign.segments import refresh_segments
+
+# Column order expected in uploaded CSV files (after the header row)
+RECIPIENT_CSV_FIELDS = [
+    "first_name",
+    "last_name",
+    "company",
+    "email",
+    "country",
+    "city",
+    "free_field1",
+    "free_field2",
+    "free_field3",
+]
+
+RECIPIENT_UPDATE_FIELDS = [field for field in RECIPIENT_CSV_FIELDS if field != "email"]
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Only the first errors are kept in memory; the rest are counted
+MAX_REPORTED_ERRORS = 100
+
+# One CSV field and its trailing comma, quoted or not; matched against line || ','
+CSV_FIELD_PATTERN = '("(?:[^"]|"")*"|[^,]*),'
+
+# The value of a CSV_FIELD_PATTERN match `m`, with its quotes removed
+CSV_FIELD_VALUE_SQL = (
+    "CASE WHEN m[1] LIKE '\"%%\"' THEN replace(substr(m[1], 2, length(m[1]) - 2), '\"\"', '\"') ELSE m[1] END"
+)
+
+
+class ImportResult:
+    """
+    Running totals of a recipient import.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, message))
+
+    def __str__(self):
+        return (
+            f"{self.rows} rows processed: {self.inserted} added, "
+            f"{self.updated} updated, {self.failed} failed"
+        )
+
+
+def iter_csv_rows(uploaded_file, skip_header=True):
+    """
+    Decode an uploaded CSV file incrementally and yield its rows.
+
+    Args:
+        uploaded_file: A Django File (or any iterable of byte lines)
+        skip_header: Whether to drop the first row
+
+    Yields:
+        (line_number, row) tuples, line numbers starting at 1 for the header
+    """
+    lines = codecs.iterdecode(uploaded_file, "utf-8-sig")
+    reader = csv.reader(lines, delimiter=",", quotechar='"')
+    for row in reader:
+        if skip_header and reader.line_num == 1:
+            continue
+        if not any(value.strip() for value in row):
+            continue
+        yield reader.line_num, row
+
+
+def iter_csv_file(fileobj, offset=0, line_number=0):
+    """
+    Read CSV rows from a binary file starting at a byte offset.
+
+    Lines are pulled from the file one at a time, so after each row the file
+    position is exactly the end of that row and can be stored as a resume point.
+
+    Args:
+        fileobj: Seekable binary file object
+        offset: Byte offset to start from; 0 skips the header row
+        line_number: CSV line number at `offset`
+
+    Yields:
+        (line_number, row, offset) tuples, where offset is just after the row
+    """
+    fileobj.seek(offset)
+    position = offset
+
+    def lines():
+        nonlocal position
+        for raw in iter(fileobj.readline, b""):
+            encoding = "utf-8-sig" if position == 0 else "utf-8"
+            position += len(raw)
+            yield raw.decode(encoding)
+
+    reader = csv.reader(lines(), delimiter=",", quotechar='"')
+    for row in reader:
+        current_line = line_number + reader.line_num
+        if offset == 0 and reader.line_num == 1:
+            continue
+        if not any(value.strip() for value in row):
+            continue
+        yield current_line, row, position
+
+
+def clean_recipient_row(row):
+    """
+    Validate a CSV row and map it to Recipient field values.
+
+    Args:
+        row: List of column values in RECIPIENT_CSV_FIELDS order
+
+    Returns:
+        Dict of field values
+
+    Raises:
+        ValidationError: If the row cannot be imported
+    """
+    if len(row) < len(RECIPIENT_CSV_FIELDS):
+        raise ValidationError(
+            f"Expected {len(RECIPIENT_CSV_FIELDS)} columns, got {len(row)}."
+        )
+
+    values = {field: row[index].strip() for index, field in enumerate(RECIPIENT_CSV_FIELDS)}
+    validate_email(values["email"])
+
+    for field in RECIPIENT_CSV_FIELDS:
+        max_length = Recipient._meta.get_field(field).max_length
+        if max_length and len(values[field]) > max_length:
+            raise ValidationError(f"{field} is longer than {max_length} characters.")
+
+    return values
+
+
+def import_recipients(user_profile, rows, batch_size=DEFAULT_BATCH_SIZE, result=None):
+    """
+    Upsert recipients for a user profile from an iterable of CSV rows.
+
+    Invalid rows are reported in the result and skipped; they never abort the
+    rest of the import.
+
+    Args:
+        user_profile: The UserProfile that owns the recipients
+        rows: Iterable of (line_number, row) tuples, see iter_csv_rows
+        batch_size: Number of rows written per INSERT ... ON CONFLICT statement
+        result: Optional ImportResult to accumulate into
+
+    Returns:
+        ImportResult with row, insert, update and failure counts
+    """
+    if result is None:
+        result = ImportResult()
+
+    batch = {}
+    for line_number, row in rows:
+        result.rows += 1
+        try:
+            values = clean_recipient_row(row)
+        except ValidationError as e:
+            result.add_error(line_number, "; ".join(e.messages))
+            continue
+
+        # Later rows for the same address win, as they did with update_or_create
+        if batch.pop(values["email"], None) is not None:
+            result.updated += 1
+        batch[values["email"]] = (line_number, values)
+
+        if len(batch) >= batch_size:
+            write_recipient_batch(user_profile, batch, result)
+            batch = {}
+
+    if batch:
+        write_recipient_batch(user_profile, batch, result)
+
+    return result
+
+
+def write_recipient_batch(user_profile, batch, result):
+    """
+    Write one batch of cleaned rows with a single upsert statement.
+
+    Args:
+        user_profile: The UserProfile that owns the recipients
+        batch: Dict mapping email to (line_number, values)
+        result: ImportResult to update
+    """
+    try:
+        with transaction.atomic():
+            existing = set(
+                Recipient.objects.filter(user_profile=user_profile, email__in=batch.keys())
+                .values_list("email", flat=True)
+            )
+            Recipient.objects.bulk_create(
+                [Recipient(user_profile=user_profile, **values) for _, values in batch.values()],
+                update_conflicts=True,
+                unique_fields=["user_profile", "email"],
+                update_fields=RECIPIENT_UPDATE_FIELDS,
+            )
+            refresh_segments(user_profile, Recipient.objects.filter(user_profile=user_profile, email__in=batch.keys()))
+    except DatabaseError as e:
+        for line_number, _ in batch.values():
+            result.add_error(line_number, str(e))
+        return
+
+    result.updated += len(existing)
+    result.inserted += len(batch) - len(existing)
+
+
+def process_import_job(job, chunk_size=DEFAULT_BATCH_SIZE):
+    """
+    Import a queued RecipientImportJob, resuming from its last committed offset.
+
+    Each chunk of rows is written in the same transaction as the job's
+    progress counters, so a killed worker never imports a chunk twice.
+
+    Args:
+        job: The RecipientImportJob to process
+        chunk_size: Number of rows committed per transaction
+    """
+    chunk = []
+    with job.file.open("rb") as fileobj:
+        for line_number, row, offset in iter_csv_file(fileobj, job.offset, job.line_number):
+            chunk.append((line_number, row))
+            if len(chunk) >= chunk_size:
+                commit_import_chunk(job, chunk, offset, line_number)
+                chunk = []
+        if chunk:
+            commit_import_chunk(job, chunk, offset, line_number)
+
+    job.status = "completed"
+    job.completed_at = timezone.now()
+    job.save(update_fields=["status", "completed_at", "updated_at"])
+    job.file.delete(save=False)
+
+
+def commit_import_chunk(job, chunk, offset, line_number):
+    """
+    Upsert one chunk of rows and record the job's progress atomically.
+    """
+    with transaction.atomic():
+        result = import_recipients(job.user_profile, chunk, batch_size=len(chunk))
+        job.offset = offset
+        job.line_number = line_number
+        job.rows_done += result.rows
+        job.inserted_count += result.inserted
+        job.updated_count += result.updated
+        job.failed_count += result.failed
+        job.errors = (job.errors + [list(error) for error in result.errors])[:MAX_REPORTED_ERRORS]
+        job.save(update_fields=[
+            "offset", "line_number", "rows_done", "inserted_count",
+            "updated_count", "failed_count", "errors", "updated_at",
+        ])
+
+
+def bulk_load_recipients(user_profile, fileobj, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Load a CSV file of recipients with set-based SQL instead of the ORM.
+
+    On PostgreSQL the file is streamed into a temporary staging table with
+    COPY and merged with a single INSERT ... ON CONFLICT. Other databases
+    fall back to batched executemany upserts. Saved segments are refreshed
+    once the whole file is loaded.
+
+    Args:
+        user_profile: The UserProfile that owns the recipients
+        fileobj: Binary file object positioned at the header row
+        batch_size: Rows per executemany call in the fallback path
+
+    Returns:
+        ImportResult with row, insert, update and failure counts
+    """
+    if connection.vendor == "postgresql":
+        result = copy_recipients(user_profile, fileobj)
+    else:
+        result = executemany_recipients(user_profile, fileobj, batch_size)
+    # One set-based pass per segment instead of one per batch
+    refresh_segments(user_profile)
+    return result
+
+
+def copy_recipients(user_profile, fileobj):
+    """
+    PostgreSQL path of bulk_load_recipients: COPY into staging, then merge.
+
+    Each line is copied whole into a single text column and split into
+    fields in SQL, so a row with the wrong number of columns is counted as
+    failed like rows with an invalid email or over-long fields, instead of
+    aborting the COPY. Line-level error messages are not available in this
+    path, and quoted fields spanning several lines are not supported.
+    """
+    quote = connection.ops.quote_name
+    table = quote(Recipient._meta.db_table)
+    columns = ", ".join(RECIPIENT_CSV_FIELDS)
+    cleaned_columns = ",\n".join(
+        f"btrim(fields[{index}]) AS {field}" for index, field in enumerate(RECIPIENT_CSV_FIELDS, start=1)
+    )
+    length_checks = " AND ".join(
+        f"length({field}) <= {Recipient._meta.get_field(field).max_length}" for field in RECIPIENT_CSV_FIELDS
+    )
+    updates = ", ".join(f"{field} = EXCLUDED.{field}" for field in RECIPIENT_UPDATE_FIELDS)
+
+    result = ImportResult()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE recipient_staging (line_no bigserial, line text) ON COMMIT DROP"
+        )
+
+        # Control characters as delimiter and quote keep every line in one column
+        copy_sql = (
+            "COPY recipient_staging (line) FROM STDIN "
+            "WITH (FORMAT csv, HEADER true, DELIMITER E'\\x01', QUOTE E'\\x02', ENCODING 'UTF8')"
+        )
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, "copy_expert"):
+            # psycopg2
+            raw_cursor.copy_expert(copy_sql, fileobj, size=1024 * 1024)
+        else:
+            # psycopg 3
+            with raw_cursor.copy(copy_sql) as copy:
+                for block in iter(lambda: fileobj.read(1024 * 1024), b""):
+                    copy.write(block)
+
+        # Later rows for the same address win, as in import_recipients
+        cursor.execute(
+            f"""
+            WITH split AS (
+                SELECT staged.line_no, parsed.fields
+                FROM recipient_staging staged
+                CROSS JOIN LATERAL (
+                    SELECT array_agg({CSV_FIELD_VALUE_SQL} ORDER BY position) AS fields
+                    FROM regexp_matches(staged.line || ',', %s, 'g') WITH ORDINALITY AS matches(m, position)
+                ) parsed
+                -- Blank rows are skipped, as iter_csv_rows does
+                WHERE btrim(array_to_string(parsed.fields, '')) <> ''
+            ), cleaned AS (
+                SELECT line_no, {cleaned_columns}
+                FROM split
+                WHERE cardinality(fields) >= {len(RECIPIENT_CSV_FIELDS)}
+            ), valid AS (
+                SELECT * FROM cleaned
+                WHERE email ~ '^[^@[:space:]]+@[^@[:space:]]+\\.[^@[:space:]]+$' AND {length_checks}
+            ), deduplicated AS (
+                SELECT DISTINCT ON (email) * FROM valid ORDER BY email, line_no DESC
+            ), merged AS (
+                INSERT INTO {table} (user_profile_id, {columns})
+                SELECT %s, {columns} FROM deduplicated
+                ON CONFLICT (user_profile_id, email) DO UPDATE SET {updates}
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT
+                (SELECT count(*) FROM split),
+                (SELECT count(*) FROM valid),
+                count(*) FILTER (WHERE inserted),
+                count(*) FILTER (WHERE NOT inserted)
+            FROM merged
+            """,
+            [CSV_FIELD_PATTERN, user_profile.pk],
+        )
+        staged, valid, inserted, updated = cursor.fetchone()
+
+    result.rows = staged
+    result.inserted = inserted
+    # Duplicate addresses within the file count as updates
+    result.updated = updated + (valid - inserted - updated)
+    result.failed = staged - valid
+    if result.failed:
+        result.errors.append((None, f"{result.failed} rows had too few columns, an invalid email or over-long fields"))
+    return result
+
+
+def executemany_recipients(user_profile, fileobj, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Fallback path of bulk_load_recipients using batched executemany upserts.
+    """
+    quote = connection.ops.quote_name
+    table = quote(Recipient._meta.db_table)
+    columns = ", ".join(RECIPIENT_CSV_FIELDS)
+    placeholders = ", ".join(["%s"] * (len(RECIPIENT_CSV_FIELDS) + 1))
+    updates = ", ".join(f"{field} = excluded.{field}" for field in RECIPIENT_UPDATE_FIELDS)
+    sql = (
+        f"INSERT INTO {table} (user_profile_id, {columns}) VALUES ({placeholders}) "
+        f"ON CONFLICT (user_profile_id, email) DO UPDATE SET {updates}"
+    )
+
+    recipients = Recipient.objects.filter(user_profile=user_profile)
+    before = recipients.count()
+    merged = 0
+    result = ImportResult()
+    batch = []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for line_number, row in iter_csv_rows(fileobj):
+            result.rows += 1
+            try:
+                values = clean_recipient_row(row)
+            except ValidationError as e:
+                result.add_error(line_number, "; ".join(e.messages))
+                continue
+            batch.append([user_profile.pk] + [values[field] for field in RECIPIENT_CSV_FIELDS])
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                merged += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            merged += len(batch)
+
+    result.inserted = recipients.count() - before
+    result.updated = merged - result.inserted
+    return result
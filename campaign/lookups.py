@@ -0,0 +1,26 @@
+"""
+Custom ORM lookups.
+"""
+from django.db.models import CharField
+from django.db.models.lookups import IContains
+
+
+@CharField.register_lookup
+class TrigramContains(IContains):
+    """
+    Case-insensitive substring match that can use a pg_trgm index.
+
+    Django's icontains compiles to UPPER(col::text) LIKE UPPER(%s) on
+    PostgreSQL, which no index on the column can serve. This lookup emits
+    col ILIKE %s instead, matching the gin_trgm_ops indexes created by
+    migration 0013. Other databases get the regular icontains SQL.
+    """
+    lookup_name = "trigram_contains"
+
+    def as_sql(self, compiler, connection):
+        return IContains(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_postgresql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs_sql} ILIKE {rhs_sql}", lhs_params + rhs_params
@@ -0,0 +1,37 @@
+# campaign/management/commands/archive_events.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from campaign.archive import archivable_months, archive_campaign_month, archive_cutoff, archive_root
+
+
+class Command(BaseCommand):
+    help = "Move email events from whole months older than N days into compressed archive files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.EVENT_ARCHIVE_DAYS,
+            help="Archive months that ended more than this many days ago",
+        )
+        parser.add_argument("--output-dir", help="Archive directory (default: EVENT_ARCHIVE_ROOT)")
+        parser.add_argument("--dry-run", action="store_true", help="Only list the campaign months to archive")
+
+    def handle(self, *args, **options):
+        root = options["output_dir"] or archive_root()
+        cutoff = archive_cutoff(options["days"])
+        self.stdout.write(f"Archiving events before {cutoff:%Y-%m-%d} to {root}")
+
+        total = 0
+        for user_profile_id, campaign_id, month in archivable_months(cutoff):
+            label = f"user {user_profile_id}, campaign {campaign_id or '-'}, {month:%Y-%m}"
+            if options["dry_run"]:
+                self.stdout.write(f"Would archive {label}")
+                continue
+            archived, deleted = archive_campaign_month(root, user_profile_id, campaign_id, month)
+            total += deleted
+            self.stdout.write(f"Archived {archived} and deleted {deleted} events for {label}")
+
+        self.stdout.write(f"Deleted {total} archived events from the database")
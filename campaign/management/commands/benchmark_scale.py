@@ -0,0 +1,203 @@
+# campaign/management/commands/benchmark_scale.py
+
+import csv
+import math
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from campaign.benchmarks import (
+    QueryCounter, Stopwatch, add_result_arguments, benchmark_database, peak_rss_mb, save_results, seed_candidates,
+    seed_recipients, seed_tenants
+)
+from campaign.importers import RECIPIENT_CSV_FIELDS
+from campaign.models import CampaignStatistics, EmailEvent, EmailSendCandidate
+
+OPERATIONS = ("upload", "campaign_create", "update_statistics")
+
+# Events seeded per email for the statistics benchmark: a send, its delivery, opens and clicks
+EVENT_PATTERN = ("sent", "delivered", "opened", "opened", "clicked", "opened", "opened", "clicked", "opened", "opened")
+
+BOUNDARY = "benchmarkboundary"
+
+EVENT_BATCH_SIZE = 10000
+
+
+def write_upload_body(path, rows):
+    """Write a multipart/form-data body holding a recipient CSV with `rows` rows; returns its size."""
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        handle.write(
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="csv_file"; filename="recipients.csv"\r\n'
+            "Content-Type: text/csv\r\n\r\n"
+        )
+        writer = csv.writer(handle)
+        writer.writerow(RECIPIENT_CSV_FIELDS)
+        for number in range(rows):
+            writer.writerow([
+                f"First{number}", f"Last{number}", f"Company {number % 1000}", f"recipient{number}@example.com",
+                "Country", f"City {number % 100}", "", "", "",
+            ])
+        handle.write(f"\r\n--{BOUNDARY}--\r\n")
+    return os.path.getsize(path)
+
+
+def seed_events(campaign, events):
+    """Create `events` EmailEvents for a campaign, EVENT_PATTERN per email, in batches."""
+    candidate_ids = EmailSendCandidate.objects.filter(campaign=campaign).order_by("id").values_list("id", flat=True)
+    batch = []
+    created = 0
+    for candidate_id in candidate_ids.iterator(chunk_size=EVENT_BATCH_SIZE):
+        for event_type in EVENT_PATTERN[:events - created - len(batch)]:
+            batch.append(EmailEvent(email_candidate_id=candidate_id, event_type=event_type))
+        if len(batch) >= EVENT_BATCH_SIZE or created + len(batch) >= events:
+            EmailEvent.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+        if created >= events:
+            break
+    EmailSendCandidate.objects.filter(campaign=campaign).update(sent=True)
+    return created
+
+
+class Command(BaseCommand):
+    help = "Benchmark recipient upload, campaign creation and statistics at scale"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, nargs="+", default=[10000, 100000, 1000000],
+            help="CSV sizes to upload and create campaigns for (default: 10000 100000 1000000)",
+        )
+        parser.add_argument(
+            "--events", type=int, nargs="+", default=[10000000],
+            help="Event counts of the campaigns whose statistics are updated (default: 10000000)",
+        )
+        parser.add_argument(
+            "--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS), help="Operations to measure"
+        )
+        add_result_arguments(parser, "scale")
+
+    def measure(self, results, operation, size, function):
+        """Run function() and store its wall time, query count and memory under operation_size_*."""
+        rss_before = peak_rss_mb()
+        queries = QueryCounter()
+        with Stopwatch() as stopwatch, queries.counting():
+            function()
+        measured = {
+            "seconds": round(stopwatch.seconds, 3),
+            "queries": queries.count,
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+        }
+        for metric, value in measured.items():
+            results[f"{operation}_{size}_{metric}"] = value
+        self.stdout.write(
+            f"{operation} {size}: {measured['seconds']}s, {measured['queries']} queries, "
+            f"peak RSS {measured['peak_rss_mb']} MB (+{measured['peak_rss_growth_mb']} MB)"
+        )
+
+    def handle(self, *args, **options):
+        if min(options["rows"] + options["events"]) < 1:
+            raise CommandError("--rows and --events must be at least 1")
+        operations = options["operations"]
+        parameters = {"rows": options["rows"], "events": options["events"], "operations": operations}
+        results = {}
+
+        with tempfile.TemporaryDirectory() as work_dir, override_settings(MEDIA_ROOT=work_dir), benchmark_database():
+            row_tenants = 0
+            if "upload" in operations or "campaign_create" in operations:
+                row_tenants = self.benchmark_rows(results, operations, options["rows"], work_dir)
+
+            if "update_statistics" in operations:
+                stats_tenants = seed_tenants(len(options["events"]), first_index=row_tenants)
+                for tenant, events in zip(stats_tenants, options["events"]):
+                    self.benchmark_statistics(results, tenant, events)
+
+        save_results(
+            self,
+            "scale",
+            parameters,
+            results,
+            options,
+            higher_is_better=(),
+            lower_is_better=[key for key in results if key.endswith(("_seconds", "_queries"))],
+        )
+
+    def benchmark_rows(self, results, operations, row_counts, work_dir):
+        """
+        Run the upload and campaign_create benchmarks, one fresh tenant per row count.
+
+        Returns:
+            Number of tenants seeded
+        """
+        tenants = seed_tenants(len(row_counts))
+        for (profile, template, _), rows in zip(tenants, row_counts):
+            client = Client()
+            client.force_login(profile.user)
+            if "upload" in operations:
+                self.benchmark_upload(results, client, rows, work_dir)
+            else:
+                # campaign_create on its own still needs the audience
+                for _ in seed_recipients(profile, rows):
+                    pass
+            if "campaign_create" in operations:
+                self.benchmark_campaign_create(results, client, template, rows)
+        return len(tenants)
+
+    def benchmark_upload(self, results, client, rows, work_dir):
+        """POST a CSV to recipient_upload and, when it is queued, run process_imports."""
+        body_path = os.path.join(work_dir, f"upload-{rows}.multipart")
+        size = write_upload_body(body_path, rows)
+        queued = size > settings.RECIPIENT_IMPORT_SYNC_MAX_SIZE
+        results[f"upload_{rows}_mode"] = "queued" if queued else "sync"
+
+        def upload():
+            # The body is streamed from disk, so the client does not hold it in memory
+            with open(body_path, "rb") as body:
+                response = client.request(**{
+                    "REQUEST_METHOD": "POST",
+                    "PATH_INFO": reverse("recipient_upload"),
+                    "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}",
+                    "CONTENT_LENGTH": str(size),
+                    "wsgi.input": body,
+                })
+            if response.status_code != 302:
+                raise CommandError(f"recipient_upload answered {response.status_code}")
+            if queued:
+                with open(os.devnull, "w") as devnull:
+                    call_command("process_imports", stdout=devnull)
+
+        self.measure(results, "upload", rows, upload)
+        os.remove(body_path)
+
+    def benchmark_campaign_create(self, results, client, template, rows):
+        """POST campaign_create with everyone matching an empty filter as the audience."""
+        def create():
+            response = client.post(reverse("campaign_create"), {
+                "name": f"Scale {rows}",
+                "template": template.id,
+                "scheduled_time": "2030-01-01T00:00",
+                "audience": "filter",
+            })
+            if response.status_code != 302:
+                raise CommandError(f"campaign_create answered {response.status_code}")
+
+        self.measure(results, "campaign_create", rows, create)
+        results[f"campaign_create_{rows}_candidates"] = EmailSendCandidate.objects.filter(
+            template=template, campaign__name=f"Scale {rows}"
+        ).count()
+
+    def benchmark_statistics(self, results, tenant, events):
+        """Seed a campaign with `events` events and time CampaignStatistics.update_statistics()."""
+        self.stdout.write(f"Seeding {events} events...")
+        campaign = tenant[2]
+        seed_candidates([tenant], math.ceil(events / len(EVENT_PATTERN)))
+        seed_events(campaign, events)
+        statistics, _ = CampaignStatistics.objects.get_or_create(campaign=campaign)
+
+        self.measure(results, "update_statistics", events, statistics.update_statistics)
@@ -0,0 +1,93 @@
+# campaign/management/commands/benchmark_send.py
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from campaign.benchmarks import (
+    QueryCounter, Stopwatch, add_result_arguments, benchmark_database, peak_rss_mb, per_second, save_results,
+    seed_candidates, seed_tenants
+)
+from campaign.management.commands.send_emails import Command as SendEmailsCommand
+from campaign.profiling import PhaseTimer, percentile
+from campaign.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = "Benchmark send_emails throughput against a local SMTP sink"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenants", type=int, default=5, help="Users to seed (default: 5)")
+        parser.add_argument("--candidates", type=int, default=1000, help="Queued emails, split over the users")
+        parser.add_argument(
+            "--connect-latency-ms", type=float, default=0, help="Delay before the sink greets each connection"
+        )
+        parser.add_argument(
+            "--data-latency-ms", type=float, default=0, help="Delay before the sink accepts each message"
+        )
+        add_result_arguments(parser, "send")
+
+    def handle(self, *args, **options):
+        if options["tenants"] < 1 or options["candidates"] < 1:
+            raise CommandError("--tenants and --candidates must be at least 1")
+        parameters = {
+            "tenants": options["tenants"],
+            "candidates": options["candidates"],
+            "connect_latency_ms": options["connect_latency_ms"],
+            "data_latency_ms": options["data_latency_ms"],
+        }
+
+        sink = SMTPSink(
+            connect_latency=options["connect_latency_ms"] / 1000, data_latency=options["data_latency_ms"] / 1000
+        )
+        with benchmark_database(), sink:
+            tenants = seed_tenants(
+                options["tenants"],
+                smtp_host=sink.host,
+                smtp_port=sink.port,
+                use_tls=False,
+                max_emails_per_hour=options["candidates"],
+            )
+            seed_candidates(tenants, options["candidates"])
+            self.stdout.write(
+                f"Seeded {options['candidates']} emails for {options['tenants']} users; sending to {sink.host}:{sink.port}"
+            )
+
+            with open(os.devnull, "w") as devnull:
+                command = SendEmailsCommand(stdout=devnull)
+                command.timer = PhaseTimer()
+                queries = QueryCounter()
+                with Stopwatch() as stopwatch, queries.counting():
+                    command.send_queued_emails()
+
+        timer = command.timer
+        messages = len(timer.latencies)
+        results = {
+            "messages": messages,
+            "sent": sum(count for (_, outcome), count in timer.outcomes.items() if outcome == "sent"),
+            "failed": sum(count for (_, outcome), count in timer.outcomes.items() if outcome == "failed"),
+            "accepted_by_sink": sink.messages,
+            "seconds": round(stopwatch.seconds, 3),
+            "messages_per_second": per_second(messages, stopwatch.seconds),
+            "latency_p50_ms": round(1000 * percentile(timer.latencies, 0.5), 2) if messages else None,
+            "latency_p99_ms": round(1000 * percentile(timer.latencies, 0.99), 2) if messages else None,
+            "queries": queries.count,
+            "queries_per_message": round(queries.count / messages, 2) if messages else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "phase_seconds": {phase: round(seconds, 3) for phase, (seconds, _) in timer.phase_totals().items()},
+        }
+
+        for key, value in results.items():
+            if key != "phase_seconds":
+                self.stdout.write(f"{key}: {value}")
+        for line in timer.report():
+            self.stdout.write(line)
+        save_results(
+            self,
+            "send",
+            parameters,
+            results,
+            options,
+            higher_is_better=("messages_per_second",),
+            lower_is_better=("latency_p50_ms", "latency_p99_ms", "queries_per_message", "peak_rss_mb"),
+        )
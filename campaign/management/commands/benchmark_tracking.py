@@ -0,0 +1,167 @@
+# campaign/management/commands/benchmark_tracking.py
+
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import quote
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils import timezone
+
+from campaign.benchmarks import (
+    QueryCounter, Stopwatch, add_result_arguments, benchmark_database, peak_rss_mb, per_second, save_results,
+    seed_candidates, seed_tenants
+)
+from campaign.event_writer import drain_event_writer
+from campaign.models import EmailEvent, EmailSendCandidate
+from campaign.profiling import percentile
+
+CLICK_URL = quote("https://example.com/offer?id=1", safe="")
+
+
+def request_plan(tracking_ids, requests, click_ratio, repeat_open_ratio, seed):
+    """
+    Paths of the tracking requests to make, in order.
+
+    Clicks go to a random email. Opens repeat an already opened email with
+    probability repeat_open_ratio (mail clients reload images), and otherwise
+    open the next email not opened yet.
+    """
+    rng = random.Random(seed)
+    unopened = list(tracking_ids)
+    rng.shuffle(unopened)
+    opened = []
+    paths = []
+    for _ in range(requests):
+        if rng.random() < click_ratio:
+            tracking_id = rng.choice(tracking_ids)
+            paths.append(f"{reverse('email_tracking_click', args=[tracking_id])}?url={CLICK_URL}")
+            continue
+        if opened and (not unopened or rng.random() < repeat_open_ratio):
+            tracking_id = rng.choice(opened)
+        else:
+            tracking_id = unopened.pop()
+            opened.append(tracking_id)
+        paths.append(reverse("email_tracking_pixel", args=[tracking_id]))
+    return paths
+
+
+def run_wsgi(paths, concurrency):
+    """Make the requests through the WSGI handler from `concurrency` threads."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client_thread(chunk):
+        client = Client()
+        own_latencies, own_errors = [], 0
+        for path in chunk:
+            started = time.perf_counter()
+            response = client.get(path)
+            own_latencies.append(time.perf_counter() - started)
+            own_errors += response.status_code not in (200, 302)
+        with lock:
+            latencies.extend(own_latencies)
+            errors.append(own_errors)
+
+    threads = [threading.Thread(target=client_thread, args=(paths[i::concurrency],)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(errors)
+
+
+async def run_asgi(paths, concurrency):
+    """Make the requests through the ASGI handler from `concurrency` concurrent tasks."""
+    latencies, errors = [], []
+
+    async def client_task(chunk):
+        client = AsyncClient()
+        for path in chunk:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started)
+            errors.append(response.status_code not in (200, 302))
+
+    await asyncio.gather(*(client_task(paths[i::concurrency]) for i in range(concurrency)))
+    # With TRACKING_ASYNC the async views queue their events; count them in the run
+    await drain_event_writer()
+    return latencies, sum(errors)
+
+
+class Command(BaseCommand):
+    help = "Load-test the open and click tracking endpoints in-process"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenants", type=int, default=5, help="Users to seed (default: 5)")
+        parser.add_argument("--emails", type=int, default=1000, help="Sent emails that can be opened and clicked")
+        parser.add_argument("--requests", type=int, default=10000, help="Tracking requests to make")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (default: 8)")
+        parser.add_argument("--interface", choices=("wsgi", "asgi"), default="wsgi", help="Handler to drive")
+        parser.add_argument("--click-ratio", type=float, default=0.2, help="Share of requests that are clicks")
+        parser.add_argument(
+            "--repeat-open-ratio", type=float, default=0.6, help="Share of opens that reopen an opened email"
+        )
+        parser.add_argument("--seed", type=int, default=1, help="Random seed of the request mix")
+        add_result_arguments(parser, "tracking")
+
+    def handle(self, *args, **options):
+        if min(options["tenants"], options["emails"], options["requests"], options["concurrency"]) < 1:
+            raise CommandError("--tenants, --emails, --requests and --concurrency must be at least 1")
+        parameters = {
+            key: options[key]
+            for key in (
+                "tenants", "emails", "requests", "concurrency", "interface", "click_ratio", "repeat_open_ratio", "seed"
+            )
+        }
+
+        with benchmark_database():
+            seed_candidates(seed_tenants(options["tenants"]), options["emails"])
+            EmailSendCandidate.objects.update(sent=True, sent_time=timezone.now())
+            tracking_ids = list(EmailSendCandidate.objects.order_by("id").values_list("tracking_id", flat=True))
+            paths = request_plan(
+                tracking_ids, options["requests"], options["click_ratio"], options["repeat_open_ratio"], options["seed"]
+            )
+            self.stdout.write(
+                f"Seeded {len(tracking_ids)} sent emails; making {len(paths)} requests "
+                f"from {options['concurrency']} {options['interface'].upper()} clients"
+            )
+
+            queries = QueryCounter()
+            with Stopwatch() as stopwatch, queries.counting():
+                if options["interface"] == "asgi":
+                    latencies, errors = asyncio.run(run_asgi(paths, options["concurrency"]))
+                else:
+                    latencies, errors = run_wsgi(paths, options["concurrency"])
+            recorded = EmailEvent.objects.filter(event_type__in=("opened", "clicked")).count()
+
+        results = {
+            "requests": len(latencies),
+            "errors": errors,
+            "events_recorded": recorded,
+            "seconds": round(stopwatch.seconds, 3),
+            "requests_per_second": per_second(len(latencies), stopwatch.seconds),
+            "latency_p50_ms": round(1000 * percentile(latencies, 0.5), 2),
+            "latency_p95_ms": round(1000 * percentile(latencies, 0.95), 2),
+            "latency_p99_ms": round(1000 * percentile(latencies, 0.99), 2),
+            "queries": queries.count,
+            "queries_per_request": round(queries.count / len(latencies), 2),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        for key, value in results.items():
+            self.stdout.write(f"{key}: {value}")
+        if recorded < len(latencies):
+            # The tracking views swallow errors so that emails never show a broken image
+            self.stdout.write(f"Warning: {len(latencies) - recorded} hits were not recorded as events")
+        save_results(
+            self,
+            "tracking",
+            parameters,
+            results,
+            options,
+            higher_is_better=("requests_per_second",),
+            lower_is_better=("latency_p50_ms", "latency_p99_ms", "queries_per_request"),
+        )
@@ -0,0 +1,43 @@
+# campaign/management/commands/export_data.py
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from campaign.exports import EXPORT_COLUMNS, EXPORT_FORMATS, iter_export
+from campaign.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Stream a user's recipients, email logs or email events to a CSV/NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORT_COLUMNS))
+        parser.add_argument("--user", required=True, help="Username whose data is exported")
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", dest="export_format")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip")
+        parser.add_argument("--campaign", type=int, help="Only export logs/events of this campaign")
+        parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            user_profile = UserProfile.objects.get(user__username=options["user"])
+        except UserProfile.DoesNotExist:
+            raise CommandError(f"No user profile for user {options['user']}")
+
+        blocks = iter_export(
+            user_profile,
+            options["kind"],
+            options["export_format"],
+            compress=options["gzip"],
+            campaign_id=options["campaign"],
+        )
+
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                for block in blocks:
+                    output.write(block)
+        else:
+            for block in blocks:
+                sys.stdout.buffer.write(block)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,60 @@
+# campaign/management/commands/generate_data.py
+
+from datetime import timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from campaign.benchmarks import Stopwatch
+from campaign.counters import day_start
+from campaign.synthetic import BATCH_SIZE, SyntheticDataGenerator, estimated_events
+
+
+class Command(BaseCommand):
+    help = "Generate deterministic synthetic users, recipients, campaigns and events for performance testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+        parser.add_argument("--tenants", type=int, default=10, help="Users to create (default: 10)")
+        parser.add_argument("--recipients", type=int, default=10000, help="Recipients per user (default: 10000)")
+        parser.add_argument("--campaigns", type=int, default=5, help="Campaigns per user (default: 5)")
+        parser.add_argument("--days", type=int, default=90, help="Days of history to spread campaigns over")
+        parser.add_argument(
+            "--now", help="ISO date or datetime the history ends at (default: start of the current UTC day)"
+        )
+        parser.add_argument("--prefix", default="synthetic", help="Username prefix (default: synthetic)")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per bulk write")
+
+    def handle(self, *args, **options):
+        if min(options["tenants"], options["recipients"], options["campaigns"], options["days"]) < 1:
+            raise CommandError("--tenants, --recipients, --campaigns and --days must be at least 1")
+        now = day_start(timezone.now().astimezone(dt_timezone.utc))
+        if options["now"]:
+            now = parse_datetime(options["now"]) or parse_datetime(f"{options['now']}T00:00")
+            if now is None:
+                raise CommandError(f"Invalid --now: {options['now']}")
+            if timezone.is_naive(now):
+                now = timezone.make_aware(now, dt_timezone.utc)
+
+        generator = SyntheticDataGenerator(
+            options["seed"], now, options["days"], options["prefix"], options["batch_size"]
+        )
+        usernames = [generator.username(index) for index in range(options["tenants"])]
+        if User.objects.filter(username__in=usernames).exists():
+            raise CommandError(
+                f"Users named {generator.username('N')} already exist; use another --seed or --prefix"
+            )
+
+        self.stdout.write(
+            f"Generating {options['tenants']} users with about "
+            f"{estimated_events(options['tenants'], options['recipients'], options['campaigns'])} events"
+        )
+        progress = self.stdout.write if options["verbosity"] > 1 else None
+        with Stopwatch() as stopwatch:
+            totals = generator.generate(options["tenants"], options["recipients"], options["campaigns"], progress)
+
+        for kind, count in totals.items():
+            self.stdout.write(f"{kind}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Done in {stopwatch.seconds:.1f}s"))
@@ -0,0 +1,39 @@
+# campaign/management/commands/load_recipients.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from campaign.importers import DEFAULT_BATCH_SIZE, bulk_load_recipients
+from campaign.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Bulk load recipients from a CSV file on disk (COPY on PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", help="CSV file with the same columns as the upload form")
+        parser.add_argument("--user", required=True, help="Username that will own the recipients")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Rows per executemany call when not running on PostgreSQL (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user_profile = UserProfile.objects.get(user__username=options["user"])
+        except UserProfile.DoesNotExist:
+            raise CommandError(f"No user profile for user {options['user']}")
+
+        try:
+            with open(options["csv_path"], "rb") as fileobj:
+                result = bulk_load_recipients(user_profile, fileobj, batch_size=options["batch_size"])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for line_number, error in result.errors:
+            if line_number is None:
+                self.stdout.write(error)
+            else:
+                self.stdout.write(f"Line {line_number}: {error}")
+        self.stdout.write(f"Recipients loaded for user {options['user']}: {result}")
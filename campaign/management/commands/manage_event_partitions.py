@@ -0,0 +1,35 @@
+# campaign/management/commands/manage_event_partitions.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from campaign.partitions import create_event_partitions, drop_expired_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly EmailEvent partitions and drop expired ones (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead", type=int, default=3, help="Number of future months to create partitions for"
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.EVENT_RETENTION_DAYS,
+            help="Drop partitions holding only events older than this; 0 keeps every partition",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be done")
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write("EmailEvent is not partitioned on this database; nothing to do.")
+            return
+
+        dry_run = options["dry_run"]
+        for name in create_event_partitions(options["months_ahead"], dry_run=dry_run):
+            self.stdout.write(f"{'Would create' if dry_run else 'Created'} partition {name}")
+
+        if options["retention_days"] > 0:
+            for name in drop_expired_partitions(options["retention_days"], dry_run=dry_run):
+                self.stdout.write(f"{'Would drop' if dry_run else 'Dropped'} partition {name}")
@@ -0,0 +1,27 @@
+# campaign/management/commands/partition_event_table.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from campaign.partitions import is_partitioned, partition_event_table, supports_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild EmailEvent as a table partitioned by month (PostgreSQL). Copies every event, "
+        "so run it in a maintenance window"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead", type=int, default=3, help="Number of future months to create partitions for"
+        )
+
+    def handle(self, *args, **options):
+        if not supports_partitions():
+            raise CommandError("Partitioning EmailEvent needs PostgreSQL")
+        if is_partitioned():
+            self.stdout.write("EmailEvent is already partitioned; nothing to do.")
+            return
+
+        created = partition_event_table(options["months_ahead"])
+        self.stdout.write(f"Partitioned EmailEvent into {len(created)} monthly partitions and a default one")
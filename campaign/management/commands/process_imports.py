@@ -0,0 +1,59 @@
+# campaign/management/commands/process_imports.py
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from campaign.importers import DEFAULT_BATCH_SIZE, process_import_job
+from campaign.models import RecipientImportJob
+
+
+class Command(BaseCommand):
+    help = "Process queued recipient CSV import jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Rows committed per transaction (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=600,
+            help="Seconds without progress after which a running job is resumed (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        stale_before = timezone.now() - timezone.timedelta(seconds=options["stale_after"])
+
+        # Pending jobs, plus running jobs whose worker was killed
+        jobs = RecipientImportJob.objects.filter(
+            Q(status="pending") | Q(status="running", updated_at__lt=stale_before)
+        ).order_by("created_at")
+
+        for job in jobs:
+            # Claim the job; another worker may have picked it up in the meantime
+            claimed = RecipientImportJob.objects.filter(
+                pk=job.pk, status=job.status, updated_at=job.updated_at
+            ).update(status="running", updated_at=timezone.now())
+            if not claimed:
+                continue
+            job.refresh_from_db()
+
+            if job.offset:
+                self.stdout.write(f"Resuming import job {job.pk} at line {job.line_number}")
+            try:
+                process_import_job(job, chunk_size=options["chunk_size"])
+            except Exception as e:
+                job.status = "failed"
+                job.error_message = str(e)
+                job.save(update_fields=["status", "error_message", "updated_at"])
+                self.stdout.write(f"Import job {job.pk} failed: {e}")
+                continue
+
+            self.stdout.write(
+                f"Import job {job.pk} completed: {job.rows_done} rows, {job.inserted_count} added, "
+                f"{job.updated_count} updated, {job.failed_count} failed"
+            )
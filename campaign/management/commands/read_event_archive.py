@@ -0,0 +1,46 @@
+# campaign/management/commands/read_event_archive.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from campaign.archive import archive_files, archive_root, read_archive, read_row_groups
+from campaign.models import EmailCampaign
+
+
+class Command(BaseCommand):
+    help = "Print archived email events of a campaign as NDJSON, or a count per event type"
+
+    def add_arguments(self, parser):
+        parser.add_argument("campaign", type=int, help="Campaign id")
+        parser.add_argument("--month", help="Only read this month (YYYY-MM)")
+        parser.add_argument("--summary", action="store_true", help="Print event counts per type instead of rows")
+        parser.add_argument("--archive-dir", help="Archive directory (default: EVENT_ARCHIVE_ROOT)")
+
+    def handle(self, *args, **options):
+        try:
+            campaign = EmailCampaign.objects.get(id=options["campaign"])
+        except EmailCampaign.DoesNotExist:
+            raise CommandError(f"Campaign {options['campaign']} does not exist")
+
+        root = options["archive_dir"] or archive_root()
+        files = archive_files(root, campaign.user_profile_id, campaign.id)
+        if options["month"]:
+            files = [path for path in files if path.name.startswith(options["month"])]
+
+        if options["summary"]:
+            self.print_summary(files)
+            return
+
+        for path in files:
+            for row in read_archive(path):
+                self.stdout.write(json.dumps(row))
+
+    def print_summary(self, files):
+        counts = {}
+        for path in files:
+            for group in read_row_groups(path, ["event_type"]):
+                for event_type in group["event_type"]:
+                    counts[event_type] = counts.get(event_type, 0) + 1
+        for event_type, count in sorted(counts.items()):
+            self.stdout.write(f"{event_type}: {count}")
@@ -0,0 +1,24 @@
+# campaign/management/commands/refresh_segments.py
+
+from django.core.management.base import BaseCommand
+
+from campaign.models import Segment
+from campaign.segments import refresh_segment
+
+
+class Command(BaseCommand):
+    help = "Fully refresh saved segments and recount their members"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only refresh the segments of this username")
+
+    def handle(self, *args, **options):
+        segments = Segment.objects.order_by("id")
+        if options["user"]:
+            segments = segments.filter(user_profile__user__username=options["user"])
+
+        for segment in segments:
+            added, removed = refresh_segment(segment)
+            self.stdout.write(
+                f"Segment {segment.name}: {segment.member_count} members ({added} added, {removed} removed)"
+            )
@@ -1,95 +1,233 @@
 # campaign/management/commands/send_emails.py
 
+import cProfile
+import os
+
+from django.conf import settings
 from django.core.mail import EmailMessage, EmailMultiAlternatives
-from django.core.mail.backends.smtp import EmailBackend
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 
-from campaign.models import EmailLog, EmailSendCandidate, UserProfile, EmailEvent
-from campaign.email_backends import DirectEmailBackend
+from campaign import metrics
+from campaign.audiences import materialize_candidates
+from campaign.profiling import PhaseTimer
+from campaign.models import EmailCampaign, EmailLog, EmailSendCandidate, UserProfile, EmailEvent
+from campaign.counters import compact_send_counters, emails_remaining, record_send
+from campaign.email_backends import DirectEmailBackend, InstrumentedEmailBackend
+from campaign.suppression import exclude_suppressed_candidates, normalize_email, suppressed_candidates
+from campaign.webhooks import address_domain
 from campaign.tracking import add_tracking_pixel, replace_links_with_tracking, convert_to_html
 
 
 class Command(BaseCommand):
     help = "Send queued emails"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            help="Write a cProfile dump of the run and print the time spent per phase and per user",
+        )
+        parser.add_argument(
+            "--profile-dir", default=".", help="Directory for the --profile dump (default: current directory)"
+        )
+
+    def just_in_time_campaigns(self, now):
+        return EmailCampaign.objects.filter(
+            audience_filter__isnull=False, audience_exhausted=False, scheduled_time__lte=now
+        )
+
+    def queue_just_in_time_candidates(self, user_profile, now, emails_remaining):
+        """
+        Create candidates from just-in-time audiences for the emails this run can send.
+        """
+        campaigns = list(
+            self.just_in_time_campaigns(now).filter(user_profile=user_profile).order_by("scheduled_time", "id")
+        )
+        if not campaigns:
+            return
+
+        pending = EmailSendCandidate.objects.filter(sent=False, scheduled_time__lte=now, user_profile=user_profile).count()
+        shortfall = emails_remaining - pending
+        for campaign in campaigns:
+            if shortfall <= 0:
+                break
+            created = materialize_candidates(campaign, shortfall)
+            shortfall -= created
+            if created:
+                self.stdout.write(f"Queued {created} candidates for campaign {campaign.name}")
+
+    def skip_suppressed(self, user_profile_id, candidates, now):
+        """
+        Mark suppressed candidates as handled, with a suppressed event each.
+
+        They never open a connection and do not count against the sending limits.
+        """
+        with self.timer.phase("db_write", user_profile_id), transaction.atomic():
+            skipped = list(suppressed_candidates(candidates).values_list("id", "recipient__email"))
+            if not skipped:
+                return
+            EmailSendCandidate.objects.filter(id__in=[pk for pk, _ in skipped]).update(sent=True, sent_time=now)
+            EmailEvent.objects.bulk_create([
+                EmailEvent(
+                    email_candidate_id=pk,
+                    event_type='suppressed',
+                    metadata={'reason': 'Address is on the suppression list'},
+                )
+                for pk, _ in skipped
+            ])
+        self.timer.count(user_profile_id, "suppressed", emails=len(skipped))
+        for _, email in skipped:
+            self.stdout.write(f"Skipped suppressed address {email}")
+
     def handle(self, *args, **options):
+        self.timer = PhaseTimer(enabled=options["profile"])
+        if not options["profile"]:
+            self.send_queued_emails()
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            self.send_queued_emails()
+        finally:
+            profiler.disable()
+        path = os.path.join(options["profile_dir"], f"send_emails-{timezone.now():%Y%m%d-%H%M%S}.prof")
+        profiler.dump_stats(path)
+        for line in self.timer.report():
+            self.stdout.write(line)
+        self.stdout.write(f"Profile written to {path} (inspect with: python -m pstats {path})")
+
+    def send_queued_emails(self):
         now = timezone.now()
+        with self.timer.phase("db_write"):
+            compact_send_counters(now)
 
-        # Get distinct user profiles who have pending emails
-        user_profile_ids = (
-            EmailSendCandidate.objects.filter(sent=False, scheduled_time__lte=now)
-            .values_list("user_profile", flat=True)
-            .distinct()
-        )
+        # Get distinct user profiles who have pending emails or due just-in-time audiences
+        with self.timer.phase("candidate_query"):
+            user_profile_ids = set(
+                EmailSendCandidate.objects.filter(sent=False, scheduled_time__lte=now)
+                .values_list("user_profile", flat=True)
+                .distinct()
+            )
+            user_profile_ids.update(
+                self.just_in_time_campaigns(now).values_list("user_profile", flat=True).distinct()
+            )
 
         for user_profile_id in user_profile_ids:
-            user_profile = UserProfile.objects.get(id=user_profile_id)
+            self.send_user_emails(user_profile_id, now)
+
+        # Make this run's metrics visible to /metrics before the process exits
+        metrics.flush()
+
+    def send_user_emails(self, user_profile_id, now):
+        """
+        Send one user's due emails, up to what their sending limits leave.
+        """
+        with self.timer.phase("candidate_query", user_profile_id):
+            user_profile = UserProfile.objects.select_related("user").get(id=user_profile_id)
             user = user_profile.user
+            self.timer.names[user_profile_id] = user.username
 
-            max_emails_per_hour = user_profile.max_emails_per_hour
-
-            one_hour_ago = now - timezone.timedelta(hours=1)
-            emails_sent_last_hour = EmailLog.objects.filter(user_profile=user_profile, sent_time__gte=one_hour_ago).count()
-            emails_remaining = max_emails_per_hour - emails_sent_last_hour
-            if emails_remaining <= 0:
-                self.stdout.write(f"Hourly email limit reached for user {user.username}.")
-                continue
-
-            emails_to_send = EmailSendCandidate.objects.filter(
-                sent=False, scheduled_time__lte=now, user_profile=user_profile
-            ).order_by("scheduled_time")[:emails_remaining]
-
-            for email_candidate in emails_to_send:
-                try:
-                    # Use direct sending or user-specific SMTP settings
-                    if user_profile.direct_send:
-                        backend = DirectEmailBackend(
-                            fail_silently=False,
-                            from_email=user_profile.from_email,
-                        )
-                    else:
-                        backend = EmailBackend(
-                            host=user_profile.smtp_host,
-                            port=user_profile.smtp_port,
-                            username=user_profile.smtp_username,
-                            password=user_profile.smtp_password,
-                            use_tls=user_profile.use_tls,
-                            use_ssl=user_profile.use_ssl,
-                            fail_silently=False,
-                        )
-
-                    # Personalize the email body if necessary
-                    plain_message = email_candidate.campaign.template.body.format(
-                        first_name=email_candidate.recipient.first_name or '',
-                        last_name=email_candidate.recipient.last_name or '',
-                        company=email_candidate.recipient.company or '',
-                        free_field1=email_candidate.recipient.free_field1 or '',
-                        free_field2=email_candidate.recipient.free_field2 or '',
-                        free_field3=email_candidate.recipient.free_field3 or '',
-                    )
+            # Hourly, daily and monthly limits, summed from the per-minute send counters
+            remaining = emails_remaining(user_profile, now)
+        if remaining <= 0:
+            self.stdout.write(f"Email limit reached for user {user.username}.")
+            return
 
-                    # Convert to HTML and add tracking
-                    html_message = convert_to_html(plain_message)
-                    html_message = add_tracking_pixel(html_message, email_candidate.tracking_id)
-                    html_message = replace_links_with_tracking(html_message, email_candidate.tracking_id)
-
-                    # Create multipart email with plain text and HTML
-                    email = EmailMultiAlternatives(
-                        subject=email_candidate.campaign.template.subject,
-                        body=plain_message,  # Plain text version
-                        from_email=user_profile.from_email,
-                        to=[email_candidate.recipient.email],
-                        connection=backend,
-                    )
-                    email.attach_alternative(html_message, "text/html")
+        with self.timer.phase("candidate_query", user_profile_id):
+            self.queue_just_in_time_candidates(user_profile, now, remaining)
+
+            due = EmailSendCandidate.objects.filter(sent=False, scheduled_time__lte=now, user_profile=user_profile)
+            # Suppressed addresses are filtered out here so they do not take up the batch
+            emails_to_send = list(
+                exclude_suppressed_candidates(due)
+                .select_related("recipient", "campaign__template").order_by("scheduled_time")[:remaining]
+            )
+
+        # Suppressed candidates due no later than the last one picked; the query above read past them
+        if len(emails_to_send) == remaining:
+            due = due.filter(scheduled_time__lte=emails_to_send[-1].scheduled_time)
+        self.skip_suppressed(user_profile.id, due, now)
+
+        for email_candidate in emails_to_send:
+            self.timer.start_message()
+            self.send_email(user_profile, email_candidate, now)
+
+    def email_backend(self, user_profile):
+        """Backend for direct sending, or one with the user's own SMTP settings."""
+        if user_profile.direct_send:
+            return DirectEmailBackend(
+                fail_silently=False,
+                from_email=user_profile.from_email,
+            )
+        return InstrumentedEmailBackend(
+            host=user_profile.smtp_host,
+            port=user_profile.smtp_port,
+            username=user_profile.smtp_username,
+            password=user_profile.smtp_password,
+            use_tls=user_profile.use_tls,
+            use_ssl=user_profile.use_ssl,
+            fail_silently=False,
+        )
+
+    def send_email(self, user_profile, email_candidate, now):
+        """
+        Send one email and record the result, its log and event and the send counter.
+        """
+        user = user_profile.user
+        try:
+            backend = self.email_backend(user_profile)
+
+            with self.timer.phase("render", user_profile.id):
+                # Personalize the email body if necessary
+                plain_message = email_candidate.campaign.template.body.format(
+                    first_name=email_candidate.recipient.first_name or '',
+                    last_name=email_candidate.recipient.last_name or '',
+                    company=email_candidate.recipient.company or '',
+                    free_field1=email_candidate.recipient.free_field1 or '',
+                    free_field2=email_candidate.recipient.free_field2 or '',
+                    free_field3=email_candidate.recipient.free_field3 or '',
+                )
+
+                # Convert to HTML and add tracking
+                html_message = convert_to_html(plain_message)
+                html_message = add_tracking_pixel(html_message, email_candidate.tracking_id)
+                html_message = replace_links_with_tracking(html_message, email_candidate.tracking_id)
+
+            with self.timer.phase("mime_build", user_profile.id):
+                # Create multipart email with plain text and HTML
+                email = EmailMultiAlternatives(
+                    subject=email_candidate.campaign.template.subject,
+                    body=plain_message,  # Plain text version
+                    from_email=user_profile.from_email,
+                    to=[email_candidate.recipient.email],
+                    connection=backend,
+                )
+                email.attach_alternative(html_message, "text/html")
+
+            if self.timer.enabled:
+                # Open the connection up front so that connecting and sending are timed apart;
+                # direct sending connects per MX host, inside the send
+                with self.timer.phase("smtp_connect", user_profile.id):
+                    backend.open()
+            try:
+                with self.timer.phase("smtp_send", user_profile.id):
                     email.send()
+            finally:
+                backend.close()
 
-                    email_candidate.sent = True
-                    email_candidate.sent_time = now
-                    email_candidate.save()
+            # The result, its log and event and the send counter are written together
+            with self.timer.phase("db_write", user_profile.id), transaction.atomic():
+                email_candidate.sent = True
+                email_candidate.sent_time = now
+                email_candidate.recipient_email = normalize_email(email_candidate.recipient.email)
+                email_candidate.sender_domain = address_domain(user_profile.from_email)
+                email_candidate.save()
 
-                    # Create EmailLog (for backward compatibility)
+                # Create EmailLog (for backward compatibility), unless logs are derived from events
+                if not settings.EMAIL_LOG_FROM_EVENTS:
                     EmailLog.objects.create(
                         user_profile=user_profile,
                         recipient=email_candidate.recipient.email,
@@ -98,16 +236,23 @@ class Command(BaseCommand):
                         sent_time=now,
                     )
 
-                    # Create EmailEvent for tracking
-                    EmailEvent.objects.create(
-                        email_candidate=email_candidate,
-                        event_type='sent',
-                        metadata={'subject': email_candidate.campaign.template.subject}
-                    )
+                # Create EmailEvent for tracking
+                EmailEvent.objects.create(
+                    email_candidate=email_candidate,
+                    event_type='sent',
+                    metadata={'subject': email_candidate.campaign.template.subject}
+                )
+
+                record_send(user_profile.id, now, sent=True)
+
+            metrics.EMAILS_SENT.inc(tenant=user_profile.id)
+            self.timer.count(user_profile.id, "sent")
 
-                    self.stdout.write(f"Email sent to {email_candidate.recipient.email} for user {user.username}")
-                except Exception as e:
-                    # Create EmailLog (for backward compatibility)
+            self.stdout.write(f"Email sent to {email_candidate.recipient.email} for user {user.username}")
+        except Exception as e:
+            with self.timer.phase("db_write", user_profile.id), transaction.atomic():
+                # Create EmailLog (for backward compatibility), unless logs are derived from events
+                if not settings.EMAIL_LOG_FROM_EVENTS:
                     EmailLog.objects.create(
                         user_profile=user_profile,
                         recipient=email_candidate.recipient.email,
@@ -117,13 +262,18 @@ class Command(BaseCommand):
                         sent_time=now,
                     )
 
-                    # Create EmailEvent for tracking
-                    EmailEvent.objects.create(
-                        email_candidate=email_candidate,
-                        event_type='failed',
-                        metadata={'error': str(e)}
-                    )
+                # Create EmailEvent for tracking
+                EmailEvent.objects.create(
+                    email_candidate=email_candidate,
+                    event_type='failed',
+                    metadata={'error': str(e)}
+                )
 
-                    self.stdout.write(
-                        f"Failed to send email to {email_candidate.recipient.email} for user {user.username}: {e}"
-                    )
+                record_send(user_profile.id, now, sent=False)
+
+            metrics.EMAILS_FAILED.inc(tenant=user_profile.id)
+            self.timer.count(user_profile.id, "failed")
+
+            self.stdout.write(
+                f"Failed to send email to {email_candidate.recipient.email} for user {user.username}: {e}"
+            )
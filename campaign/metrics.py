@@ -0,0 +1,242 @@
+"""
+Prometheus metrics shared by every web worker and send_emails process.
+
+Counters and histograms accumulate in memory and are flushed, at most once
+per METRICS_FLUSH_INTERVAL seconds and at exit, into one local SQLite file
+(settings.METRICS_DB) that all processes add to. The /metrics view renders
+that file in the Prometheus text format, together with gauges such as queue
+depth that are read from the database at scrape time. No external service
+is needed. Flushes due in async views are written on a background thread,
+so the event loop never waits on SQLite.
+"""
+import asyncio
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Latency buckets in seconds, shared by the SMTP phase histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Event lag buckets in seconds, from near real time to a day behind
+LAG_BUCKETS = (1, 5, 15, 60, 300, 900, 3600, 4 * 3600, 24 * 3600)
+
+REGISTRY = []
+
+_lock = threading.Lock()
+_write_lock = threading.Lock()  # serializes writes, which happen outside _lock
+_pending = {}  # (sample name, label string) -> amount not yet flushed
+_state = {"pid": None, "connection": None, "flushed_at": 0.0, "writer": None}
+
+
+def _label_string(labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _connection():
+    # A forked worker must not reuse its parent's connection or unflushed samples
+    if _state["pid"] != os.getpid():
+        _pending.clear()
+        connection = sqlite3.connect(str(settings.METRICS_DB), timeout=5, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS samples (name TEXT, labels TEXT, value REAL, PRIMARY KEY (name, labels))"
+        )
+        _state.update(pid=os.getpid(), connection=connection, flushed_at=time.monotonic(), writer=None)
+    return _state["connection"]
+
+
+def _add(name, labels, amount):
+    with _lock:
+        connection = _connection()
+        key = (name, labels)
+        _pending[key] = _pending.get(key, 0) + amount
+        if time.monotonic() - _state["flushed_at"] < settings.METRICS_FLUSH_INTERVAL:
+            return
+        if _on_event_loop():
+            # The write blocks; async views hand it to a thread rather than stall the loop
+            writer = _state.get("writer")
+            if writer is not None and writer.is_alive():
+                return
+            batch = _take_pending()
+            writer = threading.Thread(target=_write, args=(connection, batch), daemon=True)
+            _state["writer"] = writer
+            writer.start()
+            return
+        batch = _take_pending()
+    _write(connection, batch)
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _take_pending():
+    # Called with _lock held; the samples are written after it is released
+    batch = list(_pending.items())
+    _pending.clear()
+    _state["flushed_at"] = time.monotonic()
+    return batch
+
+
+def _write(connection, batch):
+    if not batch:
+        return
+    with _write_lock, connection:
+        connection.executemany(
+            "INSERT INTO samples (name, labels, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+            [(name, labels, value) for (name, labels), value in batch],
+        )
+
+
+def flush():
+    """Write this process's unflushed samples to the shared store."""
+    writer = _state.get("writer")
+    if writer is not None:
+        writer.join()
+    with _lock:
+        connection = _connection()
+        batch = _take_pending()
+    _write(connection, batch)
+
+
+atexit.register(lambda: _state["pid"] == os.getpid() and flush())
+
+
+def stored_samples():
+    """Every (sample name, label string, value) in the store, this process's included."""
+    flush()
+    with _lock:
+        connection = _connection()
+    with _write_lock:
+        return connection.execute("SELECT name, labels, value FROM samples ORDER BY name, labels").fetchall()
+
+
+class Counter:
+    """Monotonic total, summed across processes."""
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        _add(f"{self.name}_total", _label_string(labels), amount)
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, summed across processes."""
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        # Only the smallest bucket holding the value is stored; exposition
+        # makes the buckets cumulative
+        index = bisect_left(self.buckets, value)
+        bound = self.buckets[index] if index < len(self.buckets) else "+Inf"
+        _add(f"{self.name}_bucket", _label_string(dict(labels, le=bound)), 1)
+        _add(f"{self.name}_sum", _label_string(labels), value)
+        _add(f"{self.name}_count", _label_string(labels), 1)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+EMAILS_SENT = Counter("djangomailer_emails_sent", "Emails accepted by the SMTP server", ("tenant",))
+EMAILS_FAILED = Counter("djangomailer_emails_failed", "Emails that failed to send", ("tenant",))
+SMTP_CONNECT_SECONDS = Histogram(
+    "djangomailer_smtp_connect_seconds", "Time to open an SMTP connection, including SSL"
+)
+SMTP_TLS_SECONDS = Histogram("djangomailer_smtp_tls_seconds", "Time spent in the STARTTLS handshake")
+SMTP_DATA_SECONDS = Histogram("djangomailer_smtp_data_seconds", "Time to transfer a message with DATA")
+MX_CACHE_HITS = Counter("djangomailer_mx_cache_hits", "MX lookups answered from the cache")
+MX_CACHE_MISSES = Counter("djangomailer_mx_cache_misses", "MX lookups that went to DNS")
+TRACKING_HITS = Counter("djangomailer_tracking_hits", "Tracking pixel and click requests", ("kind",))
+EVENT_FLUSH_LAG_SECONDS = Histogram(
+    "djangomailer_event_flush_lag_seconds",
+    "Delay between a provider event and it being recorded",
+    buckets=LAG_BUCKETS,
+)
+
+
+def _bucket_bound(labels):
+    bound = labels.rsplit('le="', 1)[1].rstrip('"')
+    return float("inf") if bound == "+Inf" else float(bound)
+
+
+def _without_le(labels):
+    return ",".join(part for part in labels.split(",") if part and not part.startswith("le="))
+
+
+def _format(name, labels, value):
+    value = int(value) if float(value).is_integer() else value
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+def render(gauges=()):
+    """
+    Render every registered metric, plus gauges computed by the caller, in
+    the Prometheus text exposition format.
+
+    Args:
+        gauges: Iterable of (name, documentation, [(labels dict, value), ...])
+    """
+    samples = {}
+    for name, labels, value in stored_samples():
+        samples.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        if metric.type == "counter":
+            for labels, value in samples.get(f"{metric.name}_total", []):
+                lines.append(_format(f"{metric.name}_total", labels, value))
+            continue
+        buckets = {}
+        for labels, value in samples.get(f"{metric.name}_bucket", []):
+            buckets.setdefault(_without_le(labels), {})[_bucket_bound(labels)] = value
+        for series, count in samples.get(f"{metric.name}_count", []):
+            cumulative = 0
+            for bound in metric.buckets + (float("inf"),):
+                cumulative += buckets.get(series, {}).get(float(bound), 0)
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(_format(f"{metric.name}_bucket", f"{series},{le}" if series else le, cumulative))
+            total = dict(samples.get(f"{metric.name}_sum", [])).get(series, 0)
+            lines.append(_format(f"{metric.name}_sum", series, total))
+            lines.append(_format(f"{metric.name}_count", series, count))
+
+    for name, documentation, values in gauges:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in values:
+            lines.append(_format(name, _label_string(labels), value))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0009_emailsendcandidate_tracking_id_campaignstatistics_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipientImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='recipient_imports/%Y/%m/')),
+                ('original_name', models.CharField(blank=True, max_length=255)),
+                ('file_size', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('line_number', models.IntegerField(default=0)),
+                ('rows_done', models.IntegerField(default=0)),
+                ('inserted_count', models.IntegerField(default=0)),
+                ('updated_count', models.IntegerField(default=0)),
+                ('failed_count', models.IntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipient_import_jobs', to='campaign.userprofile')),
+            ],
+        ),
+    ]
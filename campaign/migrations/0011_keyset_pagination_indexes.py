@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0010_recipientimportjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(fields=['user_profile', 'sent_time', 'id'], name='campaign_em_user_pr_a72ec3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(fields=['user_profile', 'status', 'sent_time', 'id'], name='campaign_em_user_pr_2d5b0b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipient',
+            index=models.Index(fields=['user_profile', 'id'], name='campaign_re_user_pr_a32222_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipient',
+            index=models.Index(fields=['user_profile', 'last_name', 'id'], name='campaign_re_user_pr_134038_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0011_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='audience_cursor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='audience_exhausted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='audience_filter',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Substring search indexes for the recipient filter columns.
+#
+# PostgreSQL: pg_trgm GIN indexes, used by the trigram_contains lookup.
+# SQLite: an external-content FTS5 table with the trigram tokenizer, kept in
+# sync by triggers. Note that SQLite rebuilds a table (dropping its triggers)
+# when some columns are altered, so later migrations that alter Recipient
+# columns must recreate the triggers.
+
+from django.db import migrations
+
+SEARCH_COLUMNS = [
+    "first_name",
+    "last_name",
+    "company",
+    "email",
+    "country",
+    "city",
+    "free_field1",
+    "free_field2",
+    "free_field3",
+]
+
+COLUMNS = ", ".join(SEARCH_COLUMNS)
+NEW_VALUES = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+OLD_VALUES = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE campaign_recipient_search USING fts5({COLUMNS}, "
+    f"content='campaign_recipient', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER campaign_recipient_search_ai AFTER INSERT ON campaign_recipient BEGIN "
+    f"INSERT INTO campaign_recipient_search(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END",
+    f"CREATE TRIGGER campaign_recipient_search_ad AFTER DELETE ON campaign_recipient BEGIN "
+    f"INSERT INTO campaign_recipient_search(campaign_recipient_search, rowid, {COLUMNS}) "
+    f"VALUES ('delete', old.id, {OLD_VALUES}); END",
+    f"CREATE TRIGGER campaign_recipient_search_au AFTER UPDATE ON campaign_recipient BEGIN "
+    f"INSERT INTO campaign_recipient_search(campaign_recipient_search, rowid, {COLUMNS}) "
+    f"VALUES ('delete', old.id, {OLD_VALUES}); "
+    f"INSERT INTO campaign_recipient_search(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END",
+    "INSERT INTO campaign_recipient_search(campaign_recipient_search) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS campaign_recipient_search_ai",
+    "DROP TRIGGER IF EXISTS campaign_recipient_search_ad",
+    "DROP TRIGGER IF EXISTS campaign_recipient_search_au",
+    "DROP TABLE IF EXISTS campaign_recipient_search",
+]
+
+
+def sqlite_has_trigram_fts(schema_editor):
+    # FTS5 is optional in SQLite builds and the trigram tokenizer needs 3.34+
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x, tokenize='trigram')")
+        except Exception:
+            return False
+        cursor.execute("DROP TABLE temp.fts5_probe")
+    return True
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in SEARCH_COLUMNS:
+            schema_editor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS campaign_recipient_{column}_trgm "
+                f"ON campaign_recipient USING gin ({column} gin_trgm_ops)"
+            )
+    elif vendor == "sqlite" and sqlite_has_trigram_fts(schema_editor):
+        for statement in SQLITE_FORWARD:
+            schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for column in SEARCH_COLUMNS:
+            schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS campaign_recipient_{column}_trgm")
+    elif vendor == "sqlite":
+        for statement in SQLITE_BACKWARD:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('campaign', '0012_emailcampaign_just_in_time_audience'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0013_recipient_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Segment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('filters', models.JSONField(default=dict)),
+                ('member_count', models.IntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='campaign.userprofile')),
+            ],
+            options={
+                'unique_together': {('user_profile', 'name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='segment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='campaigns', to='campaign.segment'),
+        ),
+        migrations.CreateModel(
+            name='SegmentMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segment_memberships', to='campaign.recipient')),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='campaign.segment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipient', 'segment'], name='campaign_se_recipie_6b6959_idx')],
+                'unique_together': {('segment', 'recipient')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0014_segments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailevent',
+            name='event_type',
+            field=models.CharField(choices=[('sent', 'Sent'), ('delivered', 'Delivered'), ('opened', 'Opened'), ('clicked', 'Clicked'), ('bounced', 'Bounced'), ('failed', 'Failed'), ('complained', 'Spam Complaint'), ('suppressed', 'Suppressed')], db_index=True, max_length=20),
+        ),
+        migrations.CreateModel(
+            name='SuppressedAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('reason', models.CharField(choices=[('bounced', 'Hard Bounce'), ('complained', 'Spam Complaint'), ('manual', 'Manual')], default='manual', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user_profile', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='suppressed_addresses', to='campaign.userprofile')),
+            ],
+            options={
+                'verbose_name_plural': 'suppressed addresses',
+                'constraints': [models.UniqueConstraint(fields=('user_profile', 'email'), name='unique_suppression_per_user'), models.UniqueConstraint(condition=models.Q(('user_profile__isnull', True)), fields=('email',), name='unique_global_suppression')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Lower
+
+
+def backfill_sent_candidates(apps, schema_editor):
+    EmailSendCandidate = apps.get_model('campaign', 'EmailSendCandidate')
+    Recipient = apps.get_model('campaign', 'Recipient')
+    UserProfile = apps.get_model('campaign', 'UserProfile')
+
+    sent = EmailSendCandidate.objects.filter(sent=True)
+    sent.update(recipient_email=Subquery(
+        Recipient.objects.filter(pk=OuterRef('recipient_id')).values(email_lower=Lower('email'))[:1]
+    ))
+    for profile_id, from_email in UserProfile.objects.values_list('id', 'from_email'):
+        domain = from_email.rpartition('@')[2].lower()
+        if domain:
+            sent.filter(user_profile_id=profile_id).update(sender_domain=domain)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0015_suppressed_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailsendcandidate',
+            name='recipient_email',
+            field=models.EmailField(blank=True, default='', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='emailsendcandidate',
+            name='sender_domain',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(backfill_sent_candidates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='emailsendcandidate',
+            index=models.Index(condition=models.Q(('sent', True)), fields=['recipient_email', '-sent_time'], name='candidate_sent_email_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:48
+
+from django.db import migrations, models
+from django.db.models import CharField, Min, Value
+from django.db.models.functions import Cast, Concat
+
+
+def key_existing_deliveries(apps, schema_editor):
+    # Deliveries are keyed per candidate; give the first recorded delivery of
+    # each candidate its key so retries of old webhooks are ignored too
+    EmailEvent = apps.get_model('campaign', 'EmailEvent')
+    first_deliveries = (
+        EmailEvent.objects.filter(event_type='delivered')
+        .values('email_candidate_id')
+        .annotate(first_id=Min('id'))
+        .values('first_id')
+    )
+    EmailEvent.objects.filter(id__in=first_deliveries).update(
+        idempotency_key=Concat(Value('delivered:'), Cast('email_candidate_id', CharField()))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0016_candidate_recipient_email_lookup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailevent',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.RunPython(key_existing_deliveries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,108 @@
+# Idempotency keys of EmailEvent, claimed in their own table.
+#
+# Keys are no longer a unique index on campaign_emailevent: a BEFORE INSERT
+# trigger claims each key in campaign_emailevent_key (the EmailEventKey model)
+# and skips the event when its key is already taken, which keeps
+# bulk_create(ignore_conflicts=True) deduplicating in a single statement. A
+# table partitioned by timestamp cannot have a unique index on the key alone,
+# so this is what lets the partition_event_table command partition the event
+# table later; the migration itself only adds the key table and the trigger
+# and does not rewrite campaign_emailevent.
+#
+# Note that SQLite rebuilds a table (dropping its triggers) when some columns
+# are altered, so later migrations that alter EmailEvent columns must
+# recreate the trigger.
+
+from django.db import migrations, models
+
+KEY_TABLE = "campaign_emailevent_key"
+
+CLAIM_KEYS = f"""
+INSERT INTO {KEY_TABLE} (idempotency_key, created_at)
+SELECT idempotency_key, MIN("timestamp") FROM campaign_emailevent
+WHERE idempotency_key IS NOT NULL GROUP BY idempotency_key
+"""
+
+POSTGRESQL_FORWARD = [
+    f"""
+    CREATE FUNCTION {KEY_TABLE}_claim() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.idempotency_key IS NULL THEN
+            RETURN NEW;
+        END IF;
+        INSERT INTO {KEY_TABLE} (idempotency_key, created_at)
+        VALUES (NEW.idempotency_key, NEW."timestamp")
+        ON CONFLICT DO NOTHING;
+        IF FOUND THEN
+            RETURN NEW;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"CREATE TRIGGER {KEY_TABLE}_claim BEFORE INSERT ON campaign_emailevent "
+    f"FOR EACH ROW EXECUTE FUNCTION {KEY_TABLE}_claim()",
+]
+
+POSTGRESQL_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {KEY_TABLE}_claim ON campaign_emailevent",
+    f"DROP FUNCTION IF EXISTS {KEY_TABLE}_claim()",
+]
+
+SQLITE_FORWARD = [
+    f"CREATE TRIGGER {KEY_TABLE}_claim BEFORE INSERT ON campaign_emailevent "
+    f"WHEN new.idempotency_key IS NOT NULL BEGIN "
+    f"SELECT RAISE(IGNORE) WHERE EXISTS "
+    f"(SELECT 1 FROM {KEY_TABLE} WHERE idempotency_key = new.idempotency_key); "
+    f"INSERT INTO {KEY_TABLE} (idempotency_key, created_at) VALUES (new.idempotency_key, new.\"timestamp\"); END",
+]
+
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {KEY_TABLE}_claim",
+]
+
+TRIGGER_SQL = {
+    "postgresql": (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+    "sqlite": (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def create_claim_trigger(apps, schema_editor):
+    forward, _ = TRIGGER_SQL.get(schema_editor.connection.vendor, ([], []))
+    schema_editor.execute(CLAIM_KEYS)
+    for statement in forward:
+        schema_editor.execute(statement)
+
+
+def drop_claim_trigger(apps, schema_editor):
+    _, backward = TRIGGER_SQL.get(schema_editor.connection.vendor, ([], []))
+    for statement in backward:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0017_emailevent_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailEventKey',
+            fields=[
+                ('idempotency_key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'campaign_emailevent_key',
+            },
+        ),
+        # A plain index, with uniqueness left to the key table. On SQLite this
+        # rebuilds campaign_emailevent, so the trigger is created after it.
+        migrations.AlterField(
+            model_name='emailevent',
+            name='idempotency_key',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.RunPython(create_claim_trigger, drop_claim_trigger),
+    ]
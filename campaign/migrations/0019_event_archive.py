@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0018_partition_emailevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignstatistics',
+            name='archived_event_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='emailsendcandidate',
+            name='archived_event_types',
+            field=models.CharField(blank=True, default='', max_length=120),
+        ),
+    ]
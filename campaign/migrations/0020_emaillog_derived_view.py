@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:59
+
+from django.db import migrations, models
+
+# EmailLog rows derived from 'sent' and 'failed' events, read through the
+# unmanaged DerivedEmailLog model when EMAIL_LOG_FROM_EVENTS is set. The
+# campaign_emaillog_derived view itself is created after every migrate by
+# campaign.derived_logs (and dropped before it), so it never stands in the
+# way of a table rebuild on SQLite.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0019_event_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DerivedEmailLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(max_length=254)),
+                ('status', models.CharField(max_length=10)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('sent_time', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'email log (derived from events)',
+                'db_table': 'campaign_emaillog_derived',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.2 on 2026-10-18 23:03
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncHour, TruncMinute
+from django.utils import timezone
+
+
+def backfill_counters(apps, schema_editor):
+    # Per-minute rows for the last day (the hourly quota window), hourly rows
+    # before that, matching what campaign.counters.compact_send_counters keeps
+    EmailLog = apps.get_model('campaign', 'EmailLog')
+    SendCounter = apps.get_model('campaign', 'SendCounter')
+    cutoff = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+    buckets = [
+        EmailLog.objects.filter(sent_time__lt=cutoff).annotate(bucket=TruncHour('sent_time')),
+        EmailLog.objects.filter(sent_time__gte=cutoff).annotate(bucket=TruncMinute('sent_time')),
+    ]
+    for logs in buckets:
+        rows = logs.values('user_profile_id', 'bucket').annotate(
+            sent=Count('id', filter=Q(status='Sent')), failed=Count('id', filter=~Q(status='Sent'))
+        ).order_by()
+        SendCounter.objects.bulk_create(
+            (
+                SendCounter(
+                    user_profile_id=row['user_profile_id'], minute=row['bucket'], sent=row['sent'], failed=row['failed']
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0020_emaillog_derived_view'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='max_emails_per_day',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='max_emails_per_month',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='SendCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField()),
+                ('sent', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='send_counters', to='campaign.userprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user_profile', 'minute'), name='unique_send_counter_minute')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-18 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0021_send_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailsendcandidate',
+            index=models.Index(condition=models.Q(('sent', False)), fields=['user_profile', 'scheduled_time'], name='candidate_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models.functions import Lower, Trim
+
+
+def normalize_suppressed_addresses(apps, schema_editor):
+    SuppressedAddress = apps.get_model('campaign', 'SuppressedAddress')
+
+    # Entries typed into the admin were stored as entered; an entry whose
+    # normalized address is already on the same list is dropped
+    entries = SuppressedAddress.objects.exclude(email=Lower(Trim('email'))).order_by('id')
+    for pk, user_profile_id, email in list(entries.values_list('id', 'user_profile_id', 'email')):
+        email = email.strip().lower()
+        if SuppressedAddress.objects.filter(user_profile_id=user_profile_id, email=email).exists():
+            SuppressedAddress.objects.filter(pk=pk).delete()
+        else:
+            SuppressedAddress.objects.filter(pk=pk).update(email=email)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0022_candidate_pending_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_suppressed_addresses, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
 from django.db.models.signals import post_save
@@ -16,6 +17,9 @@ class UserProfile(models.Model):
     use_ssl = models.BooleanField(default=False)
     from_email = models.EmailField()
     max_emails_per_hour = models.IntegerField(default=100)
+    # Optional daily and monthly (UTC) sending limits; empty means no limit
+    max_emails_per_day = models.IntegerField(null=True, blank=True)
+    max_emails_per_month = models.IntegerField(null=True, blank=True)
     direct_send = models.BooleanField(
         default=False,
         help_text="Send emails directly to recipient mail servers without using SMTP relay"
@@ -55,11 +59,103 @@ class Recipient(models.Model):
 
     class Meta:
         unique_together = ("user_profile", "email")  # Ensure unique email per user
+        indexes = [
+            # Keyset pagination of recipient_list
+            models.Index(fields=["user_profile", "id"]),
+            models.Index(fields=["user_profile", "last_name", "id"]),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
 
+class RecipientImportJob(models.Model):
+    """
+    A CSV upload queued for import by the process_imports command.
+
+    Progress is committed together with each chunk of rows, so an interrupted
+    job resumes from `offset` instead of starting over.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="recipient_import_jobs")
+    file = models.FileField(upload_to="recipient_imports/%Y/%m/")
+    original_name = models.CharField(max_length=255, blank=True)
+    file_size = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+
+    # Resume point: byte offset and CSV line number just after the last committed row
+    offset = models.BigIntegerField(default=0)
+    line_number = models.IntegerField(default=0)
+
+    rows_done = models.IntegerField(default=0)
+    inserted_count = models.IntegerField(default=0)
+    updated_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # [[line_number, message], ...]
+    error_message = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import of {self.original_name} ({self.status})"
+
+    @property
+    def progress(self):
+        """Percentage of the file processed so far."""
+        if self.status == 'completed':
+            return 100
+        if not self.file_size:
+            return 0
+        return min(100, int(self.offset * 100 / self.file_size))
+
+
+class Segment(models.Model):
+    """
+    A saved recipient filter with materialized membership.
+
+    Membership rows are maintained by campaign.segments as recipients are
+    imported or edited; member_count is kept in step so the size of a segment
+    never requires a COUNT over its members. Code that saves or deletes
+    recipients calls campaign.segments itself: Recipient has no signal
+    receivers, so deleting recipients (or their user) stays a fast delete.
+    """
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="segments")
+    name = models.CharField(max_length=100)
+    filters = models.JSONField(default=dict)  # RecipientFilterForm cleaned data
+    member_count = models.IntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("user_profile", "name")
+
+    def __str__(self):
+        return self.name
+
+
+class SegmentMembership(models.Model):
+    segment = models.ForeignKey(Segment, on_delete=models.CASCADE, related_name="memberships")
+    recipient = models.ForeignKey(Recipient, on_delete=models.CASCADE, related_name="segment_memberships")
+
+    class Meta:
+        # The unique index serves lookups by segment; the second one lookups by recipient
+        unique_together = ("segment", "recipient")
+        indexes = [
+            models.Index(fields=["recipient", "segment"]),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient_id} in {self.segment_id}"
+
+
 class EmailCampaign(models.Model):
     user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="email_campaigns")
     name = models.CharField(max_length=100)
@@ -67,9 +163,22 @@ class EmailCampaign(models.Model):
     recipients = models.ManyToManyField(Recipient)
     scheduled_time = models.DateTimeField()
 
+    # Just-in-time audience: RecipientFilterForm data whose matches are turned
+    # into candidates by send_emails, batch by batch, in recipient id order
+    audience_filter = models.JSONField(null=True, blank=True)
+    audience_cursor = models.BigIntegerField(default=0)  # Last recipient id queued
+    audience_exhausted = models.BooleanField(default=False)  # Set once every match is queued; never reset
+    segment = models.ForeignKey(
+        Segment, on_delete=models.SET_NULL, null=True, blank=True, related_name="campaigns"
+    )
+
     def __str__(self):
         return self.name
 
+    @property
+    def is_just_in_time(self):
+        return self.audience_filter is not None
+
 
 class EmailLog(models.Model):
     user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="email_logs")
@@ -79,10 +188,78 @@ class EmailLog(models.Model):
     error_message = models.TextField(blank=True, null=True)
     sent_time = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            # Keyset pagination and filtering of log_list
+            models.Index(fields=["user_profile", "sent_time", "id"]),
+            models.Index(fields=["user_profile", "status", "sent_time", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient} - {self.status}"
+
+
+class DerivedEmailLog(models.Model):
+    """
+    Read-only EmailLog rows derived from 'sent' and 'failed' EmailEvents by
+    the campaign_emaillog_derived database view (see campaign.derived_logs).
+
+    Used instead of EmailLog when settings.EMAIL_LOG_FROM_EVENTS is set, so
+    send_emails writes a single event per outcome. The id is the event's id.
+    A row only lasts as long as its event: events moved out by archive_events,
+    and the events of deleted recipients, drop out of the derived logs.
+    """
+    user_profile = models.ForeignKey(
+        UserProfile, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    recipient = models.EmailField()
+    campaign = models.ForeignKey(
+        EmailCampaign, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="+"
+    )
+    status = models.CharField(max_length=10)
+    error_message = models.TextField(blank=True, null=True)
+    sent_time = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = "campaign_emaillog_derived"
+        verbose_name = "email log (derived from events)"
+
     def __str__(self):
         return f"{self.recipient} - {self.status}"
 
 
+class SendCounter(models.Model):
+    """
+    Number of emails a user profile sent and failed to send in one minute.
+
+    Written by campaign.counters in the same transaction as each send result,
+    and compacted into hourly rows once older than a day, so quota and
+    dashboard windows sum a few thousand rows at most.
+    """
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="send_counters")
+    minute = models.DateTimeField()
+    sent = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user_profile", "minute"], name="unique_send_counter_minute"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_profile} {self.minute:%Y-%m-%d %H:%M}: {self.sent} sent, {self.failed} failed"
+
+
+def email_logs():
+    """
+    Queryset of email logs: stored EmailLog rows, or DerivedEmailLog rows
+    when settings.EMAIL_LOG_FROM_EVENTS is set.
+    """
+    model = DerivedEmailLog if getattr(settings, "EMAIL_LOG_FROM_EVENTS", False) else EmailLog
+    return model.objects.all()
+
+
 class EmailSendCandidate(models.Model):
     user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="email_send_candidates")
     recipient = models.ForeignKey(Recipient, on_delete=models.CASCADE)
@@ -93,6 +270,30 @@ class EmailSendCandidate(models.Model):
     campaign = models.ForeignKey(EmailCampaign, on_delete=models.CASCADE, null=True, blank=True)
     tracking_id = models.UUIDField(default=uuid.uuid4, editable=False, db_index=True)
 
+    # Copies of the recipient address (lowercase) and, once sent, the sender's
+    # domain, so webhooks that only carry an address find the email without a
+    # join on Recipient
+    recipient_email = models.EmailField(blank=True, default="")
+    sender_domain = models.CharField(max_length=255, blank=True, default="")
+    # Event types of this email whose events were moved to the cold archive,
+    # as ",opened,clicked,", so unique counts survive archival
+    archived_event_types = models.CharField(max_length=120, blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["recipient_email", "-sent_time"],
+                condition=models.Q(sent=True),
+                name="candidate_sent_email_idx",
+            ),
+            # Pending emails per user profile, read by send_emails and the queue depth metric
+            models.Index(
+                fields=["user_profile", "scheduled_time"],
+                condition=models.Q(sent=False),
+                name="candidate_pending_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.recipient.email} - {self.template.name}"
 
@@ -100,6 +301,8 @@ class EmailSendCandidate(models.Model):
         # Ensure tracking_id is unique
         if not self.tracking_id:
             self.tracking_id = uuid.uuid4()
+        if not self.recipient_email and self.recipient_id:
+            self.recipient_email = self.recipient.email.strip().lower()
         super().save(*args, **kwargs)
 
 
@@ -116,6 +319,7 @@ class EmailEvent(models.Model):
         ('bounced', 'Bounced'),
         ('failed', 'Failed'),
         ('complained', 'Spam Complaint'),
+        ('suppressed', 'Suppressed'),
     ]
 
     email_candidate = models.ForeignKey(
@@ -128,6 +332,10 @@ class EmailEvent(models.Model):
     user_agent = models.TextField(blank=True, null=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     metadata = models.JSONField(default=dict, blank=True)  # For additional event data
+    # Set for provider events so retried webhooks are ignored by the database;
+    # see campaign.webhooks.event_idempotency_key. Unique through EmailEventKey
+    # rather than a unique index, which a partitioned table could not have
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True, db_index=True)
 
     class Meta:
         ordering = ['-timestamp']
@@ -137,7 +345,74 @@ class EmailEvent(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.email_candidate.recipient.email} - {self.event_type} at {self.timestamp}"
+        # The candidate's copy of the address, so listing events does not read every recipient
+        return f"{self.email_candidate.recipient_email} - {self.event_type} at {self.timestamp}"
+
+
+class EmailEventKey(models.Model):
+    """
+    An idempotency key claimed by an EmailEvent.
+
+    Rows are only written by a BEFORE INSERT trigger on the event table
+    (migration 0018), which claims the key of each new event and skips the
+    event when its key is already taken. That keeps keys unique whether or
+    not the event table is partitioned.
+    """
+    idempotency_key = models.CharField(max_length=100, primary_key=True)
+    created_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "campaign_emailevent_key"
+
+    def __str__(self):
+        return self.idempotency_key
+
+
+class SuppressedAddress(models.Model):
+    """
+    An address that must not be sent to again.
+
+    Entries with a user_profile apply to that user only; entries without one
+    apply to everybody. Addresses are stored normalized (see
+    campaign.suppression.normalize_email).
+    """
+    REASON_CHOICES = [
+        ('bounced', 'Hard Bounce'),
+        ('complained', 'Spam Complaint'),
+        ('manual', 'Manual'),
+    ]
+
+    user_profile = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, null=True, blank=True, related_name="suppressed_addresses"
+    )
+    email = models.EmailField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default='manual')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "suppressed addresses"
+        constraints = [
+            models.UniqueConstraint(fields=['user_profile', 'email'], name='unique_suppression_per_user'),
+            # NULLs never conflict in the constraint above
+            models.UniqueConstraint(
+                fields=['email'], condition=models.Q(user_profile__isnull=True), name='unique_global_suppression'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.email} ({self.reason})"
+
+    def clean(self):
+        # Before validate_unique, so that a differently cased duplicate is reported as such
+        self.normalize()
+
+    def save(self, *args, **kwargs):
+        self.normalize()
+        super().save(*args, **kwargs)
+
+    def normalize(self):
+        from campaign.suppression import normalize_email
+        self.email = normalize_email(self.email)
 
 
 class CampaignStatistics(models.Model):
@@ -171,6 +446,9 @@ class CampaignStatistics(models.Model):
     click_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0.0)  # clicked/delivered
     bounce_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0.0)  # bounced/sent
 
+    # Number of events per type moved to the cold archive by archive_events
+    archived_event_counts = models.JSONField(default=dict, blank=True)
+
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -185,26 +463,38 @@ class CampaignStatistics(models.Model):
         candidates = self.campaign.emailsendcandidate_set.all()
         self.total_recipients = candidates.count()
 
+        archived = self.archived_event_counts
+
+        def with_event(event_type):
+            # Emails with a live event of this type, plus, only once some were
+            # archived, the emails whose events of this type are all archived
+            count = candidates.filter(events__event_type=event_type).distinct().count()
+            if archived.get(event_type):
+                count += candidates.filter(archived_event_types__contains=f",{event_type},").exclude(
+                    events__event_type=event_type
+                ).count()
+            return count
+
         # Count events by type
-        self.sent_count = candidates.filter(events__event_type='sent').distinct().count()
-        self.delivered_count = candidates.filter(events__event_type='delivered').distinct().count()
-        self.bounced_count = candidates.filter(events__event_type='bounced').distinct().count()
-        self.failed_count = candidates.filter(events__event_type='failed').distinct().count()
-        self.complained_count = candidates.filter(events__event_type='complained').distinct().count()
+        self.sent_count = with_event('sent')
+        self.delivered_count = with_event('delivered')
+        self.bounced_count = with_event('bounced')
+        self.failed_count = with_event('failed')
+        self.complained_count = with_event('complained')
 
         # Unique opens and clicks
-        self.unique_opens = candidates.filter(events__event_type='opened').distinct().count()
-        self.unique_clicks = candidates.filter(events__event_type='clicked').distinct().count()
+        self.unique_opens = with_event('opened')
+        self.unique_clicks = with_event('clicked')
 
         # Total opens and clicks (including multiple opens/clicks per recipient)
         self.opened_count = EmailEvent.objects.filter(
             email_candidate__campaign=self.campaign,
             event_type='opened'
-        ).count()
+        ).count() + archived.get('opened', 0)
         self.clicked_count = EmailEvent.objects.filter(
             email_candidate__campaign=self.campaign,
             event_type='clicked'
-        ).count()
+        ).count() + archived.get('clicked', 0)
 
         # Calculate rates
         if self.sent_count > 0:
@@ -0,0 +1,184 @@
+"""
+Keyset (cursor) pagination for large, tenant-scoped querysets.
+
+Unlike OFFSET pagination, each page is fetched with a WHERE clause on the
+sort key of the last row seen, so the cost of a page does not depend on how
+deep into the table it is, and no COUNT(*) is needed.
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+
+
+class KeysetPage:
+    """
+    One page of results plus the cursors needed to move to its neighbours.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _encode_value(value):
+    # Full microsecond precision; DjangoJSONEncoder truncates to milliseconds,
+    # which would make the cursor skip or repeat rows
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values):
+    """Encode a tuple of sort key values as an opaque URL-safe token."""
+    data = json.dumps(list(values), default=_encode_value).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(token, fields):
+    """
+    Decode a cursor token produced by encode_cursor.
+
+    Args:
+        token: The cursor token from the query string
+        fields: Model fields of the sort key, used to restore value types
+
+    Returns:
+        List of sort key values, or None if the token is invalid
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(fields):
+        return None
+
+    # A tampered cursor must not reach the query, where a value of the wrong
+    # type raises instead of matching nothing
+    try:
+        values = [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValidationError, ValueError, TypeError):
+        return None
+    if any(value is None for value in values):
+        return None
+    return values
+
+
+def keyset_filter(ordering, values, reverse=False):
+    """
+    Build the "comes after this row" condition for an ordering.
+
+    For ordering (a, b) this is (a > x) OR (a = x AND b > y), with the
+    comparison flipped for descending fields (and again when `reverse`).
+    """
+    condition = Q()
+    equal = Q()
+    for key, value in zip(ordering, values):
+        name = key.lstrip("-")
+        descending = key.startswith("-") != reverse
+        lookup = "lt" if descending else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def _apply_cursor(queryset, ordering, fields, after, before):
+    """
+    Filter and order a queryset for the page after or before a cursor.
+
+    Returns:
+        (queryset, direction), direction being "before", "after" or None when
+        there is no valid cursor
+    """
+    if before:
+        values = decode_cursor(before, fields)
+        if values is not None:
+            reversed_ordering = [key[1:] if key.startswith("-") else f"-{key}" for key in ordering]
+            queryset = queryset.filter(keyset_filter(ordering, values, reverse=True))
+            return queryset.order_by(*reversed_ordering), "before"
+    elif after:
+        values = decode_cursor(after, fields)
+        if values is not None:
+            return queryset.filter(keyset_filter(ordering, values)).order_by(*ordering), "after"
+    return queryset.order_by(*ordering), None
+
+
+def paginate_keyset(queryset, ordering, after=None, before=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one page of a queryset using keyset pagination.
+
+    The ordering must end with a unique field (normally "id" or "-id") so that
+    every row has a distinct position; the sort fields must not be nullable.
+
+    Args:
+        queryset: The filtered queryset to paginate
+        ordering: Tuple of field names, optionally prefixed with "-"
+        after: Cursor of the last row of the previous page (move forward)
+        before: Cursor of the first row of the next page (move backward)
+        page_size: Number of rows per page
+
+    Returns:
+        KeysetPage with the rows and the next/previous cursors
+    """
+    names = [key.lstrip("-") for key in ordering]
+    fields = [queryset.model._meta.get_field(name) for name in names]
+    queryset, direction = _apply_cursor(queryset, ordering, fields, after, before)
+    backwards = direction == "before"
+    forwards = direction == "after"
+
+    # Fetch one extra row to find out whether there is another page
+    rows = list(queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(row):
+        return encode_cursor(getattr(row, field.attname) for field in fields)
+
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = cursor_for(rows[-1])
+        if (has_more and backwards) or forwards:
+            previous_cursor = cursor_for(rows[0])
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def cursor_querystring(query_dict, after=None, before=None):
+    """
+    Build the query string for a page link, keeping the current filters.
+
+    Returns:
+        The encoded query string, or None if there is no cursor
+    """
+    if after is None and before is None:
+        return None
+    query = query_dict.copy()
+    query.pop("after", None)
+    query.pop("before", None)
+    if after is not None:
+        query["after"] = after
+    if before is not None:
+        query["before"] = before
+    return query.urlencode()
@@ -0,0 +1,200 @@
+"""
+Monthly range partitions of the EmailEvent table on PostgreSQL.
+
+The partition_event_table command turns campaign_emailevent into a table
+partitioned by RANGE ("timestamp") with one partition per calendar month
+(UTC), so queries that filter on timestamp only scan the months they cover.
+It copies every event, so it is opt-in and meant for a maintenance window.
+Partitions are then created ahead of time by the manage_event_partitions
+command, and retention drops whole expired partitions instead of deleting
+rows.
+
+A partitioned table cannot have a unique index that leaves out the partition
+key, so event idempotency keys are claimed in the narrow EmailEventKey table
+by a BEFORE INSERT trigger (migration 0018), which skips rows whose key is
+already taken. The trigger is the same with or without partitioning.
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from campaign.models import EmailEventKey
+
+EVENT_TABLE = "campaign_emailevent"
+KEY_TABLE = "campaign_emailevent_key"
+OLD_TABLE = f"{EVENT_TABLE}_unpartitioned"
+DEFAULT_PARTITION = f"{EVENT_TABLE}_default"
+
+PARTITION_NAME_RE = re.compile(rf"^{EVENT_TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+
+def supports_partitions():
+    return connection.vendor == "postgresql"
+
+
+def month_start(moment):
+    """First instant (UTC) of the month containing an aware datetime."""
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f"{EVENT_TABLE}_p{month:%Y_%m}"
+
+
+def partition_month(name):
+    """Month a partition holds, from its name, or None for other tables."""
+    match = PARTITION_NAME_RE.match(name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+
+
+def expired_partitions(names, cutoff):
+    """Names of the monthly partitions whose whole month is older than cutoff."""
+    return sorted(
+        name for name in names
+        if partition_month(name) is not None and next_month(partition_month(name)) <= cutoff
+    )
+
+
+def is_partitioned():
+    if not supports_partitions():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [EVENT_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def event_partitions():
+    """Names of the partitions attached to the event table."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s) ORDER BY child.relname",
+            [EVENT_TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_event_partitions(months_ahead=3, now=None, dry_run=False):
+    """
+    Create the partitions from the current month through months_ahead months
+    from now, skipping ones that already exist.
+
+    Returns:
+        List of the names of the partitions created
+    """
+    month = month_start(now or timezone.now())
+    existing = set(event_partitions())
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for _ in range(months_ahead + 1):
+            name = partition_name(month)
+            if name not in existing:
+                if not dry_run:
+                    cursor.execute(
+                        f'CREATE TABLE "{name}" PARTITION OF {EVENT_TABLE} FOR VALUES FROM (%s) TO (%s)',
+                        [month, next_month(month)],
+                    )
+                created.append(name)
+            month = next_month(month)
+    return created
+
+
+def drop_expired_partitions(retention_days, now=None, dry_run=False):
+    """
+    Drop the monthly partitions that only hold events older than retention_days.
+
+    Detaching and dropping a partition is a catalog change, so expired events
+    go without a DELETE and without leaving dead rows to vacuum. Idempotency
+    keys older than the cutoff are removed with them.
+
+    Returns:
+        List of the names of the partitions dropped
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=retention_days)
+    dropped = expired_partitions(event_partitions(), cutoff)
+    if dry_run or not dropped:
+        return dropped
+    with transaction.atomic(), connection.cursor() as cursor:
+        for name in dropped:
+            cursor.execute(f'ALTER TABLE {EVENT_TABLE} DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+        EmailEventKey.objects.filter(created_at__lt=next_month(partition_month(dropped[-1]))).delete()
+    return dropped
+
+
+def partition_event_table(months_ahead=3, now=None):
+    """
+    Rebuild the event table as a partitioned table, copying every event.
+
+    Creates one partition per month from the oldest event through
+    months_ahead months from now, plus a default partition for anything
+    outside that range. Indexes, foreign keys and the key-claiming trigger
+    are recreated under their existing names; the primary key becomes
+    (id, timestamp) as partitioning requires.
+
+    Returns:
+        List of the names of the partitions created
+    """
+    now = now or timezone.now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN("timestamp") FROM {EVENT_TABLE}')
+        oldest = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexdef NOT LIKE 'CREATE UNIQUE%%'",
+            [EVENT_TABLE],
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [EVENT_TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(f"ALTER TABLE {EVENT_TABLE} RENAME TO {OLD_TABLE}")
+        cursor.execute(
+            f'CREATE TABLE {EVENT_TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        created = []
+        month = month_start(oldest or now)
+        last = month_start(now + timedelta(days=31 * months_ahead))
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE "{partition_name(month)}" PARTITION OF {EVENT_TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [month, next_month(month)],
+            )
+            created.append(partition_name(month))
+            month = next_month(month)
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {EVENT_TABLE} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {EVENT_TABLE} SELECT * FROM {OLD_TABLE}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{EVENT_TABLE}', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            f"FROM {EVENT_TABLE}"
+        )
+        # Dropping the old table takes its trigger along, and frees the index and constraint names
+        cursor.execute(f"DROP TABLE {OLD_TABLE}")
+
+        cursor.execute(f'ALTER TABLE {EVENT_TABLE} ADD CONSTRAINT {EVENT_TABLE}_pkey PRIMARY KEY (id, "timestamp")')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {EVENT_TABLE} ADD CONSTRAINT "{name}" {definition}')
+        for definition in index_definitions:
+            cursor.execute(re.sub(r" ON (\S+\.)?" + EVENT_TABLE + " ", f" ON {EVENT_TABLE} ", definition, count=1))
+        cursor.execute(
+            f"CREATE TRIGGER {KEY_TABLE}_claim BEFORE INSERT ON {EVENT_TABLE} "
+            f"FOR EACH ROW EXECUTE FUNCTION {KEY_TABLE}_claim()"
+        )
+    return created
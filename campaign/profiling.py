@@ -0,0 +1,111 @@
+"""
+Per-phase timing of a send_emails run, reported by send_emails --profile.
+
+Each phase is timed with time.perf_counter() and summed per user profile, so
+a slow run shows whether its time went to queries, rendering, SMTP or the
+database writes that record each result. A disabled timer does nothing.
+"""
+import math
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Phases of a run, in the order they happen for each email
+PHASES = ("candidate_query", "render", "mime_build", "smtp_connect", "smtp_send", "db_write")
+
+# Send outcomes counted per user profile
+OUTCOMES = ("sent", "failed", "suppressed")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers, e.g. fraction=0.99 for p99; None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class PhaseTimer:
+    """Seconds spent per phase and user profile, and send outcomes per user profile."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.seconds = defaultdict(float)  # (user profile id or None, phase) -> seconds
+        self.calls = defaultdict(int)  # (user profile id or None, phase) -> times entered
+        self.outcomes = defaultdict(int)  # (user profile id, outcome) -> emails
+        self.names = {}  # user profile id -> username
+        self.latencies = []  # seconds from the start of each email to its outcome
+        self.message_started = None
+
+    @contextmanager
+    def phase(self, name, tenant=None):
+        """Time the block as phase `name`, for a user profile id or the run as a whole."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[(tenant, name)] += time.perf_counter() - start
+            self.calls[(tenant, name)] += 1
+
+    def start_message(self):
+        """Mark the start of an email; count() records its latency."""
+        if self.enabled:
+            self.message_started = time.perf_counter()
+
+    def count(self, tenant, outcome, emails=None):
+        """
+        Record the outcome of the email started last, or of a number of
+        `emails` handled together, which have no latency of their own.
+        """
+        if not self.enabled:
+            return
+        if emails is not None:
+            self.outcomes[(tenant, outcome)] += emails
+            return
+        self.outcomes[(tenant, outcome)] += 1
+        if self.message_started is not None:
+            self.latencies.append(time.perf_counter() - self.message_started)
+
+    def phase_totals(self, tenant=None):
+        """
+        Seconds and calls per phase, for one user profile id or, by default,
+        the whole run including work not tied to a user profile.
+        """
+        totals = {phase: [0.0, 0] for phase in PHASES}
+        for (key_tenant, phase), seconds in self.seconds.items():
+            if tenant is None or key_tenant == tenant:
+                totals[phase][0] += seconds
+                totals[phase][1] += self.calls[(key_tenant, phase)]
+        return totals
+
+    def tenants(self):
+        tenants = {tenant for tenant, _ in self.seconds} | {tenant for tenant, _ in self.outcomes}
+        return sorted(tenant for tenant in tenants if tenant is not None)
+
+    def report(self):
+        """The breakdown as printable lines: every phase, then totals per user profile."""
+        wall = time.perf_counter() - self.started
+        lines = [f"Phase timings ({wall:.3f}s wall clock):"]
+        for phase, (seconds, calls) in self.phase_totals().items():
+            share = 100 * seconds / wall if wall else 0
+            lines.append(f"  {phase:<16} {seconds:>10.3f}s {calls:>8} calls {share:>6.1f}%")
+        other = wall - sum(seconds for seconds, _ in self.phase_totals().values())
+        lines.append(f"  {'other':<16} {other:>10.3f}s")
+        if self.latencies:
+            lines.append(
+                f"Per-email latency: p50 {1000 * percentile(self.latencies, 0.5):.1f}ms, "
+                f"p99 {1000 * percentile(self.latencies, 0.99):.1f}ms over {len(self.latencies)} emails"
+            )
+
+        lines.append("Per-user totals:")
+        for tenant in self.tenants():
+            totals = self.phase_totals(tenant)
+            outcomes = " ".join(f"{outcome}={self.outcomes[(tenant, outcome)]}" for outcome in OUTCOMES)
+            phases = ", ".join(f"{phase} {seconds:.3f}s" for phase, (seconds, _) in totals.items() if seconds)
+            total = sum(seconds for seconds, _ in totals.values())
+            lines.append(f"  {self.names.get(tenant, tenant)}: {total:.3f}s {outcomes} ({phases})")
+        return lines
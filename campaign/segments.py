@@ -0,0 +1,135 @@
+"""
+Saved recipient segments with materialized membership.
+
+A segment stores RecipientFilterForm data. Its members are kept in the
+SegmentMembership table and refreshed with set-based SQL, either for the
+whole segment or only for the recipients that were just imported or edited.
+Segment.member_count is adjusted in the same transaction, so the size of a
+segment is a column read.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from campaign.audiences import filter_recipients_queryset
+from campaign.models import Recipient, Segment, SegmentMembership
+
+
+def create_segment(user_profile, name, filters):
+    """
+    Save a filter as a segment and materialize its members.
+
+    Args:
+        user_profile: The UserProfile that owns the segment
+        name: Segment name, unique per user profile
+        filters: Cleaned data of a RecipientFilterForm
+
+    Returns:
+        The new Segment
+    """
+    with transaction.atomic():
+        segment = Segment.objects.create(user_profile=user_profile, name=name, filters=filters)
+        refresh_segment(segment)
+    return segment
+
+
+def refresh_segment(segment, recipients=None):
+    """
+    Bring a segment's membership up to date.
+
+    Args:
+        segment: The Segment to refresh
+        recipients: Optional Recipient queryset limiting the refresh to those
+            recipients (e.g. the rows of an import batch); None refreshes the
+            whole segment and recounts its members
+
+    Returns:
+        Tuple of (members added, members removed)
+    """
+    matching = filter_recipients_queryset(segment.user_profile_id, segment.filters)
+    members = SegmentMembership.objects.filter(segment=segment)
+
+    stale = members.exclude(recipient_id__in=matching.values("id"))
+    missing = matching.exclude(id__in=members.values("recipient_id"))
+    if recipients is not None:
+        stale = stale.filter(recipient_id__in=recipients.values("id"))
+        missing = missing.filter(id__in=recipients.values("id"))
+
+    with transaction.atomic():
+        # SegmentMembership has no signals or dependent rows, so this is a single DELETE
+        removed, _ = stale.delete()
+        added = _insert_members(segment, missing)
+        if recipients is None:
+            segment.member_count = members.count()
+            segment.refreshed_at = timezone.now()
+            Segment.objects.filter(pk=segment.pk).update(
+                member_count=segment.member_count, refreshed_at=segment.refreshed_at
+            )
+        elif added or removed:
+            Segment.objects.filter(pk=segment.pk).update(member_count=F("member_count") + added - removed)
+    return added, removed
+
+
+def refresh_segments(user_profile, recipients=None):
+    """
+    Refresh every segment of a user profile, optionally for some recipients only.
+
+    Called after recipients are imported or edited; costs a single query
+    when the user profile has no segments.
+    """
+    for segment in Segment.objects.filter(user_profile=user_profile):
+        refresh_segment(segment, recipients)
+
+
+def recount_segments(segments):
+    """
+    Recount the stored size of some segments from their membership rows.
+
+    Used after recipients are deleted, whose memberships go with them; one
+    UPDATE however many segments or recipients are involved.
+
+    Args:
+        segments: Segment queryset to recount
+    """
+    counts = SegmentMembership.objects.filter(segment=OuterRef("pk")).order_by().values("segment").annotate(
+        count=Count("id")
+    ).values("count")
+    return segments.update(member_count=Coalesce(Subquery(counts), 0))
+
+
+def delete_recipients(recipients):
+    """
+    Delete recipients and recount the segments they were members of.
+
+    Args:
+        recipients: Recipient queryset to delete
+    """
+    with transaction.atomic():
+        segment_ids = list(
+            SegmentMembership.objects.filter(recipient__in=recipients).values_list("segment_id", flat=True).distinct()
+        )
+        deleted = recipients.delete()
+        if segment_ids:
+            recount_segments(Segment.objects.filter(id__in=segment_ids))
+    return deleted
+
+
+def segment_recipients(segment):
+    """
+    The members of a segment as a Recipient queryset.
+    """
+    return Recipient.objects.filter(segment_memberships__segment=segment)
+
+
+def _insert_members(segment, recipients):
+    opts = SegmentMembership._meta
+    quote = connection.ops.quote_name
+    recipient_sql, recipient_params = recipients.order_by().values("id").query.sql_with_params()
+    sql = (
+        f"INSERT INTO {quote(opts.db_table)} ({quote('segment_id')}, {quote('recipient_id')}) "
+        f"SELECT %s, members.id FROM ({recipient_sql}) members"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [segment.pk] + list(recipient_params))
+        return cursor.rowcount
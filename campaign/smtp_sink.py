@@ -0,0 +1,98 @@
+"""
+In-process SMTP server that accepts and discards every message.
+
+Used by the send benchmark so send_emails talks real SMTP over a local socket
+without relaying anything. Latency can be added before the greeting (connect)
+and before accepting a message (DATA) to imitate a remote server.
+"""
+import socketserver
+import threading
+import time
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """One SMTP session: enough of RFC 5321 for smtplib, no TLS or AUTH."""
+
+    # Replies are small; without this, delayed ACKs add ~40ms per round trip
+    disable_nagle_algorithm = True
+
+    def reply(self, *lines):
+        # A multiline reply goes out in one write
+        self.wfile.write(b"".join(line.encode() + b"\r\n" for line in lines))
+
+    def handle(self):
+        sink = self.server.sink
+        time.sleep(sink.connect_latency)
+        self.reply("220 localhost SMTP sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line[:4].upper()
+            if verb == b"EHLO":
+                self.reply("250-localhost", "250 8BITMIME")
+            elif verb in (b"HELO", b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                self.reply("250 OK")
+            elif verb == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                    size += len(data_line)
+                time.sleep(sink.data_latency)
+                sink.accepted(size)
+                self.reply("250 OK queued")
+            elif verb == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPSinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """
+    Local SMTP server on a free port, serving each connection in a thread.
+
+    Args:
+        connect_latency: Seconds to wait before the greeting
+        data_latency: Seconds to wait before accepting each message
+        host: Interface to listen on
+    """
+
+    def __init__(self, connect_latency=0.0, data_latency=0.0, host="127.0.0.1"):
+        self.connect_latency = connect_latency
+        self.data_latency = data_latency
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._server = SMTPSinkServer((host, 0), SMTPSinkHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def accepted(self, size):
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,81 @@
+"""
+Suppression list: addresses that hard-bounced, complained or were blocked
+manually, and must not be sent to again.
+
+The SuppressedAddress table is the source of truth. Entries are stored
+normalized, and are checked with an EXISTS subquery served by its unique
+indexes: when candidates are created, and again when send_emails picks the
+candidates to send, so suppressed candidates never take up a batch.
+"""
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Lower
+
+from campaign.models import SuppressedAddress
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def suppressed_addresses(user_profile):
+    """Suppression entries that apply to a user profile, including global ones."""
+    return SuppressedAddress.objects.filter(Q(user_profile=user_profile) | Q(user_profile__isnull=True))
+
+
+def _suppression_exists(email_field):
+    """EXISTS over the entries matching an outer row's user_profile and address field."""
+    return Exists(suppressed_addresses(OuterRef("user_profile")).filter(email=Lower(OuterRef(email_field))))
+
+
+def exclude_suppressed(recipients):
+    """
+    Remove suppressed addresses from a Recipient queryset.
+
+    Adds a NOT EXISTS subquery, so the check stays inside the database for
+    any audience size.
+    """
+    return recipients.filter(~_suppression_exists("email"))
+
+
+def exclude_suppressed_candidates(candidates):
+    """Remove candidates whose recipient address is suppressed from an EmailSendCandidate queryset."""
+    return candidates.filter(~_suppression_exists("recipient__email"))
+
+
+def suppressed_candidates(candidates):
+    """The candidates of an EmailSendCandidate queryset whose recipient address is suppressed."""
+    return candidates.filter(_suppression_exists("recipient__email"))
+
+
+def suppress_addresses(user_profile_id, emails, reason):
+    """
+    Add addresses to the suppression list, ignoring ones already on it.
+
+    Entries are global instead of per user when settings.SUPPRESSION_GLOBAL is set.
+
+    Args:
+        user_profile_id: Id of the UserProfile the addresses were sent from
+        emails: Iterable of email addresses
+        reason: One of SuppressedAddress.REASON_CHOICES
+    """
+    if getattr(settings, "SUPPRESSION_GLOBAL", False):
+        user_profile_id = None
+    SuppressedAddress.objects.bulk_create(
+        [
+            SuppressedAddress(user_profile_id=user_profile_id, email=email, reason=reason)
+            for email in {normalize_email(email) for email in emails}
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def should_suppress(event_type, bounce_type=None):
+    """
+    Whether an event means the address must not be sent to again.
+
+    Complaints always suppress; bounces only when they are hard bounces.
+    """
+    if event_type == "complained":
+        return True
+    return event_type == "bounced" and bounce_type == "hard"
@@ -0,0 +1,457 @@
+"""
+Deterministic synthetic data for performance testing.
+
+Generates users with recipients spread over real-world-like domains
+(a few large mailbox providers and a long tail of company domains),
+templates, campaigns spread over the last days, email candidates in mixed
+states and their events: sends, deliveries, bounces, failures, opens that
+decay over the days after the send, clicks and complaints. Email logs, send
+counters, suppression entries and campaign statistics are filled in as the
+application would.
+
+All randomness comes from one random.Random per user, seeded from the
+generator seed and the user's index, so the same seed and --now produce the
+same data. Rows are written with COPY on PostgreSQL and batched
+executemany elsewhere instead of saving model instances.
+"""
+import io
+import json
+import math
+import random
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+from campaign.counters import COMPACT_AFTER, minute_bucket
+from campaign.models import (
+    CampaignStatistics, EmailCampaign, EmailEvent, EmailLog, EmailSendCandidate, EmailTemplate, Recipient,
+    SendCounter
+)
+from campaign.partitions import create_event_partitions, is_partitioned
+from campaign.suppression import suppress_addresses
+
+BATCH_SIZE = 10000
+
+# Mailbox providers and their share of recipients in percent; the rest is
+# spread over company domains with a long-tailed (Zipf-like) distribution
+PROVIDER_DOMAINS = [
+    ("gmail.com", 32), ("yahoo.com", 8), ("outlook.com", 7), ("hotmail.com", 6), ("icloud.com", 4),
+    ("aol.com", 2), ("gmx.de", 2), ("web.de", 1), ("proton.me", 1), ("yandex.ru", 1),
+]
+COMPANY_DOMAINS = 2000
+
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "David", "Elizabeth", "Ana",
+    "Luka", "Ivan", "Marija", "Sofia", "Lucas", "Emma", "Noah", "Olivia", "Liam", "Mia", "Yuki", "Wei", "Priya",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Horvat", "Kovacic", "Babic",
+    "Muller", "Schmidt", "Rossi", "Russo", "Dubois", "Martin", "Silva", "Santos", "Kim", "Lee", "Wang", "Patel",
+]
+LOCATIONS = [
+    ("United States", "New York"), ("United States", "Chicago"), ("United Kingdom", "London"),
+    ("Germany", "Berlin"), ("Germany", "Munich"), ("Croatia", "Zagreb"), ("France", "Paris"),
+    ("Spain", "Madrid"), ("Brazil", "Sao Paulo"), ("India", "Bangalore"), ("Japan", "Tokyo"),
+]
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_1) AppleWebKit/605.1.15 (KHTML, like Gecko)",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; Microsoft Outlook 16.0)",
+    "Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Windows NT 5.1; rv:11.0) Gecko Firefox/11.0 (via ggpht.com GoogleImageProxy)",
+]
+TEMPLATES = [
+    ("Newsletter", "News from {company}", "Hi {first_name},\n\nHere is what happened this month.\n"),
+    ("Offer", "An offer for {first_name}", "Hello {first_name} {last_name},\n\nSee https://example.com/offer\n"),
+    ("Follow-up", "Following up", "Hi {first_name},\n\nDid you get a chance to look at https://example.com?\n"),
+]
+CLICK_URLS = ["https://example.com/offer", "https://example.com/", "https://example.com/pricing"]
+
+# Outcome of a send attempt, in percent of the attempted emails
+SUPPRESSED_PERCENT = 0.3
+FAILED_PERCENT = 1.5
+BOUNCED_PERCENT = 2.0
+HARD_BOUNCE_SHARE = 0.7
+COMPLAINED_PERCENT = 0.05
+
+# Mean delay of the first open, and between further opens, after the send
+FIRST_OPEN_MEAN = timedelta(hours=6)
+REOPEN_MEAN = timedelta(days=1)
+
+
+class BulkInserter:
+    """
+    Buffers rows for one model and writes them in batches, with COPY on
+    PostgreSQL and executemany on other databases.
+
+    Args:
+        model: Model class whose table is written
+        fields: Names of the fields given, in order, for every row
+        batch_size: Rows per COPY or executemany call
+    """
+
+    def __init__(self, model, fields, batch_size=BATCH_SIZE):
+        self.model = model
+        self.fields = [model._meta.get_field(name) for name in fields]
+        self.batch_size = batch_size
+        self.rows = []
+        self.written = 0
+
+    def add(self, *values):
+        self.rows.append(values)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if connection.vendor == "postgresql":
+            self._copy()
+        else:
+            self._executemany()
+        self.written += len(self.rows)
+        self.rows = []
+
+    def _columns(self):
+        quote = connection.ops.quote_name
+        return ", ".join(quote(field.column) for field in self.fields)
+
+    def _executemany(self):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        placeholders = ", ".join(["%s"] * len(self.fields))
+        # Resolved once: the connection proxy costs a thread-local lookup per use
+        db = connections[DEFAULT_DB_ALIAS]
+        # Only values the driver cannot take as they are go through the field
+        prepared = [
+            position for position, field in enumerate(self.fields)
+            if field.get_internal_type() in ("DateTimeField", "UUIDField", "JSONField")
+        ]
+        rows = []
+        for row in self.rows:
+            row = list(row)
+            for position in prepared:
+                row[position] = self.fields[position].get_db_prep_save(row[position], db)
+            rows.append(row)
+        with db.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {table} ({self._columns()}) VALUES ({placeholders})", rows)
+
+    def _copy(self):
+        buffer = io.StringIO()
+        for row in self.rows:
+            buffer.write("\t".join(_copy_value(field, value) for field, value in zip(self.fields, row)))
+            buffer.write("\n")
+        buffer.seek(0)
+        copy_sql = f"COPY {connection.ops.quote_name(self.model._meta.db_table)} ({self._columns()}) FROM STDIN"
+        with connection.cursor() as cursor:
+            raw_cursor = cursor.cursor
+            if hasattr(raw_cursor, "copy_expert"):
+                # psycopg2
+                raw_cursor.copy_expert(copy_sql, buffer, size=1024 * 1024)
+            else:
+                # psycopg 3
+                with raw_cursor.copy(copy_sql) as copy:
+                    copy.write(buffer.getvalue())
+
+
+def _copy_value(field, value):
+    """A value in COPY text format."""
+    if value is None:
+        return "\\N"
+    if field.get_internal_type() == "JSONField":
+        value = json.dumps(value)
+    elif hasattr(value, "isoformat"):
+        value = value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _weighted_domains():
+    domains = [domain for domain, _ in PROVIDER_DOMAINS]
+    weights = [share for _, share in PROVIDER_DOMAINS]
+    company_share = 100 - sum(weights)
+    harmonic = sum(1 / rank for rank in range(1, COMPANY_DOMAINS + 1))
+    for rank in range(1, COMPANY_DOMAINS + 1):
+        domains.append(f"company{rank}.example.com")
+        weights.append(company_share / rank / harmonic)
+    return domains, weights
+
+
+def _geometric(rng, stop_probability, limit):
+    """1 plus the number of further successes, each with probability 1 - stop_probability."""
+    count = 1
+    while count < limit and rng.random() > stop_probability:
+        count += 1
+    return count
+
+
+def _send_outcome(rng):
+    """Outcome of a due email: "sent", "failed" or "suppressed"."""
+    roll = rng.uniform(0, 100)
+    if roll < SUPPRESSED_PERCENT:
+        return "suppressed"
+    if roll < SUPPRESSED_PERCENT + FAILED_PERCENT:
+        return "failed"
+    return "sent"
+
+
+class SyntheticDataGenerator:
+    """
+    Writes deterministic synthetic users and their email history.
+
+    Args:
+        seed: Seed of all randomness
+        now: Moment the data is generated relative to; campaigns are spread
+            over the `days` before it, and nothing happens after it
+        days: Length of the history
+        prefix: Username prefix of the generated users
+        batch_size: Rows per bulk write
+    """
+
+    def __init__(self, seed, now, days=90, prefix="synthetic", batch_size=BATCH_SIZE):
+        self.seed = seed
+        self.now = now
+        self.days = days
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.domains, self.domain_weights = _weighted_domains()
+        self.totals = defaultdict(int)
+
+    def username(self, index):
+        return f"{self.prefix}-{self.seed}-{index}"
+
+    def generate(self, tenants, recipients, campaigns, progress=None):
+        """
+        Generate `tenants` users with `recipients` recipients and `campaigns` campaigns each.
+
+        Args:
+            progress: Optional callable receiving a line after every user
+
+        Returns:
+            Dict of rows created per kind
+        """
+        if is_partitioned():
+            # Give every month of the history its own partition instead of the default one
+            create_event_partitions(
+                months_ahead=math.ceil(self.days / 28) + 1, now=self.now - timedelta(days=self.days)
+            )
+        for index in range(tenants):
+            with transaction.atomic():
+                self.generate_tenant(index, recipients, campaigns)
+            if progress:
+                progress(f"User {self.username(index)}: {dict(self.totals)}")
+        return dict(self.totals)
+
+    def generate_tenant(self, index, recipient_count, campaign_count):
+        rng = random.Random(f"{self.seed}:{index}")
+        user = User.objects.create_user(username=self.username(index), email=f"{self.username(index)}@example.com")
+        profile = user.profile
+        profile.from_email = f"news@{self.username(index)}.example.com"
+        profile.max_emails_per_hour = 100000
+        profile.save()
+        self.totals["users"] += 1
+
+        recipients = self.insert_recipients(profile, recipient_count, rng)
+        templates = [
+            EmailTemplate.objects.create(user_profile=profile, name=name, subject=subject, body=body)
+            for name, subject, body in TEMPLATES
+        ]
+        self.totals["templates"] += len(templates)
+
+        counters = defaultdict(lambda: [0, 0])
+        suppressed = defaultdict(set)
+        for number in range(campaign_count):
+            # Campaigns are evenly spread over the history; the last one may still be scheduled
+            age = timedelta(days=self.days) * (campaign_count - number) / campaign_count
+            scheduled_time = self.now - age + timedelta(minutes=rng.randrange(0, 24 * 60))
+            if number == campaign_count - 1 and rng.random() < 0.5:
+                scheduled_time = self.now + timedelta(hours=rng.randrange(1, 72))
+            campaign = EmailCampaign.objects.create(
+                user_profile=profile,
+                name=f"Campaign {number + 1}",
+                template=rng.choice(templates),
+                scheduled_time=scheduled_time,
+            )
+            self.totals["campaigns"] += 1
+            audience = rng.sample(recipients, k=max(1, int(len(recipients) * rng.uniform(0.3, 1.0))))
+            audience.sort()
+            self.insert_campaign(profile, campaign, audience, rng, counters, suppressed)
+
+        self.insert_counters(profile, counters)
+        for reason, emails in suppressed.items():
+            suppress_addresses(profile.id, emails, reason)
+            self.totals["suppressed_addresses"] += len(emails)
+        for campaign in EmailCampaign.objects.filter(user_profile=profile):
+            statistics, _ = CampaignStatistics.objects.get_or_create(campaign=campaign)
+            statistics.update_statistics()
+
+    def insert_recipients(self, profile, count, rng):
+        """Bulk insert recipients; returns (id, email) pairs in id order."""
+        inserter = BulkInserter(
+            Recipient,
+            ["user_profile", "first_name", "last_name", "company", "email", "country", "city",
+             "free_field1", "free_field2", "free_field3"],
+            self.batch_size,
+        )
+        domains = rng.choices(self.domains, weights=self.domain_weights, k=count)
+        for number, domain in enumerate(domains):
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            country, city = rng.choice(LOCATIONS)
+            company = domain.split(".")[0].title() if domain.startswith("company") else None
+            inserter.add(
+                profile.id, first_name, last_name, company,
+                f"{first_name.lower()}.{last_name.lower()}{number}@{domain}",
+                country, city, rng.choice(["A", "B", "C"]), None, None,
+            )
+        inserter.flush()
+        self.totals["recipients"] += inserter.written
+        return list(
+            Recipient.objects.filter(user_profile=profile).order_by("id").values_list("id", "email")
+        )
+
+    def insert_campaign(self, profile, campaign, audience, rng, counters, suppressed):
+        """Insert a campaign's candidates, then their events and email logs."""
+        plans = self.insert_candidates(profile, campaign, audience, rng)
+
+        candidate_ids = EmailSendCandidate.objects.filter(campaign=campaign).order_by("id").values_list("id", flat=True)
+        events = BulkInserter(
+            EmailEvent, ["email_candidate", "event_type", "timestamp", "user_agent", "ip_address", "metadata"],
+            self.batch_size,
+        )
+        logs = None
+        if not settings.EMAIL_LOG_FROM_EVENTS:
+            logs = BulkInserter(
+                EmailLog, ["user_profile", "recipient", "campaign", "status", "error_message", "sent_time"],
+                self.batch_size,
+            )
+        click_to_open = rng.uniform(0.1, 0.25)
+        open_rate = rng.uniform(0.15, 0.35)
+
+        for candidate_id, (email, outcome, sent_time) in zip(candidate_ids.iterator(), plans):
+            if outcome == "pending":
+                continue
+            if outcome == "suppressed":
+                events.add(candidate_id, "suppressed", sent_time, None, None,
+                           {"reason": "Address is on the suppression list"})
+                continue
+            bucket = self.counter_bucket(sent_time)
+            if outcome == "failed":
+                error = "SMTP error: 451 Temporary local problem"
+                events.add(candidate_id, "failed", sent_time, None, None, {"error": error})
+                if logs:
+                    logs.add(profile.id, email, campaign.id, "Failed", error, sent_time)
+                counters[bucket][1] += 1
+                continue
+
+            events.add(candidate_id, "sent", sent_time, None, None, {"subject": campaign.template.subject})
+            if logs:
+                logs.add(profile.id, email, campaign.id, "Sent", None, sent_time)
+            counters[bucket][0] += 1
+            self.add_delivery_events(events, candidate_id, email, sent_time, rng, open_rate, click_to_open, suppressed)
+
+        events.flush()
+        self.totals["events"] += events.written
+        if logs:
+            logs.flush()
+            self.totals["email_logs"] += logs.written
+
+    def insert_candidates(self, profile, campaign, audience, rng):
+        """Bulk insert a campaign's candidates; returns (email, outcome, sent_time) per candidate, in id order."""
+        sender_domain = profile.from_email.split("@")[1]
+        due = campaign.scheduled_time <= self.now
+        plans = []
+        inserter = BulkInserter(
+            EmailSendCandidate,
+            ["user_profile", "recipient", "template", "scheduled_time", "sent", "sent_time", "campaign",
+             "tracking_id", "recipient_email", "sender_domain", "archived_event_types"],
+            self.batch_size,
+        )
+        for recipient_id, email in audience:
+            # Sending a large campaign takes a while under the hourly limit
+            sent_time = campaign.scheduled_time + timedelta(seconds=rng.randrange(0, 3 * 3600))
+            outcome = "pending" if not due or sent_time > self.now else _send_outcome(rng)
+            # Failed emails stay queued for another attempt, as in send_emails
+            sent = outcome in ("sent", "suppressed")
+            inserter.add(
+                profile.id, recipient_id, campaign.template_id, campaign.scheduled_time, sent,
+                sent_time if sent else None, campaign.id, uuid.UUID(int=rng.getrandbits(128), version=4),
+                email.lower(), sender_domain if outcome == "sent" else "", "",
+            )
+            plans.append((email, outcome, sent_time))
+        inserter.flush()
+        self.totals["candidates"] += inserter.written
+        return plans
+
+    def counter_bucket(self, sent_time):
+        """The SendCounter row a send falls in: its minute, or its hour once compacted."""
+        bucket = minute_bucket(sent_time)
+        if self.now - sent_time > COMPACT_AFTER:
+            bucket = bucket.replace(minute=0)
+        return bucket
+
+    def add_delivery_events(self, events, candidate_id, email, sent_time, rng, open_rate, click_to_open, suppressed):
+        """Delivery or bounce of a sent email, then its opens, clicks and complaint."""
+        arrived = sent_time + timedelta(seconds=rng.randrange(1, 120))
+        if rng.uniform(0, 100) < BOUNCED_PERCENT:
+            bounce_type = "hard" if rng.random() < HARD_BOUNCE_SHARE else "soft"
+            events.add(candidate_id, "bounced", arrived, None, None, {
+                "bounce_type": bounce_type,
+                "reason": "550 5.1.1 User unknown" if bounce_type == "hard" else "452 4.2.2 Mailbox full",
+            })
+            if bounce_type == "hard":
+                suppressed["bounced"].add(email)
+            return
+        events.add(candidate_id, "delivered", arrived, None, None, {})
+
+        opened_at = None
+        if rng.random() < open_rate:
+            opened_at = self.add_open_events(events, candidate_id, arrived, rng, click_to_open)
+
+        if rng.uniform(0, 100) < COMPLAINED_PERCENT:
+            complained_at = (opened_at or arrived) + timedelta(minutes=rng.randrange(1, 600))
+            if complained_at <= self.now:
+                events.add(candidate_id, "complained", complained_at, None, None, {"bounce_type": "complaint"})
+                suppressed["complained"].add(email)
+
+    def add_open_events(self, events, candidate_id, arrived, rng, click_to_open):
+        """Opens of a delivered email and maybe clicks; returns the first open, or None if it is yet to come."""
+        user_agent = rng.choice(USER_AGENTS)
+        ip_address = f"203.0.113.{rng.randrange(1, 255)}"
+        opened_at = arrived + timedelta(seconds=rng.expovariate(1 / FIRST_OPEN_MEAN.total_seconds()))
+        open_times = []
+        for _ in range(_geometric(rng, 0.6, 10)):
+            if opened_at > self.now:
+                break
+            open_times.append(opened_at)
+            opened_at += timedelta(seconds=rng.expovariate(1 / REOPEN_MEAN.total_seconds()))
+        for position, moment in enumerate(open_times):
+            events.add(candidate_id, "opened", moment, user_agent, ip_address, {"first_open": position == 0})
+        if open_times and rng.random() < click_to_open:
+            clicked_at = rng.choice(open_times)
+            for _ in range(_geometric(rng, 0.7, 5)):
+                clicked_at += timedelta(seconds=rng.expovariate(1 / 300))
+                if clicked_at > self.now:
+                    break
+                events.add(candidate_id, "clicked", clicked_at, user_agent, ip_address,
+                           {"url": rng.choice(CLICK_URLS)})
+        return open_times[0] if open_times else None
+
+    def insert_counters(self, profile, counters):
+        SendCounter.objects.bulk_create(
+            [
+                SendCounter(user_profile=profile, minute=bucket, sent=sent, failed=failed)
+                for bucket, (sent, failed) in sorted(counters.items())
+            ],
+            batch_size=self.batch_size,
+        )
+        self.totals["send_counters"] += len(counters)
+
+
+def estimated_events(tenants, recipients, campaigns):
+    """Rough number of events generate() creates, for sizing a run."""
+    # About 0.65 of the recipients are in a campaign's audience, and an
+    # email averages 2 events (send, delivery or bounce, opens and clicks)
+    return math.ceil(tenants * recipients * campaigns * 1.3)
@@ -6,4 +6,17 @@ This package contains organized test modules:
 - test_forms: Tests for all forms
 - test_views: Tests for all views
 - test_commands: Tests for management commands
+- test_importers: Tests for the recipient CSV importer
+- test_exports: Tests for streaming exports
+- test_segments: Tests for saved segments
+- test_suppression: Tests for the suppression list
+- test_webhooks: Tests for the batch events webhook
+- test_partitions: Tests for EmailEvent partition management
+- test_archive: Tests for the cold event archive
+- test_counters: Tests for send counters and sending limits
+- test_metrics: Tests for Prometheus metrics
+- test_benchmarks: Tests for the benchmark commands
+- test_synthetic: Tests for the synthetic data generator
+- test_query_budgets: Query-count regression tests for views, admin and sending
+- test_async_tracking: Tests for the async tracking views and event writer
 """
@@ -0,0 +1,132 @@
+"""
+Unit tests for the cold event archive.
+"""
+
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from campaign.archive import archive_cutoff, archive_files, read_archive
+from campaign.models import (
+    CampaignStatistics,
+    EmailCampaign,
+    EmailEvent,
+    EmailSendCandidate,
+    EmailTemplate,
+    Recipient,
+)
+
+
+class ArchiveEventsCommandTest(TestCase):
+    """Test cases for archive_events and read_event_archive"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = user.profile
+        template = EmailTemplate.objects.create(user_profile=self.profile, name="T", subject="S", body="B")
+        self.campaign = EmailCampaign.objects.create(
+            user_profile=self.profile, name="C", template=template, scheduled_time=timezone.now()
+        )
+        self.candidates = []
+        for i in range(3):
+            recipient = Recipient.objects.create(user_profile=self.profile, email=f"user{i}@example.com")
+            self.candidates.append(EmailSendCandidate.objects.create(
+                user_profile=self.profile, recipient=recipient, template=template, campaign=self.campaign,
+                scheduled_time=timezone.now(), sent=True, sent_time=timezone.now(),
+            ))
+        self.old = timezone.now() - timedelta(days=400)
+        for candidate in self.candidates:
+            self.add_event(candidate, "sent", self.old)
+            self.add_event(candidate, "opened", self.old)
+        self.add_event(self.candidates[0], "opened", self.old)
+        self.add_event(self.candidates[1], "clicked", timezone.now())
+
+    def add_event(self, candidate, event_type, when):
+        event = EmailEvent.objects.create(email_candidate=candidate, event_type=event_type, metadata={"n": 1})
+        EmailEvent.objects.filter(id=event.id).update(timestamp=when)
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command("archive_events", "--days", "180", "--output-dir", self.root, *args, stdout=out)
+        return out.getvalue()
+
+    def test_archives_and_deletes_old_events(self):
+        """Test old events move to one verified file per campaign month"""
+        self.archive()
+
+        self.assertEqual(list(EmailEvent.objects.values_list("event_type", flat=True)), ["clicked"])
+        files = archive_files(self.root, self.profile.id, self.campaign.id)
+        self.assertEqual([path.name for path in files], [f"{self.old:%Y-%m}.events.jsonl.gz"])
+        rows = list(read_archive(files[0]))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0]["recipient_email"], "user0@example.com")
+        self.assertEqual(rows[0]["metadata"], {"n": 1})
+
+    def test_dry_run_keeps_events(self):
+        """Test --dry-run neither writes files nor deletes rows"""
+        output = self.archive("--dry-run")
+        self.assertIn("Would archive", output)
+        self.assertEqual(EmailEvent.objects.count(), 8)
+        self.assertEqual(archive_files(self.root, self.profile.id, self.campaign.id), [])
+
+    def test_statistics_include_archived_events(self):
+        """Test campaign statistics are unchanged by archival"""
+        stats = CampaignStatistics.objects.create(campaign=self.campaign)
+        stats.update_statistics()
+        before = (stats.sent_count, stats.unique_opens, stats.opened_count, stats.unique_clicks)
+
+        self.archive()
+        stats.refresh_from_db()
+        stats.update_statistics()
+
+        self.assertEqual((stats.sent_count, stats.unique_opens, stats.opened_count, stats.unique_clicks), before)
+        self.assertEqual(before, (3, 3, 4, 1))
+
+    def test_live_and_archived_events_of_an_email_count_once(self):
+        """Test an email with both archived and live opens is one unique open"""
+        self.archive()
+        self.add_event(self.candidates[0], "opened", timezone.now())
+        stats = CampaignStatistics.objects.get(campaign=self.campaign)
+        stats.update_statistics()
+
+        self.assertEqual((stats.unique_opens, stats.opened_count, stats.unique_clicks), (3, 5, 1))
+
+    def test_statistics_skip_archive_markers_until_something_is_archived(self):
+        """Test campaigns without archived events are counted from live events alone"""
+        stats = CampaignStatistics.objects.create(campaign=self.campaign)
+        with CaptureQueriesContext(connection) as queries:
+            stats.update_statistics()
+
+        self.assertFalse([query for query in queries.captured_queries if " LIKE " in query["sql"].upper()])
+
+    def test_rerun_is_idempotent(self):
+        """Test a second run finds nothing left to archive"""
+        self.archive()
+        self.archive()
+        self.assertEqual(len(archive_files(self.root, self.profile.id, self.campaign.id)), 1)
+        self.assertEqual(CampaignStatistics.objects.get(campaign=self.campaign).archived_event_counts,
+                         {"sent": 3, "opened": 4})
+
+    def test_read_event_archive_summary(self):
+        """Test archived events can be summarized per type"""
+        self.archive()
+        out = StringIO()
+        call_command(
+            "read_event_archive", str(self.campaign.id), "--summary", "--archive-dir", self.root, stdout=out
+        )
+        self.assertEqual(out.getvalue().splitlines(), ["opened: 4", "sent: 3"])
+
+    def test_cutoff_is_month_aligned(self):
+        """Test only whole months before the cutoff are archived"""
+        now = datetime(2026, 7, 15, 12, tzinfo=dt_timezone.utc)
+        self.assertEqual(archive_cutoff(30, now), datetime(2026, 6, 1, tzinfo=dt_timezone.utc))
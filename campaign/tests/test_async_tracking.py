@@ -0,0 +1,220 @@
+"""
+Unit tests for the async tracking views and their background event writer.
+
+This module is also the URLconf of its tests, routing the tracking URLs to
+campaign.async_tracking_views as settings.TRACKING_ASYNC does.
+"""
+
+import json
+import os
+import uuid
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import path, reverse
+from django.utils import timezone
+
+from campaign import async_tracking_views, tracking_views
+from campaign.event_writer import EventWriter, TrackingHit, drain_event_writer, get_event_writer, write_hits
+from campaign.models import EmailEvent, EmailSendCandidate, EmailTemplate, Recipient, SuppressedAddress
+
+urlpatterns = [
+    path("track/pixel/<uuid:tracking_id>/", async_tracking_views.tracking_pixel, name="email_tracking_pixel"),
+    path("track/click/<uuid:tracking_id>/", async_tracking_views.tracking_click, name="email_tracking_click"),
+    path("track/bounce/", async_tracking_views.bounce_webhook, name="email_bounce_webhook"),
+    path("track/delivery/", async_tracking_views.delivery_webhook, name="email_delivery_webhook"),
+    path("track/events/", async_tracking_views.events_webhook, name="email_events_webhook"),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncTrackingViewsTest(TestCase):
+    """Test cases for the async tracking views"""
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = user.profile
+        template = EmailTemplate.objects.create(user_profile=self.profile, name="T", subject="S", body="B")
+        recipient = Recipient.objects.create(
+            user_profile=self.profile, first_name="User", last_name="One", email="user1@example.com"
+        )
+        self.candidate = EmailSendCandidate.objects.create(
+            user_profile=self.profile, recipient=recipient, template=template,
+            scheduled_time=timezone.now(), sent=True, sent_time=timezone.now(),
+        )
+        self.pixel_url = reverse("email_tracking_pixel", args=[self.candidate.tracking_id])
+
+    async def events(self, event_type):
+        return [event async for event in EmailEvent.objects.filter(event_type=event_type).order_by("id")]
+
+    async def test_pixel_answers_before_the_open_is_written(self):
+        """Test opens are queued, then written with first_open set once per email"""
+        first = await self.async_client.get(self.pixel_url, headers={"user-agent": "Mail/1.0"})
+        second = await self.async_client.get(self.pixel_url)
+
+        self.assertEqual((first.status_code, first["Content-Type"]), (200, "image/gif"))
+        self.assertEqual(second.status_code, 200)
+        await drain_event_writer()
+        opens = await self.events("opened")
+        self.assertEqual([event.metadata["first_open"] for event in opens], [True, False])
+        self.assertEqual(opens[0].user_agent, "Mail/1.0")
+        self.assertEqual(opens[0].email_candidate_id, self.candidate.id)
+
+    async def test_click_redirects_and_records_url(self):
+        """Test a click redirects at once and its URL is recorded"""
+        url = reverse("email_tracking_click", args=[self.candidate.tracking_id])
+
+        response = await self.async_client.get(url, {"url": "https://example.com/offer"})
+
+        self.assertEqual((response.status_code, response["Location"]), (302, "https://example.com/offer"))
+        await drain_event_writer()
+        clicks = await self.events("clicked")
+        self.assertEqual([event.metadata["url"] for event in clicks], ["https://example.com/offer"])
+
+    async def test_unknown_tracking_id_still_serves_pixel(self):
+        """Test a hit for an unknown email gets its pixel and records nothing"""
+        response = await self.async_client.get(reverse("email_tracking_pixel", args=[uuid.uuid4()]))
+
+        self.assertEqual(response.status_code, 200)
+        await drain_event_writer()
+        self.assertFalse(await EmailEvent.objects.aexists())
+
+    async def test_bounce_webhook_records_and_suppresses(self):
+        """Test a hard bounce by address is recorded and suppresses the address"""
+        response = await self.async_client.post(
+            reverse("email_bounce_webhook"),
+            json.dumps({"email": "User1@example.com", "event": "bounced", "bounce_type": "hard"}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(await self.events("bounced")), 1)
+        self.assertTrue(await SuppressedAddress.objects.filter(email="user1@example.com").aexists())
+
+    async def test_bounce_without_recipient_email_suppresses_the_recipient(self):
+        """Test a bounce for a candidate without recipient_email suppresses its recipient's address"""
+        await EmailSendCandidate.objects.filter(id=self.candidate.id).aupdate(recipient_email="")
+
+        response = await self.async_client.post(
+            reverse("email_bounce_webhook"),
+            json.dumps({"tracking_id": str(self.candidate.tracking_id), "event": "complained"}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [address async for address in SuppressedAddress.objects.values_list("email", flat=True)],
+            ["user1@example.com"],
+        )
+
+    async def test_malformed_tracking_id_matches_the_sync_views(self):
+        """Test a malformed tracking_id falls back to the address, or 404, as in the sync views"""
+        cases = [
+            ("email_bounce_webhook", tracking_views.bounce_webhook, {"tracking_id": "not-a-uuid", "event": "bounced"}),
+            ("email_delivery_webhook", tracking_views.delivery_webhook, {"tracking_id": "not-a-uuid"}),
+            ("email_bounce_webhook", tracking_views.bounce_webhook,
+             {"tracking_id": "not-a-uuid", "email": "user1@example.com", "event": "bounced"}),
+            ("email_delivery_webhook", tracking_views.delivery_webhook,
+             {"tracking_id": 12, "email": "user1@example.com"}),
+        ]
+        factory = RequestFactory()
+        for url_name, sync_view, payload in cases:
+            with self.subTest(url_name=url_name, payload=payload):
+                body = json.dumps(payload)
+                response = await self.async_client.post(reverse(url_name), body, content_type="application/json")
+                request = factory.post(reverse(url_name), body, content_type="application/json")
+                expected = await sync_to_async(sync_view)(request)
+
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), json.loads(expected.content))
+        self.assertEqual(response.status_code, 200)
+
+    async def test_delivery_webhook_unknown_email(self):
+        """Test a delivery for an unknown email is answered with 404"""
+        response = await self.async_client.post(
+            reverse("email_delivery_webhook"), json.dumps({"tracking_id": str(uuid.uuid4())}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    async def test_events_webhook_batch(self):
+        """Test a batch is recorded with per-item results"""
+        response = await self.async_client.post(
+            reverse("email_events_webhook"),
+            json.dumps([
+                {"tracking_id": str(self.candidate.tracking_id), "event": "delivered"},
+                {"tracking_id": str(uuid.uuid4()), "event": "delivered"},
+            ]),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["status"] for result in response.json()["results"]], ["recorded", "not_found"])
+
+
+class EventWriterTest(TestCase):
+    """Test cases for batched tracking writes"""
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        template = EmailTemplate.objects.create(user_profile=user.profile, name="T", subject="S", body="B")
+        self.candidates = []
+        for i in range(5):
+            recipient = Recipient.objects.create(
+                user_profile=user.profile, first_name="User", last_name=str(i), email=f"user{i}@example.com"
+            )
+            self.candidates.append(EmailSendCandidate.objects.create(
+                user_profile=user.profile, recipient=recipient, template=template, scheduled_time=timezone.now(),
+            ))
+
+    def test_batch_is_written_with_three_queries(self):
+        """Test a batch of any size resolves and inserts with a fixed number of queries"""
+        hits = [
+            TrackingHit(candidate.tracking_id, event_type)
+            for candidate in self.candidates for event_type in ("opened", "opened", "clicked")
+        ]
+
+        with self.assertNumQueries(3):
+            written = async_to_sync(write_hits)(hits)
+
+        self.assertEqual(written, 15)
+        first_opens = EmailEvent.objects.filter(event_type="opened", metadata__first_open=True)
+        self.assertEqual(first_opens.count(), 5)
+
+    def test_full_queue_writes_inline(self):
+        """Test a hit that does not fit in the queue is written by its own request"""
+        async def record_two():
+            writer = EventWriter(queue_size=1, interval=0)
+            await writer.record(TrackingHit(self.candidates[0].tracking_id, "opened"))
+            await writer.record(TrackingHit(self.candidates[1].tracking_id, "opened"))
+            inline = await EmailEvent.objects.filter(email_candidate=self.candidates[1]).aexists()
+            await writer.drain()
+            return inline
+
+        self.assertTrue(async_to_sync(record_two)())
+        self.assertEqual(EmailEvent.objects.count(), 2)
+
+    def test_asgi_shutdown_writes_queued_events(self):
+        """Test the ASGI lifespan shutdown waits for the queued hits"""
+        with patch.dict(os.environ):
+            from djangoMailer.asgi import application
+
+        async def serve_and_stop():
+            await get_event_writer().record(TrackingHit(self.candidates[0].tracking_id, "clicked"))
+            messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+            sent = []
+
+            async def receive():
+                return next(messages)
+
+            async def send(message):
+                sent.append(message["type"])
+
+            await application({"type": "lifespan"}, receive, send)
+            return sent
+
+        self.assertEqual(async_to_sync(serve_and_stop)(), ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        self.assertEqual(EmailEvent.objects.filter(event_type="clicked").count(), 1)
@@ -0,0 +1,184 @@
+"""
+Unit tests for the benchmark commands and their SMTP sink.
+"""
+
+import json
+import os
+import smtplib
+import tempfile
+from contextlib import nullcontext
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from campaign.benchmarks import Stopwatch, compare_results
+from campaign.management.commands.benchmark_tracking import request_plan
+from campaign.models import CampaignStatistics, EmailEvent, EmailSendCandidate, Recipient
+from campaign.smtp_sink import SMTPSink
+
+
+class SMTPSinkTest(TestCase):
+    """Test cases for the in-process SMTP sink"""
+
+    def test_accepts_messages(self):
+        """Test the sink accepts mail from smtplib and counts it"""
+        with SMTPSink() as sink:
+            with smtplib.SMTP(sink.host, sink.port, timeout=5) as smtp:
+                smtp.sendmail("from@example.com", ["to@example.com"], "Subject: Hi\r\n\r\nHello\r\n")
+                smtp.sendmail("from@example.com", ["to@example.com"], "Subject: Again\r\n\r\nHello\r\n")
+
+        self.assertEqual(sink.messages, 2)
+        self.assertGreater(sink.bytes, 0)
+
+
+class CompareResultsTest(TestCase):
+    """Test cases for comparing benchmark results with a baseline"""
+
+    def test_regressions_respect_direction_and_tolerance(self):
+        """Test only changes for the worse beyond the tolerance are regressions"""
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as handle:
+            json.dump({"results": {"per_second": 100, "p99_ms": 10, "queries": 4}}, handle)
+        self.addCleanup(os.remove, handle.name)
+
+        lines, regressions = compare_results(
+            handle.name,
+            {"per_second": 95, "p99_ms": 12, "queries": 3},
+            higher_is_better=("per_second",),
+            lower_is_better=("p99_ms", "queries"),
+            max_regression=10,
+        )
+
+        self.assertEqual(regressions, ["p99_ms"])
+        self.assertEqual(len(lines), 3)
+
+
+# The test runner already provides an isolated database
+@patch("campaign.management.commands.benchmark_send.benchmark_database", nullcontext)
+class BenchmarkSendCommandTest(TestCase):
+    """Test cases for the benchmark_send command"""
+
+    def test_sends_everything_and_saves_results(self):
+        """Test every seeded email goes through the sink and the results are saved"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "send.json")
+            call_command("benchmark_send", tenants=2, candidates=5, output=output, stdout=StringIO())
+            with open(output) as handle:
+                document = json.load(handle)
+
+        results = document["results"]
+        self.assertEqual(document["benchmark"], "send")
+        self.assertEqual(document["parameters"]["tenants"], 2)
+        self.assertEqual((results["sent"], results["failed"], results["accepted_by_sink"]), (5, 0, 5))
+        self.assertGreater(results["messages_per_second"], 0)
+        self.assertGreater(results["queries_per_message"], 0)
+        self.assertLessEqual(results["latency_p50_ms"], results["latency_p99_ms"])
+        self.assertFalse(EmailSendCandidate.objects.filter(sent=False).exists())
+
+    def test_regression_against_baseline_fails(self):
+        """Test a run slower than its baseline by more than the tolerance raises"""
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+            with open(baseline, "w") as handle:
+                json.dump({"results": {"messages_per_second": 10 ** 9}}, handle)
+
+            with self.assertRaisesMessage(CommandError, "messages_per_second"):
+                call_command(
+                    "benchmark_send", tenants=1, candidates=2, output=os.path.join(directory, "run.json"),
+                    baseline=baseline, stdout=StringIO(),
+                )
+
+
+class RequestPlanTest(TestCase):
+    """Test cases for the tracking benchmark's request mix"""
+
+    def test_mix_is_deterministic_and_follows_ratios(self):
+        """Test the same seed gives the same plan, clicks follow the ratio and every email gets opened"""
+        tracking_ids = [f"00000000-0000-0000-0000-{index:012d}" for index in range(50)]
+
+        plan = request_plan(tracking_ids, 1000, click_ratio=0.2, repeat_open_ratio=0.5, seed=7)
+
+        self.assertEqual(plan, request_plan(tracking_ids, 1000, click_ratio=0.2, repeat_open_ratio=0.5, seed=7))
+        clicks = [path for path in plan if "/track/click/" in path]
+        opens = [path for path in plan if "/track/pixel/" in path]
+        self.assertEqual(len(clicks) + len(opens), 1000)
+        self.assertTrue(150 < len(clicks) < 250)
+        self.assertEqual(len(set(opens)), 50)
+
+
+# The seeded rows must be committed for the client threads to see them
+@patch("campaign.management.commands.benchmark_tracking.benchmark_database", nullcontext)
+class BenchmarkTrackingCommandTest(TransactionTestCase):
+    """Test cases for the benchmark_tracking command"""
+
+    def run_benchmark(self, interface, concurrency):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "tracking.json")
+            call_command(
+                "benchmark_tracking", tenants=2, emails=10, requests=40, concurrency=concurrency,
+                interface=interface, output=output, stdout=StringIO(),
+            )
+            with open(output) as handle:
+                return json.load(handle)["results"]
+
+    def test_wsgi_hits_are_recorded(self):
+        """Test every WSGI request is answered and recorded with its queries counted"""
+        results = self.run_benchmark("wsgi", 1)
+
+        self.assertEqual((results["requests"], results["errors"], results["events_recorded"]), (40, 0, 40))
+        self.assertEqual(EmailEvent.objects.count(), 40)
+        self.assertGreaterEqual(results["queries_per_request"], 2)
+        self.assertGreater(results["requests_per_second"], 0)
+
+    def test_asgi_hits_are_recorded(self):
+        """Test the ASGI handler serves the same mix"""
+        results = self.run_benchmark("asgi", 4)
+
+        self.assertEqual((results["requests"], results["errors"], results["events_recorded"]), (40, 0, 40))
+        self.assertLessEqual(results["latency_p50_ms"], results["latency_p99_ms"])
+
+    def test_untimeable_run_has_no_rate(self):
+        """Test a run too short for the clock to measure saves no rate instead of failing"""
+        with patch.object(Stopwatch, "__exit__", lambda self, *exc_info: None):
+            results = self.run_benchmark("wsgi", 1)
+
+        self.assertEqual((results["seconds"], results["requests_per_second"]), (0, None))
+
+
+@patch("campaign.management.commands.benchmark_scale.benchmark_database", nullcontext)
+class BenchmarkScaleCommandTest(TestCase):
+    """Test cases for the benchmark_scale command"""
+
+    def run_benchmark(self, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "scale.json")
+            call_command("benchmark_scale", output=output, stdout=StringIO(), **options)
+            with open(output) as handle:
+                return json.load(handle)["results"]
+
+    @override_settings(RECIPIENT_IMPORT_SYNC_MAX_SIZE=2000)
+    def test_measures_every_operation(self):
+        """Test uploads (inline and queued), campaign creation and statistics are measured"""
+        results = self.run_benchmark(rows=[10, 100], events=[95])
+
+        self.assertEqual(results["upload_10_mode"], "sync")
+        self.assertEqual(results["upload_100_mode"], "queued")
+        self.assertEqual(Recipient.objects.filter(email__startswith="recipient").count(), 110 + 10)
+        self.assertEqual(results["campaign_create_10_candidates"], 10)
+        self.assertEqual(results["campaign_create_100_candidates"], 100)
+        self.assertEqual(EmailEvent.objects.count(), 95)
+        statistics = CampaignStatistics.objects.get()
+        self.assertEqual((statistics.total_recipients, statistics.sent_count), (10, 10))
+        for key in ("upload_100", "campaign_create_100", "update_statistics_95"):
+            self.assertIn(f"{key}_seconds", results)
+            self.assertGreater(results[f"{key}_queries"], 0)
+            self.assertIn(f"{key}_peak_rss_mb", results)
+
+    def test_single_operation(self):
+        """Test campaign creation can be measured without an upload"""
+        results = self.run_benchmark(rows=[20], operations=["campaign_create"])
+
+        self.assertEqual(results["campaign_create_20_candidates"], 20)
+        self.assertNotIn("upload_20_seconds", results)
+        self.assertFalse(EmailEvent.objects.exists())
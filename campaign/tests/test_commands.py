@@ -2,23 +2,36 @@
 Unit tests for management commands.
 
 This module contains tests for management commands in the campaign application:
-- send_emails command
+- send_emails command (including --profile)
+- load_recipients command
 """
 
+import os
+import pstats
+import tempfile
 from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
+from django.apps import apps
 from django.contrib.auth.models import User
-from django.core.management import call_command
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.signals import pre_migrate
+from django.test import TestCase, override_settings
+from django.urls import reverse
 from django.utils import timezone
 
+from campaign.derived_logs import VIEW_NAME
 from campaign.models import (
+    DerivedEmailLog,
     EmailCampaign,
     EmailLog,
     EmailSendCandidate,
     EmailTemplate,
     Recipient,
+    SendCounter,
 )
 
 
@@ -168,3 +181,183 @@ class SendEmailsCommandTest(TestCase):
         # Email should not be sent
         candidate.refresh_from_db()
         self.assertFalse(candidate.sent)
+
+    @patch('campaign.management.commands.send_emails.EmailMessage.send')
+    def test_send_emails_queues_just_in_time_audience(self, mock_send):
+        """Test a just-in-time audience is turned into candidates batch by batch"""
+        mock_send.return_value = 1
+        self.profile.max_emails_per_hour = 3
+        self.profile.save()
+        for i in range(5):
+            Recipient.objects.create(
+                user_profile=self.profile, first_name=f"User{i}", last_name="Test",
+                email=f"user{i}@example.com", city="NYC"
+            )
+        campaign = EmailCampaign.objects.create(
+            user_profile=self.profile,
+            name="Just in time",
+            template=self.template,
+            scheduled_time=timezone.now() - timedelta(minutes=5),
+            audience_filter={"city": "NYC"},
+        )
+
+        call_command('send_emails')
+
+        self.assertEqual(campaign.emailsendcandidate_set.count(), 3)
+        self.assertEqual(campaign.emailsendcandidate_set.filter(sent=True).count(), 3)
+        campaign.refresh_from_db()
+        self.assertFalse(campaign.audience_exhausted)
+
+        self.profile.max_emails_per_hour = 100
+        self.profile.save()
+        call_command('send_emails')
+
+        campaign.refresh_from_db()
+        self.assertTrue(campaign.audience_exhausted)
+        sent_to = campaign.emailsendcandidate_set.filter(sent=True).values_list('recipient__email', flat=True)
+        self.assertEqual(sorted(sent_to), [f"user{i}@example.com" for i in range(5)])
+
+    def make_candidates(self, count):
+        candidates = []
+        for i in range(count):
+            recipient = Recipient.objects.create(user_profile=self.profile, email=f"derived{i}@example.com")
+            candidates.append(EmailSendCandidate.objects.create(
+                user_profile=self.profile, recipient=recipient, template=self.template, campaign=self.campaign,
+                scheduled_time=timezone.now() - timedelta(minutes=5),
+            ))
+        return candidates
+
+    @override_settings(EMAIL_LOG_FROM_EVENTS=True)
+    @patch('campaign.management.commands.send_emails.EmailMessage.send')
+    def test_send_emails_derives_logs_from_events(self, mock_send):
+        """Test EMAIL_LOG_FROM_EVENTS writes no EmailLog rows and serves logs from events"""
+        mock_send.side_effect = [1, Exception("SMTP error")]
+        self.make_candidates(2)
+
+        call_command('send_emails', stdout=StringIO())
+
+        self.assertFalse(EmailLog.objects.exists())
+        logs = {log.recipient: log for log in DerivedEmailLog.objects.all()}
+        self.assertEqual(logs["derived0@example.com"].status, "Sent")
+        self.assertIsNone(logs["derived0@example.com"].error_message)
+        self.assertEqual(logs["derived1@example.com"].status, "Failed")
+        self.assertIn("SMTP error", logs["derived1@example.com"].error_message)
+        self.assertEqual(logs["derived0@example.com"].campaign, self.campaign)
+
+        self.client.login(username="testuser", password="testpass123")
+        response = self.client.get(reverse("log_list"), {"status": "Failed"})
+        self.assertEqual([log.recipient for log in response.context["logs"]], ["derived1@example.com"])
+
+    def test_derived_log_view_is_dropped_during_migrate(self):
+        """Test migrate drops the derived log view before migrating and creates it again afterwards"""
+        during = []
+
+        def record_views(sender, **kwargs):
+            during.append(VIEW_NAME in connection.introspection.table_names(include_views=True))
+
+        campaign_app = apps.get_app_config("campaign")
+        pre_migrate.connect(record_views, sender=campaign_app)
+        try:
+            call_command("migrate", verbosity=0)
+        finally:
+            pre_migrate.disconnect(record_views, sender=campaign_app)
+
+        self.assertEqual(during, [False])
+        self.assertIn(VIEW_NAME, connection.introspection.table_names(include_views=True))
+
+    @override_settings(EMAIL_LOG_FROM_EVENTS=True)
+    @patch('campaign.management.commands.send_emails.EmailMessage.send')
+    def test_send_counters_limit_without_email_logs(self, mock_send):
+        """Test the hourly limit comes from send counters, which agree with event-derived logs"""
+        mock_send.return_value = 1
+        self.profile.max_emails_per_hour = 2
+        self.profile.save()
+        self.make_candidates(3)
+
+        call_command('send_emails', stdout=StringIO())
+        call_command('send_emails', stdout=StringIO())
+
+        self.assertEqual(mock_send.call_count, 2)
+        counted = SendCounter.objects.filter(user_profile=self.profile).aggregate(total=Sum("sent"))["total"]
+        self.assertEqual(counted, 2)
+        self.assertEqual(DerivedEmailLog.objects.filter(status="Sent").count(), counted)
+
+    @patch('campaign.management.commands.send_emails.InstrumentedEmailBackend.open')
+    @patch('campaign.management.commands.send_emails.EmailMessage.send')
+    def test_profile_reports_phases_and_user_totals(self, mock_send, mock_open):
+        """Test --profile writes a pstats dump and prints time per phase and per user"""
+        mock_send.side_effect = [1, Exception("SMTP error")]
+        self.make_candidates(2)
+        out = StringIO()
+
+        with tempfile.TemporaryDirectory() as profile_dir:
+            call_command('send_emails', profile=True, profile_dir=profile_dir, stdout=out)
+            dumps = os.listdir(profile_dir)
+            self.assertEqual(len(dumps), 1)
+            stats = pstats.Stats(os.path.join(profile_dir, dumps[0]))
+            self.assertTrue(stats.total_calls)
+
+        output = out.getvalue()
+        self.assertEqual(mock_open.call_count, 2)
+        for phase in ("candidate_query", "render", "mime_build", "smtp_connect", "smtp_send", "db_write"):
+            self.assertIn(f"  {phase} ", output)
+        self.assertIn("testuser: ", output)
+        self.assertIn("sent=1 failed=1 suppressed=0", output)
+        self.assertIn("Profile written to", output)
+
+    @patch('campaign.management.commands.send_emails.EmailMessage.send')
+    def test_no_profile_output_by_default(self, mock_send):
+        """Test a normal run prints no timings"""
+        mock_send.return_value = 1
+        self.make_candidates(1)
+        out = StringIO()
+
+        call_command('send_emails', stdout=out)
+
+        self.assertNotIn("Phase timings", out.getvalue())
+
+
+class LoadRecipientsCommandTest(TestCase):
+    """Test cases for load_recipients management command"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        Recipient.objects.create(
+            user_profile=self.profile, first_name="Old", last_name="Name", email="user0@example.com"
+        )
+
+        handle, self.csv_path = tempfile.mkstemp(suffix=".csv")
+        self.addCleanup(os.remove, self.csv_path)
+        with os.fdopen(handle, "w") as csv_file:
+            csv_file.write("first_name,last_name,company,email,country,city,free_field1,free_field2,free_field3\n")
+            for i in range(5):
+                csv_file.write(f"First{i},Last{i},Acme,user{i}@example.com,USA,NYC,,,\n")
+            csv_file.write("Bad,Row,Acme,not-an-email,USA,NYC,,,\n")
+
+    def test_load_recipients_upserts_in_batches(self):
+        """Test recipients are inserted and updated with invalid rows reported"""
+        out = StringIO()
+        call_command("load_recipients", self.csv_path, "--user=testuser", "--batch-size=2", stdout=out)
+
+        self.assertIn("6 rows processed: 4 added, 1 updated, 1 failed", out.getvalue())
+        self.assertIn("Line 7:", out.getvalue())
+        self.assertEqual(Recipient.objects.filter(user_profile=self.profile).count(), 5)
+        self.assertEqual(Recipient.objects.get(email="user0@example.com").first_name, "First0")
+
+    def test_short_row_fails_without_stopping_the_load(self):
+        """Test a row with too few columns is counted as failed and later rows still load"""
+        with open(self.csv_path, "a") as csv_file:
+            csv_file.write("Short,Row,user8@example.com\n")
+            csv_file.write("First9,Last9,Acme,user9@example.com,USA,NYC,,,\n")
+        out = StringIO()
+
+        call_command("load_recipients", self.csv_path, "--user=testuser", stdout=out)
+
+        self.assertIn("8 rows processed: 5 added, 1 updated, 2 failed", out.getvalue())
+        self.assertTrue(Recipient.objects.filter(email="user9@example.com").exists())
+
+    def test_load_recipients_unknown_user(self):
+        """Test an unknown username is rejected"""
+        with self.assertRaises(CommandError):
+            call_command("load_recipients", self.csv_path, "--user=nobody")
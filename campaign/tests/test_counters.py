@@ -0,0 +1,101 @@
+"""
+Unit tests for the per-minute send counters and sending limits.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from campaign.counters import compact_send_counters, emails_remaining, record_send, send_counts
+from campaign.models import EmailCampaign, EmailSendCandidate, EmailTemplate, Recipient, SendCounter
+
+
+class SendCounterTest(TestCase):
+    """Test cases for recording and summing send counters"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        self.now = datetime(2026, 5, 20, 12, 30, 15, tzinfo=dt_timezone.utc)
+
+    def test_results_accumulate_per_minute(self):
+        """Test send results in the same minute share one row"""
+        record_send(self.profile.id, self.now, sent=True)
+        record_send(self.profile.id, self.now + timedelta(seconds=30), sent=True)
+        record_send(self.profile.id, self.now, sent=False)
+
+        counter = SendCounter.objects.get()
+        self.assertEqual((counter.minute, counter.sent, counter.failed), (self.now.replace(second=0), 2, 1))
+
+    def test_compaction_preserves_totals(self):
+        """Test minute rows older than a day are folded into hourly rows"""
+        old = self.now - timedelta(days=2)
+        for minute in range(0, 60, 10):
+            record_send(self.profile.id, old.replace(minute=minute), sent=True)
+        record_send(self.profile.id, self.now, sent=False)
+
+        folded = compact_send_counters(self.now)
+
+        self.assertEqual(folded, 5)
+        self.assertEqual(SendCounter.objects.count(), 2)
+        self.assertEqual(send_counts(self.profile), {"sent": 6, "failed": 1})
+        self.assertEqual(compact_send_counters(self.now), 0)
+
+    def test_remaining_uses_tightest_limit(self):
+        """Test the daily and monthly limits cap what the hourly limit allows"""
+        self.profile.max_emails_per_hour = 100
+        self.profile.max_emails_per_day = 10
+        self.profile.max_emails_per_month = 50
+        for _ in range(4):
+            record_send(self.profile.id, self.now - timedelta(hours=3), sent=True)
+        record_send(self.profile.id, self.now - timedelta(days=10), sent=True)
+
+        self.assertEqual(emails_remaining(self.profile, self.now), 6)
+        self.profile.max_emails_per_day = None
+        self.assertEqual(emails_remaining(self.profile, self.now), 45)
+
+
+class DailyLimitCommandTest(TestCase):
+    """Test cases for sending limits in send_emails"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        self.profile.from_email = "test@example.com"
+        self.profile.smtp_host = "smtp.example.com"
+        self.profile.max_emails_per_day = 2
+        self.profile.save()
+        template = EmailTemplate.objects.create(user_profile=self.profile, name="T", subject="S", body="B")
+        campaign = EmailCampaign.objects.create(
+            user_profile=self.profile, name="C", template=template, scheduled_time=timezone.now()
+        )
+        for i in range(3):
+            recipient = Recipient.objects.create(user_profile=self.profile, email=f"user{i}@example.com")
+            EmailSendCandidate.objects.create(
+                user_profile=self.profile, recipient=recipient, template=template, campaign=campaign,
+                scheduled_time=timezone.now() - timedelta(minutes=5),
+            )
+
+    @patch('campaign.management.commands.send_emails.EmailMessage.send')
+    def test_daily_limit_stops_sending(self, mock_send):
+        """Test send_emails stops at the daily limit and counts every result"""
+        mock_send.return_value = 1
+
+        call_command('send_emails', stdout=StringIO())
+        out = StringIO()
+        call_command('send_emails', stdout=out)
+
+        self.assertEqual(mock_send.call_count, 2)
+        self.assertIn("Email limit reached", out.getvalue())
+        self.assertEqual(send_counts(self.profile)["sent"], 2)
+
+        self.client.login(username="testuser", password="testpass123")
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["emails_last_hour"], 2)
+        self.assertEqual(response.context["emails_today"], 2)
@@ -0,0 +1,104 @@
+"""
+Unit tests for streaming exports of recipients, logs and events.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from campaign.models import EmailCampaign, EmailEvent, EmailLog, EmailSendCandidate, EmailTemplate, Recipient
+
+
+class ExportTest(TestCase):
+    """Test cases for the export_data view and command"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        self.template = EmailTemplate.objects.create(
+            user_profile=self.profile, name="Template", subject="Subject", body="Body"
+        )
+        self.campaign = EmailCampaign.objects.create(
+            user_profile=self.profile, name="Campaign", template=self.template, scheduled_time=timezone.now()
+        )
+        for i in range(3):
+            recipient = Recipient.objects.create(
+                user_profile=self.profile, first_name=f"User{i}", last_name="Test", email=f"user{i}@example.com"
+            )
+            candidate = EmailSendCandidate.objects.create(
+                user_profile=self.profile,
+                recipient=recipient,
+                template=self.template,
+                campaign=self.campaign,
+                scheduled_time=timezone.now(),
+            )
+            EmailEvent.objects.create(email_candidate=candidate, event_type="opened", metadata={"first_open": True})
+            EmailLog.objects.create(
+                user_profile=self.profile, recipient=recipient.email, campaign=self.campaign,
+                status="Sent", sent_time=timezone.now()
+            )
+
+        other = User.objects.create_user(username="other", password="testpass123")
+        Recipient.objects.create(user_profile=other.profile, first_name="Other", last_name="User", email="other@example.com")
+        self.client.login(username="testuser", password="testpass123")
+
+    def test_export_recipients_csv(self):
+        """Test recipients stream as CSV scoped to the logged in user"""
+        response = self.client.get(reverse("export_data", args=["recipients"]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="recipients.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([row["email"] for row in rows], [f"user{i}@example.com" for i in range(3)])
+
+    def test_export_events_ndjson_gzip(self):
+        """Test events stream as gzipped NDJSON with JSON metadata"""
+        response = self.client.get(
+            reverse("export_data", args=["events"]),
+            {"format": "ndjson", "gzip": "1", "campaign": self.campaign.id},
+        )
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        events = [json.loads(line) for line in lines]
+        self.assertEqual(len(events), 3)
+        self.assertEqual(events[0]["event_type"], "opened")
+        self.assertEqual(events[0]["metadata"], {"first_open": True})
+        self.assertEqual(events[0]["email_candidate__recipient__email"], "user0@example.com")
+
+    def test_export_rejects_unknown_kind_and_other_users_campaign(self):
+        """Test unknown exports and other tenants' campaigns return 404"""
+        self.assertEqual(self.client.get(reverse("export_data", args=["users"])).status_code, 404)
+
+        self.client.login(username="other", password="testpass123")
+        response = self.client.get(reverse("export_data", args=["logs"]), {"campaign": self.campaign.id})
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_rejects_malformed_campaign_id(self):
+        """Test a non-numeric campaign parameter returns 404 instead of an error"""
+        response = self.client.get(reverse("export_data", args=["logs"]), {"campaign": "abc"})
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_data_command_writes_file(self):
+        """Test the export_data command writes a CSV of email logs"""
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+
+        call_command("export_data", "logs", "--user=testuser", f"--output={path}")
+
+        with open(path, newline="") as export:
+            rows = list(csv.DictReader(export))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["campaign__name"], "Campaign")
@@ -0,0 +1,172 @@
+"""
+Unit tests for the streaming recipient CSV importer and import jobs.
+"""
+
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from campaign import importers
+from campaign.importers import import_recipients, iter_csv_rows
+from campaign.models import Recipient, RecipientImportJob
+
+CSV_HEADER = b"first_name,last_name,company,email,country,city,free_field1,free_field2,free_field3\n"
+
+
+class RecipientImportTest(TestCase):
+    """Test cases for import_recipients and iter_csv_rows"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+
+    def make_file(self, body):
+        return SimpleUploadedFile("recipients.csv", CSV_HEADER + body, content_type="text/csv")
+
+    def test_import_inserts_and_updates_in_batches(self):
+        """Test rows are upserted across several batches"""
+        Recipient.objects.create(
+            user_profile=self.profile, first_name="Old", last_name="Name", email="user0@example.com"
+        )
+        body = b"".join(
+            f"First{i},Last{i},Acme,user{i}@example.com,USA,NYC,a,b,c\n".encode() for i in range(5)
+        )
+
+        result = import_recipients(self.profile, iter_csv_rows(self.make_file(body)), batch_size=2)
+
+        self.assertEqual(result.rows, 5)
+        self.assertEqual(result.inserted, 4)
+        self.assertEqual(result.updated, 1)
+        self.assertEqual(result.failed, 0)
+        self.assertEqual(Recipient.objects.filter(user_profile=self.profile).count(), 5)
+        self.assertEqual(Recipient.objects.get(email="user0@example.com").first_name, "First0")
+
+    def test_import_reports_invalid_rows_without_aborting(self):
+        """Test invalid rows are reported with their line numbers and skipped"""
+        body = (
+            b"John,Doe,Acme,john@example.com,USA,NYC,,,\n"
+            b"Bad,Row,Acme,not-an-email,USA,NYC,,,\n"
+            b"Short,Row\n"
+            b'"Jane, Jr.",Smith,"Multi\nLine Inc",jane@example.com,UK,London,,,\n'
+        )
+
+        result = import_recipients(self.profile, iter_csv_rows(self.make_file(body)))
+
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual(result.failed, 2)
+        self.assertEqual([line for line, _ in result.errors], [3, 4])
+        self.assertEqual(Recipient.objects.get(email="jane@example.com").company, "Multi\nLine Inc")
+
+    def test_duplicate_addresses_in_file_keep_last_row(self):
+        """Test a repeated address within one batch is written once with the last values"""
+        body = (
+            b"First,One,Acme,dup@example.com,USA,NYC,,,\n"
+            b"First,Two,Acme,dup@example.com,USA,NYC,,,\n"
+        )
+
+        result = import_recipients(self.profile, iter_csv_rows(self.make_file(body)))
+
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(result.updated, 1)
+        self.assertEqual(Recipient.objects.get(email="dup@example.com").last_name, "Two")
+
+    def test_recipient_upload_view_imports_file(self):
+        """Test the upload view imports the CSV for the logged in user"""
+        self.client.login(username="testuser", password="testpass123")
+        upload = self.make_file(b"John,Doe,Acme,john@example.com,USA,NYC,,,\n")
+
+        response = self.client.post(reverse("recipient_upload"), {"csv_file": upload})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Recipient.objects.filter(user_profile=self.profile, email="john@example.com").exists())
+
+
+class RecipientImportJobTest(TestCase):
+    """Test cases for background import jobs and the process_imports command"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, RECIPIENT_IMPORT_SYNC_MAX_SIZE=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        self.client.login(username="testuser", password="testpass123")
+
+    def upload(self, rows=6):
+        body = b"".join(
+            f"First{i},Last{i},Acme,user{i}@example.com,USA,NYC,,,\n".encode() for i in range(rows)
+        )
+        upload = SimpleUploadedFile("recipients.csv", CSV_HEADER + body, content_type="text/csv")
+        response = self.client.post(reverse("recipient_upload"), {"csv_file": upload})
+        return response, RecipientImportJob.objects.get(user_profile=self.profile)
+
+    def test_large_upload_is_queued(self):
+        """Test uploads above the sync limit create a pending job instead of importing"""
+        response, job = self.upload()
+
+        self.assertRedirects(response, reverse("recipient_import_detail", args=[job.id]))
+        self.assertEqual(job.status, "pending")
+        self.assertFalse(Recipient.objects.exists())
+
+    def test_process_imports_completes_job(self):
+        """Test the worker imports the file and reports progress through the status endpoint"""
+        _, job = self.upload()
+
+        call_command("process_imports", "--chunk-size=4")
+
+        response = self.client.get(reverse("recipient_import_status", args=[job.id]))
+        data = response.json()
+        self.assertEqual(data["status"], "completed")
+        self.assertEqual(data["progress"], 100)
+        self.assertEqual(data["rows_done"], 6)
+        self.assertEqual(data["inserted"], 6)
+        self.assertEqual(Recipient.objects.filter(user_profile=self.profile).count(), 6)
+
+    def test_interrupted_job_resumes_from_committed_offset(self):
+        """Test a job killed after its first chunk resumes without re-importing that chunk"""
+        _, job = self.upload()
+        real_import = importers.import_recipients
+        calls = []
+
+        def fail_second_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("worker killed")
+            return real_import(*args, **kwargs)
+
+        with patch("campaign.importers.import_recipients", side_effect=fail_second_chunk):
+            call_command("process_imports", "--chunk-size=4")
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.rows_done, 4)
+        self.assertEqual(job.line_number, 5)
+
+        RecipientImportJob.objects.filter(pk=job.pk).update(status="pending")
+        with patch("campaign.importers.import_recipients", wraps=real_import) as mock_import:
+            call_command("process_imports", "--chunk-size=4")
+        self.assertEqual(len(mock_import.call_args.args[1]), 2)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.rows_done, 6)
+        self.assertEqual(job.inserted_count, 6)
+        self.assertEqual(job.updated_count, 0)
+
+    def test_status_endpoint_is_tenant_scoped(self):
+        """Test users cannot poll another user's import job"""
+        _, job = self.upload()
+        User.objects.create_user(username="other", password="testpass123")
+        self.client.login(username="other", password="testpass123")
+
+        response = self.client.get(reverse("recipient_import_status", args=[job.id]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,221 @@
+"""
+Unit tests for the Prometheus metrics store and the /metrics endpoint.
+"""
+
+import asyncio
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from campaign import email_backends, metrics
+from campaign.models import EmailCampaign, EmailSendCandidate, EmailTemplate, Recipient
+from campaign.webhooks import build_event
+
+
+def clear_metrics():
+    metrics.flush()
+    with metrics._lock, metrics._connection() as connection:
+        connection.execute("DELETE FROM samples")
+
+
+class MetricsStoreTest(TestCase):
+    """Test cases for counters, histograms and their exposition"""
+
+    def setUp(self):
+        clear_metrics()
+
+    def test_counter_sums_by_label(self):
+        """Test counter increments are summed per label set"""
+        metrics.EMAILS_SENT.inc(tenant=1)
+        metrics.EMAILS_SENT.inc(2, tenant=1)
+        metrics.EMAILS_SENT.inc(tenant=2)
+
+        output = metrics.render()
+        self.assertIn('djangomailer_emails_sent_total{tenant="1"} 3', output)
+        self.assertIn('djangomailer_emails_sent_total{tenant="2"} 1', output)
+        self.assertIn("# TYPE djangomailer_emails_sent counter", output)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test each observation counts in its own and every larger bucket"""
+        metrics.SMTP_DATA_SECONDS.observe(0.02)
+        metrics.SMTP_DATA_SECONDS.observe(0.3)
+        metrics.SMTP_DATA_SECONDS.observe(60)
+
+        output = metrics.render()
+        self.assertIn('djangomailer_smtp_data_seconds_bucket{le="0.01"} 0', output)
+        self.assertIn('djangomailer_smtp_data_seconds_bucket{le="0.025"} 1', output)
+        self.assertIn('djangomailer_smtp_data_seconds_bucket{le="0.5"} 2', output)
+        self.assertIn('djangomailer_smtp_data_seconds_bucket{le="30"} 2', output)
+        self.assertIn('djangomailer_smtp_data_seconds_bucket{le="+Inf"} 3', output)
+        self.assertIn("djangomailer_smtp_data_seconds_sum 60.32", output)
+        self.assertIn("djangomailer_smtp_data_seconds_count 3", output)
+
+    def test_samples_from_another_process_are_added(self):
+        """Test samples already in the shared file add to this process's own"""
+        with metrics._lock, metrics._connection() as connection:
+            connection.execute(
+                "INSERT INTO samples VALUES (?, ?, ?)", ("djangomailer_tracking_hits_total", 'kind="open"', 5)
+            )
+        metrics.TRACKING_HITS.inc(kind="open")
+
+        self.assertIn('djangomailer_tracking_hits_total{kind="open"} 6', metrics.render())
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0)
+    def test_flush_from_the_event_loop_runs_on_a_thread(self):
+        """Test a flush due in async code is written off the event loop's thread"""
+        threads = []
+        write = metrics._write
+
+        def record_thread(connection, batch):
+            threads.append(threading.current_thread())
+            write(connection, batch)
+
+        async def hit():
+            metrics.TRACKING_HITS.inc(kind="open")
+
+        with patch.object(metrics, "_write", record_thread):
+            asyncio.run(hit())
+            metrics.flush()
+
+        self.assertNotEqual(threads[0], threading.current_thread())
+        self.assertIn('djangomailer_tracking_hits_total{kind="open"} 1', metrics.render())
+
+    @override_settings(METRICS_FLUSH_INTERVAL=3600)
+    def test_samples_are_buffered_until_flushed(self):
+        """Test increments stay in memory until the flush interval passes"""
+        metrics.flush()
+        metrics.TRACKING_HITS.inc(kind="click")
+
+        with metrics._lock:
+            stored = metrics._connection().execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+        self.assertEqual(stored, 0)
+        metrics.flush()
+        self.assertIn('djangomailer_tracking_hits_total{kind="click"} 1', metrics.render())
+
+
+class InstrumentationTest(TestCase):
+    """Test cases for the metrics recorded by sending and tracking"""
+
+    def setUp(self):
+        clear_metrics()
+        email_backends._mx_cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        self.recipient = Recipient.objects.create(user_profile=self.profile, email="test@example.com")
+        self.template = EmailTemplate.objects.create(
+            user_profile=self.profile, name="Template", subject="Hello", body="Hi {first_name}"
+        )
+        self.campaign = EmailCampaign.objects.create(
+            user_profile=self.profile, name="Campaign", template=self.template, scheduled_time=timezone.now()
+        )
+        self.candidate = EmailSendCandidate.objects.create(
+            user_profile=self.profile,
+            recipient=self.recipient,
+            template=self.template,
+            campaign=self.campaign,
+            scheduled_time=timezone.now() - timedelta(minutes=1),
+        )
+
+    @patch("campaign.management.commands.send_emails.EmailMessage.send")
+    def test_send_results_are_counted_per_tenant(self, mock_send):
+        """Test send_emails counts sent and failed emails per user profile"""
+        mock_send.side_effect = [1, Exception("SMTP error")]
+        EmailSendCandidate.objects.create(
+            user_profile=self.profile,
+            recipient=Recipient.objects.create(user_profile=self.profile, email="other@example.com"),
+            template=self.template,
+            campaign=self.campaign,
+            scheduled_time=timezone.now() - timedelta(minutes=1),
+        )
+
+        call_command("send_emails", stdout=StringIO())
+
+        output = metrics.render()
+        self.assertIn(f'djangomailer_emails_sent_total{{tenant="{self.profile.id}"}} 1', output)
+        self.assertIn(f'djangomailer_emails_failed_total{{tenant="{self.profile.id}"}} 1', output)
+
+    def test_tracking_hits_are_counted(self):
+        """Test opens and clicks are counted by kind"""
+        self.client.get(reverse("email_tracking_pixel", args=[self.candidate.tracking_id]))
+        self.client.get(reverse("email_tracking_click", args=[self.candidate.tracking_id]), {"url": "/"})
+        self.client.get(reverse("email_tracking_pixel", args=[self.candidate.tracking_id]))
+
+        output = metrics.render()
+        self.assertIn('djangomailer_tracking_hits_total{kind="open"} 2', output)
+        self.assertIn('djangomailer_tracking_hits_total{kind="click"} 1', output)
+
+    def test_event_lag_is_observed(self):
+        """Test provider events with a timestamp record how late they arrive"""
+        sent_at = (timezone.now() - timedelta(seconds=30)).timestamp()
+        build_event("delivered", self.candidate.id, {"email": "test@example.com", "timestamp": sent_at})
+        build_event("delivered", self.candidate.id, {"email": "test@example.com"})
+
+        output = metrics.render()
+        self.assertIn('djangomailer_event_flush_lag_seconds_bucket{le="15"} 0', output)
+        self.assertIn('djangomailer_event_flush_lag_seconds_bucket{le="60"} 1', output)
+        self.assertIn("djangomailer_event_flush_lag_seconds_count 1", output)
+
+    @patch("campaign.email_backends.dns.resolver.resolve")
+    def test_mx_lookups_are_cached(self, mock_resolve):
+        """Test repeated MX lookups for a domain are answered from the cache"""
+        mock_resolve.return_value = []
+        backend = email_backends.DirectEmailBackend()
+
+        backend._get_mx_records("example.com")
+        backend._get_mx_records("example.com")
+
+        mock_resolve.assert_called_once()
+        output = metrics.render()
+        self.assertIn("djangomailer_mx_cache_hits_total 1", output)
+        self.assertIn("djangomailer_mx_cache_misses_total 1", output)
+
+
+class MetricsViewTest(TestCase):
+    """Test cases for the /metrics endpoint"""
+
+    def setUp(self):
+        clear_metrics()
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.staff = User.objects.create_user(username="staff", password="testpass123", is_staff=True)
+        self.url = reverse("metrics")
+
+    def test_requires_staff_without_token(self):
+        """Test only staff users can read metrics when no token is set"""
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.login(username="testuser", password="testpass123")
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.login(username="staff", password="testpass123")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_bearer_token(self):
+        """Test scrapers authenticate with the configured bearer token"""
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+    def test_queue_depth_per_tenant(self):
+        """Test the queue depth gauge counts due, unsent emails per user profile"""
+        profile = self.user.profile
+        template = EmailTemplate.objects.create(user_profile=profile, name="Template", subject="Hi", body="Hi")
+        now = timezone.now()
+        for index, scheduled_time in enumerate([now - timedelta(hours=1), now, now + timedelta(hours=1)]):
+            EmailSendCandidate.objects.create(
+                user_profile=profile,
+                recipient=Recipient.objects.create(user_profile=profile, email=f"user{index}@example.com"),
+                template=template,
+                scheduled_time=scheduled_time,
+            )
+
+        self.client.login(username="staff", password="testpass123")
+        output = self.client.get(self.url).content.decode()
+        self.assertIn("# TYPE djangomailer_queue_depth gauge", output)
+        self.assertIn(f'djangomailer_queue_depth{{tenant="{profile.id}"}} 2', output)
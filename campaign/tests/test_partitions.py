@@ -0,0 +1,64 @@
+"""
+Unit tests for EmailEvent partition management.
+"""
+
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+
+from campaign.partitions import (
+    expired_partitions,
+    month_start,
+    next_month,
+    partition_month,
+    partition_name,
+)
+
+
+class PartitionHelpersTest(TestCase):
+    """Test cases for partition naming and retention"""
+
+    def test_month_arithmetic(self):
+        """Test months start at midnight UTC and roll over the year"""
+        moment = datetime(2025, 12, 31, 23, 30, tzinfo=timezone.utc)
+        self.assertEqual(month_start(moment), datetime(2025, 12, 1, tzinfo=timezone.utc))
+        self.assertEqual(next_month(month_start(moment)), datetime(2026, 1, 1, tzinfo=timezone.utc))
+
+    def test_partition_names_round_trip(self):
+        """Test partition names encode the month they hold"""
+        month = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        self.assertEqual(partition_name(month), "campaign_emailevent_p2026_03")
+        self.assertEqual(partition_month(partition_name(month)), month)
+        self.assertIsNone(partition_month("campaign_emailevent_default"))
+
+    def test_expired_partitions(self):
+        """Test only partitions whose whole month is before the cutoff expire"""
+        names = [
+            "campaign_emailevent_p2026_01",
+            "campaign_emailevent_p2026_02",
+            "campaign_emailevent_p2026_03",
+            "campaign_emailevent_default",
+        ]
+        cutoff = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        self.assertEqual(
+            expired_partitions(names, cutoff), ["campaign_emailevent_p2026_01", "campaign_emailevent_p2026_02"]
+        )
+        self.assertEqual(expired_partitions(names, datetime(2026, 2, 28, tzinfo=timezone.utc)), [
+            "campaign_emailevent_p2026_01"
+        ])
+
+    def test_command_without_partitioning(self):
+        """Test the command is a no-op on databases without partitioning"""
+        out = StringIO()
+        call_command("manage_event_partitions", "--retention-days", "30", stdout=out)
+        self.assertIn("not partitioned", out.getvalue())
+
+    def test_partitioning_needs_postgresql(self):
+        """Test the opt-in table rebuild refuses to run on other databases"""
+        if connection.vendor == "postgresql":
+            self.skipTest("Not on PostgreSQL")
+        with self.assertRaisesMessage(CommandError, "needs PostgreSQL"):
+            call_command("partition_event_table", stdout=StringIO())
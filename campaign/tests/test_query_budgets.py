@@ -0,0 +1,190 @@
+"""
+Query-budget regression tests.
+
+Every page and the send loop are run against the same account at two sizes;
+the number of SQL queries must not grow with the number of rows shown or
+sent (beyond the writes each sent email needs). A failure means an N+1
+query, usually a related object read once per row.
+"""
+
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from campaign.models import (
+    CampaignStatistics, EmailCampaign, EmailEvent, EmailLog, EmailSendCandidate, EmailTemplate, Recipient,
+    RecipientImportJob, Segment, SendCounter, SuppressedAddress
+)
+
+SMALL, LARGE = 2, 12
+
+# Statements send_emails runs for each sent email: a savepoint, the
+# candidate update, the EmailLog and EmailEvent inserts, the send counter
+# update and the savepoint release
+QUERIES_PER_SENT_EMAIL = 6
+
+
+class QueryBudgetTestCase(TestCase):
+    """Base class seeding an account one batch of rows at a time"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="budget", password="testpass123", email="b@example.com")
+        self.profile = self.user.profile
+        self.profile.from_email = "sender@example.com"
+        self.profile.max_emails_per_hour = self.profile.max_emails_per_day = 1000
+        self.profile.save()
+        self.template = EmailTemplate.objects.create(
+            user_profile=self.profile, name="Budget", subject="Hi {first_name}", body="Hello {first_name}"
+        )
+        self.campaign = EmailCampaign.objects.create(
+            user_profile=self.profile, name="Budget", template=self.template, scheduled_time=timezone.now()
+        )
+        CampaignStatistics.objects.create(campaign=self.campaign)
+        self.seeded = 0
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def seed(self, count):
+        """Add `count` rows of every kind to the account."""
+        now = timezone.now()
+        for number in range(self.seeded, self.seeded + count):
+            recipient = Recipient.objects.create(
+                user_profile=self.profile, first_name=f"First{number}", last_name="Last",
+                email=f"recipient{number}@example.com",
+            )
+            template = EmailTemplate.objects.create(
+                user_profile=self.profile, name=f"Template {number}", subject="Subject", body="Body"
+            )
+            campaign = EmailCampaign.objects.create(
+                user_profile=self.profile, name=f"Campaign {number}", template=template, scheduled_time=now
+            )
+            campaign.recipients.add(recipient)
+            CampaignStatistics.objects.create(campaign=campaign)
+            sent = EmailSendCandidate.objects.create(
+                user_profile=self.profile, recipient=recipient, template=self.template, campaign=self.campaign,
+                scheduled_time=now, sent=True, sent_time=now,
+            )
+            for event_type in ("sent", "delivered", "opened"):
+                EmailEvent.objects.create(email_candidate=sent, event_type=event_type)
+            EmailEvent.objects.create(
+                email_candidate=sent, event_type="clicked", metadata={"url": f"https://example.com/{number}"}
+            )
+            EmailSendCandidate.objects.create(
+                user_profile=self.profile, recipient=recipient, template=template, campaign=campaign,
+                scheduled_time=now,
+            )
+            EmailLog.objects.create(
+                user_profile=self.profile, recipient=recipient.email, campaign=campaign, status="Sent", sent_time=now
+            )
+            Segment.objects.create(user_profile=self.profile, name=f"Segment {number}", filters={"city": "X"})
+            SuppressedAddress.objects.create(user_profile=self.profile, email=f"blocked{number}@example.com")
+            RecipientImportJob.objects.create(user_profile=self.profile, original_name=f"import{number}.csv")
+        self.seeded += count
+
+    def assertQueryCountIndependentOfSize(self, fetch):
+        """Call fetch() after seeding SMALL and LARGE rows; both must run the same queries."""
+        self.seed(SMALL)
+        with CaptureQueriesContext(connection) as small:
+            fetch()
+        self.seed(LARGE - SMALL)
+        with CaptureQueriesContext(connection) as large:
+            fetch()
+
+        self.assertEqual(
+            len(small.captured_queries),
+            len(large.captured_queries),
+            "Query count grows with the data:\n" + "\n".join(query["sql"] for query in large.captured_queries),
+        )
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, url)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+
+class ViewQueryBudgetTest(QueryBudgetTestCase):
+    """Test cases for the query count of every page"""
+
+    def test_pages(self):
+        """Test each list and dashboard page runs a fixed number of queries"""
+        for name in (
+            "home", "template_list", "queue_list", "log_list", "recipient_list", "segment_list", "email_list",
+            "campaign_list", "campaign_create", "edit_profile",
+        ):
+            with self.subTest(name):
+                self.assertQueryCountIndependentOfSize(lambda: self.get(reverse(name)))
+
+    @override_settings(EMAIL_LOG_FROM_EVENTS=True)
+    def test_log_list_derived_from_events(self):
+        """Test the log list reads derived logs with a fixed number of queries"""
+        self.assertQueryCountIndependentOfSize(lambda: self.get(reverse("log_list")))
+
+    def test_campaign_statistics(self):
+        """Test the statistics page, including a refresh, is independent of the campaign's size"""
+        url = reverse("campaign_statistics", args=[self.campaign.id])
+        self.assertQueryCountIndependentOfSize(lambda: self.get(url, refresh="true"))
+
+    def test_exports(self):
+        """Test every export streams with a fixed number of queries"""
+        for kind in ("recipients", "logs", "events"):
+            with self.subTest(kind):
+                self.assertQueryCountIndependentOfSize(lambda: self.get(reverse("export_data", args=[kind])))
+
+
+class AdminQueryBudgetTest(QueryBudgetTestCase):
+    """Test cases for the query count of the admin changelists"""
+
+    def test_changelists(self):
+        """Test every campaign model's changelist runs a fixed number of queries"""
+        for model in admin.site._registry:
+            if model._meta.app_label != "campaign":
+                continue
+            url = reverse(f"admin:campaign_{model._meta.model_name}_changelist")
+            with self.subTest(model._meta.model_name):
+                self.assertQueryCountIndependentOfSize(lambda: self.get(url))
+
+    def test_event_str(self):
+        """Test an event describes itself with the email it loaded, without reading the recipient"""
+        self.seed(1)
+        event = EmailEvent.objects.select_related("email_candidate").first()
+
+        with self.assertNumQueries(0):
+            self.assertIn("recipient0@example.com", str(event))
+
+
+@patch("campaign.management.commands.send_emails.EmailMessage.send")
+class SendQueryBudgetTest(QueryBudgetTestCase):
+    """Test cases for the query count of send_emails"""
+
+    def test_queries_per_email_are_only_writes(self, mock_send):
+        """Test sending reads recipients and templates with the batch, not per email"""
+        def send():
+            # Both runs start a new minute's send counter
+            SendCounter.objects.all().delete()
+            call_command("send_emails", stdout=StringIO())
+
+        pending = EmailSendCandidate.objects.filter(sent=False)
+        self.seed(SMALL)
+        with CaptureQueriesContext(connection) as small:
+            send()
+        self.assertFalse(pending.exists())
+        self.seed(LARGE)
+        with CaptureQueriesContext(connection) as large:
+            send()
+
+        self.assertFalse(pending.exists())
+        self.assertEqual(
+            len(large.captured_queries) - len(small.captured_queries),
+            (LARGE - SMALL) * QUERIES_PER_SENT_EMAIL,
+            "\n".join(query["sql"] for query in large.captured_queries),
+        )
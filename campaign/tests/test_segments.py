@@ -0,0 +1,157 @@
+"""
+Unit tests for saved segments and their materialized membership.
+"""
+
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models.signals import post_save, pre_delete
+from django.test import TestCase
+from django.urls import reverse
+
+from campaign.importers import import_recipients, iter_csv_rows
+from campaign.models import EmailCampaign, EmailSendCandidate, EmailTemplate, Recipient, Segment, SegmentMembership
+from campaign.segments import create_segment, delete_recipients, refresh_segment, refresh_segments, segment_recipients
+
+CSV_HEADER = b"first_name,last_name,company,email,country,city,free_field1,free_field2,free_field3\n"
+
+
+class SegmentTest(TestCase):
+    """Test cases for segment creation and incremental refresh"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        for i in range(6):
+            Recipient.objects.create(
+                user_profile=self.profile, first_name=f"User{i}", last_name="Test",
+                email=f"user{i}@example.com", city="Paris" if i % 2 else "London",
+            )
+        other = User.objects.create_user(username="other", password="testpass123")
+        Recipient.objects.create(
+            user_profile=other.profile, first_name="Other", last_name="Test", email="other@example.com", city="Paris"
+        )
+        self.segment = create_segment(self.profile, "Paris", {"city": "Paris"})
+
+    def assertMembership(self, segment, count):
+        segment.refresh_from_db()
+        self.assertEqual(segment.member_count, count)
+        self.assertEqual(segment.memberships.count(), count)
+
+    def test_create_materializes_matching_recipients(self):
+        """Test a new segment contains the user's matching recipients only"""
+        self.assertMembership(self.segment, 3)
+        self.assertTrue(all(r.city == "Paris" for r in segment_recipients(self.segment)))
+        self.assertFalse(segment_recipients(self.segment).exclude(user_profile=self.profile).exists())
+
+    def test_import_refreshes_membership_incrementally(self):
+        """Test imported rows join or leave segments according to their new values"""
+        body = (
+            b"User0,Test,,user0@example.com,,Paris,,,\n"   # London -> Paris
+            b"User1,Test,,user1@example.com,,Berlin,,,\n"  # Paris -> Berlin
+            b"New,Test,,new@example.com,,Paris,,,\n"
+        )
+        upload = SimpleUploadedFile("recipients.csv", CSV_HEADER + body, content_type="text/csv")
+
+        import_recipients(self.profile, iter_csv_rows(upload))
+
+        self.assertMembership(self.segment, 4)
+        emails = set(segment_recipients(self.segment).values_list("email", flat=True))
+        self.assertEqual(emails, {"user0@example.com", "user3@example.com", "user5@example.com", "new@example.com"})
+
+    def test_edit_and_delete_keep_size_in_step(self):
+        """Test refreshing an edited recipient and deleting recipients update membership and the stored size"""
+        recipient = Recipient.objects.get(email="user2@example.com")
+        recipient.city = "Paris"
+        recipient.save()
+        refresh_segments(self.profile, Recipient.objects.filter(pk=recipient.pk))
+        self.assertMembership(self.segment, 4)
+
+        delete_recipients(Recipient.objects.filter(email__in=["user1@example.com", "user2@example.com"]))
+        self.assertMembership(self.segment, 2)
+
+    def test_recipient_has_no_signal_receivers(self):
+        """Test deleting recipients, or the users owning them, is not slowed down by per-row receivers"""
+        self.assertFalse(pre_delete.has_listeners(Recipient))
+        self.assertFalse(post_save.has_listeners(Recipient))
+
+    def test_full_refresh_repairs_drift(self):
+        """Test a full refresh recounts and fixes the membership table"""
+        SegmentMembership.objects.filter(segment=self.segment).delete()
+        Segment.objects.filter(pk=self.segment.pk).update(member_count=99)
+
+        added, removed = refresh_segment(self.segment)
+
+        self.assertEqual((added, removed), (3, 0))
+        self.assertMembership(self.segment, 3)
+
+    def test_refresh_segments_command(self):
+        """Test the command reports each refreshed segment"""
+        out = StringIO()
+        call_command("refresh_segments", stdout=out)
+        self.assertIn("Segment Paris: 3 members", out.getvalue())
+
+
+class SegmentViewTest(TestCase):
+    """Test cases for the segment views and segment-targeted campaigns"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        self.template = EmailTemplate.objects.create(
+            user_profile=self.profile, name="Template", subject="Subject", body="Body"
+        )
+        for i in range(4):
+            Recipient.objects.create(
+                user_profile=self.profile, first_name=f"User{i}", last_name="Test",
+                email=f"user{i}@example.com", city="Paris" if i % 2 else "London",
+            )
+        self.client.login(username="testuser", password="testpass123")
+
+    def test_segment_create_view_saves_filter(self):
+        """Test the current recipient filter is saved as a segment"""
+        response = self.client.post(reverse("segment_create"), {"name": "London", "city": "London"})
+
+        self.assertRedirects(response, reverse("segment_list"))
+        segment = Segment.objects.get(user_profile=self.profile, name="London")
+        self.assertEqual(segment.filters, {"city": "London"})
+        self.assertEqual(segment.member_count, 2)
+
+        response = self.client.get(reverse("segment_list"))
+        self.assertContains(response, "London")
+
+    def test_campaign_targets_segment(self):
+        """Test a campaign sent to a segment gets one candidate per member"""
+        segment = create_segment(self.profile, "Paris", {"city": "Paris"})
+
+        response = self.client.post(reverse("campaign_create"), {
+            "name": "Segment campaign",
+            "template": self.template.id,
+            "scheduled_time": "2030-01-01T10:00",
+            "audience": "segment",
+            "segment": segment.id,
+        })
+
+        self.assertEqual(response.status_code, 302)
+        campaign = EmailCampaign.objects.get(name="Segment campaign")
+        self.assertEqual(campaign.segment, segment)
+        candidates = EmailSendCandidate.objects.filter(campaign=campaign)
+        self.assertEqual(sorted(c.recipient.email for c in candidates), ["user1@example.com", "user3@example.com"])
+
+    def test_campaign_rejects_foreign_segment(self):
+        """Test another user's segment cannot be targeted"""
+        other = User.objects.create_user(username="other", password="testpass123")
+        segment = create_segment(other.profile, "Theirs", {})
+
+        response = self.client.post(reverse("campaign_create"), {
+            "name": "Segment campaign",
+            "template": self.template.id,
+            "scheduled_time": "2030-01-01T10:00",
+            "audience": "segment",
+            "segment": segment.id,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(EmailCampaign.objects.filter(name="Segment campaign").exists())
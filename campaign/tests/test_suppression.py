@@ -0,0 +1,159 @@
+"""
+Unit tests for the suppression list.
+"""
+
+import json
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from campaign.audiences import create_candidates
+from campaign.models import (
+    EmailCampaign,
+    EmailEvent,
+    EmailLog,
+    EmailSendCandidate,
+    EmailTemplate,
+    Recipient,
+    SuppressedAddress,
+)
+from campaign.suppression import exclude_suppressed_candidates, suppress_addresses
+
+
+class SuppressionTest(TestCase):
+    """Test cases for suppression entries, candidate creation and sending"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        self.profile.smtp_host = "smtp.example.com"
+        self.profile.from_email = "sender@example.com"
+        self.profile.save()
+        self.other = User.objects.create_user(username="other", password="testpass123").profile
+        self.template = EmailTemplate.objects.create(
+            user_profile=self.profile, name="Template", subject="Subject", body="Hello {first_name}"
+        )
+        self.recipients = [
+            Recipient.objects.create(
+                user_profile=self.profile, first_name=f"User{i}", last_name="Test", email=f"User{i}@Example.com"
+            )
+            for i in range(4)
+        ]
+        self.campaign = EmailCampaign.objects.create(
+            user_profile=self.profile, name="Campaign", template=self.template, scheduled_time=timezone.now()
+        )
+
+    def test_candidate_query_excludes_user_and_global_entries(self):
+        """Test the send-time check applies the user's and global entries only"""
+        create_candidates(self.campaign, Recipient.objects.filter(user_profile=self.profile))
+        suppress_addresses(self.profile.id, ["user0@example.com"], "bounced")
+        suppress_addresses(None, ["user1@example.com"], "manual")
+        suppress_addresses(self.other.id, ["user2@example.com"], "complained")
+
+        candidates = exclude_suppressed_candidates(EmailSendCandidate.objects.all())
+
+        emails = candidates.values_list("recipient__email", flat=True)
+        self.assertEqual(sorted(emails), ["User2@Example.com", "User3@Example.com"])
+
+    def test_entries_are_stored_normalized(self):
+        """Test addresses entered as typed, e.g. in the admin, are stored normalized"""
+        SuppressedAddress(user_profile=self.profile, email=" User0@Example.com ").save()
+        self.assertEqual(SuppressedAddress.objects.get().email, "user0@example.com")
+
+        # Validated normalized too, so the admin reports a differently cased duplicate
+        with self.assertRaises(ValidationError):
+            SuppressedAddress(user_profile=self.profile, email="USER0@example.com").full_clean()
+
+    def test_duplicate_entries_are_ignored(self):
+        """Test adding an address twice keeps one entry"""
+        suppress_addresses(self.profile.id, ["user0@example.com", "USER0@example.com"], "bounced")
+        suppress_addresses(self.profile.id, ["user0@example.com"], "complained")
+        suppress_addresses(None, ["x@example.com"], "manual")
+        suppress_addresses(None, ["x@example.com"], "manual")
+
+        self.assertEqual(SuppressedAddress.objects.count(), 2)
+
+    def test_candidate_creation_skips_suppressed_addresses(self):
+        """Test suppressed recipients get no candidate"""
+        suppress_addresses(self.profile.id, ["user0@example.com"], "bounced")
+        suppress_addresses(None, ["user1@example.com"], "manual")
+
+        created = create_candidates(self.campaign, Recipient.objects.filter(user_profile=self.profile))
+
+        self.assertEqual(created, 2)
+        emails = EmailSendCandidate.objects.values_list("recipient__email", flat=True)
+        self.assertEqual(sorted(emails), ["User2@Example.com", "User3@Example.com"])
+
+    @patch('campaign.management.commands.send_emails.EmailMultiAlternatives.send')
+    def test_send_skips_addresses_suppressed_after_queueing(self, mock_send):
+        """Test addresses suppressed after queueing are skipped without sending or logging"""
+        create_candidates(self.campaign, Recipient.objects.filter(user_profile=self.profile))
+        suppress_addresses(self.profile.id, ["user0@example.com"], "complained")
+
+        call_command("send_emails")
+
+        self.assertEqual(mock_send.call_count, 3)
+        self.assertEqual(EmailLog.objects.count(), 3)
+        candidate = EmailSendCandidate.objects.get(recipient=self.recipients[0])
+        self.assertTrue(candidate.sent)
+        self.assertTrue(EmailEvent.objects.filter(email_candidate=candidate, event_type="suppressed").exists())
+
+    @patch('campaign.management.commands.send_emails.EmailMultiAlternatives.send')
+    def test_suppressed_candidates_do_not_take_up_the_batch(self, mock_send):
+        """Test suppressed candidates are skipped without using up the hourly limit"""
+        self.profile.max_emails_per_hour = 2
+        self.profile.save()
+        create_candidates(self.campaign, Recipient.objects.filter(user_profile=self.profile))
+        suppress_addresses(self.profile.id, ["user0@example.com", "user1@example.com"], "bounced")
+
+        call_command("send_emails")
+
+        self.assertEqual(mock_send.call_count, 2)
+        self.assertEqual(EmailEvent.objects.filter(event_type="suppressed").count(), 2)
+        self.assertFalse(EmailSendCandidate.objects.filter(sent=False).exists())
+
+
+class SuppressionWebhookTest(TestCase):
+    """Test cases for feeding the suppression list from bounce_webhook"""
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = user.profile
+        template = EmailTemplate.objects.create(user_profile=self.profile, name="T", subject="S", body="B")
+        recipient = Recipient.objects.create(
+            user_profile=self.profile, first_name="John", last_name="Doe", email="john@example.com"
+        )
+        self.candidate = EmailSendCandidate.objects.create(
+            user_profile=self.profile, recipient=recipient, template=template,
+            scheduled_time=timezone.now(), sent=True, sent_time=timezone.now(),
+        )
+
+    def post_bounce(self, **data):
+        data["tracking_id"] = str(self.candidate.tracking_id)
+        return self.client.post(reverse("email_bounce_webhook"), json.dumps(data), content_type="application/json")
+
+    def test_hard_bounce_and_complaint_suppress(self):
+        """Test hard bounces and complaints add the address for the sending user"""
+        self.post_bounce(event="bounced", bounce_type="hard")
+        self.post_bounce(event="complained")
+
+        entry = SuppressedAddress.objects.get()
+        self.assertEqual(entry.user_profile, self.profile)
+        self.assertEqual(entry.email, "john@example.com")
+        self.assertEqual(entry.reason, "bounced")
+
+    def test_soft_bounce_does_not_suppress(self):
+        """Test soft bounces are recorded but do not suppress the address"""
+        self.post_bounce(event="bounced", bounce_type="soft")
+        self.assertFalse(SuppressedAddress.objects.exists())
+
+    @override_settings(SUPPRESSION_GLOBAL=True)
+    def test_global_suppression(self):
+        """Test entries are global when SUPPRESSION_GLOBAL is set"""
+        self.post_bounce(event="complained")
+        self.assertIsNone(SuppressedAddress.objects.get().user_profile)
@@ -0,0 +1,127 @@
+"""
+Unit tests for the synthetic data generator.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db.models import Count, Min
+from django.test import TestCase, override_settings
+
+from campaign.models import (
+    CampaignStatistics, EmailEvent, EmailLog, EmailSendCandidate, Recipient, SendCounter, SuppressedAddress
+)
+from campaign.synthetic import _copy_value
+
+NOW = datetime(2026, 10, 1, tzinfo=dt_timezone.utc)
+
+
+def generate(**options):
+    options = {"tenants": 2, "recipients": 300, "campaigns": 3, "now": "2026-10-01", **options}
+    call_command("generate_data", stdout=StringIO(), **options)
+
+
+def snapshot():
+    return (
+        list(Recipient.objects.order_by("id").values_list("email", "first_name", "country", "company")),
+        list(
+            EmailSendCandidate.objects.order_by("id")
+            .values_list("recipient__email", "sent", "sent_time", "tracking_id", "campaign__scheduled_time")
+        ),
+        list(
+            EmailEvent.objects.order_by("id")
+            .values_list("email_candidate__tracking_id", "event_type", "timestamp", "metadata")
+        ),
+    )
+
+
+class GenerateDataCommandTest(TestCase):
+    """Test cases for the generate_data command"""
+
+    def test_same_seed_gives_same_data(self):
+        """Test a seed reproduces the same rows and another seed does not"""
+        generate(seed=3)
+        first = snapshot()
+        User.objects.filter(username__startswith="synthetic-").delete()
+
+        generate(seed=3)
+        self.assertEqual(snapshot(), first)
+
+        User.objects.filter(username__startswith="synthetic-").delete()
+        generate(seed=4)
+        self.assertNotEqual(snapshot()[0], first[0])
+
+    def test_realistic_history(self):
+        """Test domains, candidate states and events follow a plausible distribution"""
+        generate(recipients=2000)
+
+        domains = Recipient.objects.values_list("email", flat=True)
+        gmail = sum(email.endswith("@gmail.com") for email in domains)
+        self.assertTrue(0.2 < gmail / len(domains) < 0.45)
+        self.assertGreater(len({email.split("@")[1] for email in domains}), 100)
+
+        counts = dict(EmailEvent.objects.values_list("event_type").annotate(count=Count("id")))
+        self.assertGreater(counts["delivered"], 0.9 * counts["sent"])
+        self.assertTrue(0.1 * counts["sent"] < counts["opened"] < counts["sent"])
+        self.assertTrue(0 < counts["clicked"] < counts["opened"])
+        self.assertTrue(0 < counts["bounced"] < 0.05 * counts["sent"])
+        self.assertGreater(counts["failed"], 0)
+        self.assertFalse(EmailEvent.objects.filter(timestamp__gt=NOW).exists())
+        self.assertFalse(EmailSendCandidate.objects.filter(sent=True, sent_time__gt=NOW).exists())
+
+        # Opens come after the send and most of them within a day
+        sent_times = dict(
+            EmailEvent.objects.filter(event_type="sent").values_list("email_candidate_id", "timestamp")
+        )
+        first_opens = (
+            EmailEvent.objects.filter(event_type="opened").values("email_candidate_id")
+            .annotate(first=Min("timestamp")).values_list("email_candidate_id", "first")
+        )
+        delays = [(first - sent_times[candidate_id]).total_seconds() for candidate_id, first in first_opens]
+        self.assertTrue(all(delay > 0 for delay in delays))
+        self.assertGreater(sum(delay < 86400 for delay in delays), 0.8 * len(delays))
+
+        # Failed sends stay queued; hard bounces are suppressed
+        self.assertEqual(
+            EmailSendCandidate.objects.filter(sent=False).count(),
+            EmailSendCandidate.objects.filter(sent_time__isnull=True).count(),
+        )
+        hard_bounces = EmailEvent.objects.filter(event_type="bounced", metadata__bounce_type="hard")
+        self.assertEqual(
+            set(hard_bounces.values_list("email_candidate__recipient_email", flat=True)),
+            set(SuppressedAddress.objects.filter(reason="bounced").values_list("email", flat=True)),
+        )
+        self.assertEqual(EmailLog.objects.count(), counts["sent"] + counts["failed"])
+        self.assertEqual(sum(SendCounter.objects.values_list("sent", flat=True)), counts["sent"])
+        self.assertEqual(sum(CampaignStatistics.objects.values_list("sent_count", flat=True)), counts["sent"])
+
+    @override_settings(EMAIL_LOG_FROM_EVENTS=True)
+    def test_no_email_logs_when_derived_from_events(self):
+        """Test EMAIL_LOG_FROM_EVENTS leaves the EmailLog table empty"""
+        generate(tenants=1)
+
+        self.assertFalse(EmailLog.objects.exists())
+        self.assertTrue(EmailEvent.objects.filter(event_type="sent").exists())
+
+    def test_existing_users_are_refused(self):
+        """Test a second run with the same seed and prefix raises"""
+        generate(tenants=1, recipients=10, campaigns=1)
+
+        with self.assertRaisesMessage(CommandError, "already exist"):
+            generate(tenants=1, recipients=10, campaigns=1)
+
+
+class CopyValueTest(TestCase):
+    """Test cases for the COPY text format of bulk writes"""
+
+    def test_escapes_and_nulls(self):
+        """Test NULLs, JSON and control characters are written as COPY expects"""
+        event_field = EmailEvent._meta.get_field("metadata")
+        agent_field = EmailEvent._meta.get_field("user_agent")
+
+        self.assertEqual(_copy_value(agent_field, None), "\\N")
+        self.assertEqual(_copy_value(agent_field, "a\tb\\c\nd"), "a\\tb\\\\c\\nd")
+        self.assertEqual(_copy_value(event_field, {"url": "x"}), '{"url": "x"}')
+        self.assertEqual(_copy_value(EmailEvent._meta.get_field("timestamp"), NOW), "2026-10-01T00:00:00+00:00")
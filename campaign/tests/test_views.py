@@ -13,15 +13,22 @@ This module contains tests for all views in the campaign application:
 from datetime import timedelta
 
 from django.contrib.auth.models import User
+from django.db import connection
+from django.http import QueryDict
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
+from campaign.audiences import RECIPIENT_SEARCH_TABLE, filter_recipients_queryset
 from campaign.models import (
+    EmailCampaign,
+    EmailLog,
     EmailSendCandidate,
     EmailTemplate,
     Recipient,
 )
+from campaign.pagination import encode_cursor
 
 
 class ViewsTestCase(TestCase):
@@ -228,3 +235,227 @@ class ViewsTestCase(TestCase):
             (timezone.now() - candidate.scheduled_time).total_seconds(),
             5  # Within 5 seconds
         )
+
+
+class KeysetPaginationViewTest(TestCase):
+    """Test cases for keyset pagination of recipient_list and log_list"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        self.client.login(username='testuser', password='testpass123')
+
+    def walk_pages(self, url_name, context_name, params=None):
+        """Follow Next links until the last page, returning all rows seen"""
+        rows = []
+        query = params or {}
+        while True:
+            response = self.client.get(reverse(url_name), query)
+            self.assertEqual(response.status_code, 200)
+            rows.extend(response.context[context_name])
+            if not response.context['page'].has_next:
+                return rows, response
+            query = QueryDict(response.context['next_query'])
+
+    def test_recipient_list_pages_through_all_rows(self):
+        """Test every recipient appears exactly once across pages"""
+        for i in range(120):
+            Recipient.objects.create(
+                user_profile=self.profile, first_name="User", last_name=f"L{i % 7}", email=f"user{i}@example.com"
+            )
+
+        rows, last_response = self.walk_pages('recipient_list', 'recipients', {'order': 'last_name'})
+
+        self.assertEqual(len(rows), 120)
+        self.assertEqual(len({recipient.id for recipient in rows}), 120)
+        self.assertEqual([r.last_name for r in rows], sorted(r.last_name for r in rows))
+
+        # Going back from the last page returns the full previous page
+        response = self.client.get(
+            reverse('recipient_list'), QueryDict(last_response.context['previous_query'])
+        )
+        self.assertEqual(len(response.context['recipients']), 50)
+        self.assertEqual(response.context['recipients'], rows[50:100])
+
+    def test_log_list_filters_and_orders_by_sent_time(self):
+        """Test log_list filters by status and pages newest first with equal timestamps"""
+        now = timezone.now()
+        for i in range(60):
+            EmailLog.objects.create(
+                user_profile=self.profile,
+                recipient=f"user{i}@example.com",
+                status="Sent" if i % 3 else "Failed",
+                sent_time=now - timedelta(minutes=i // 2),
+            )
+
+        rows, _ = self.walk_pages('log_list', 'logs', {'status': 'Sent'})
+
+        self.assertEqual(len(rows), 40)
+        self.assertTrue(all(log.status == "Sent" for log in rows))
+        self.assertEqual(
+            [(log.sent_time, log.id) for log in rows],
+            sorted(((log.sent_time, log.id) for log in rows), reverse=True),
+        )
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        """Test cursors whose values do not fit the sort fields show the first page instead of failing"""
+        Recipient.objects.create(user_profile=self.profile, email="user@example.com")
+        EmailLog.objects.create(
+            user_profile=self.profile, recipient="user@example.com", status="Sent", sent_time=timezone.now()
+        )
+        cases = [
+            ("recipient_list", "recipients", ["abc"]),
+            ("recipient_list", "recipients", [{"a": 1}]),
+            ("log_list", "logs", ["yesterday", 1]),
+            ("log_list", "logs", [5, "abc"]),
+            ("log_list", "logs", [None, None]),
+        ]
+        for url_name, context_name, values in cases:
+            for direction in ("after", "before"):
+                with self.subTest(url_name=url_name, values=values, direction=direction):
+                    response = self.client.get(reverse(url_name), {direction: encode_cursor(values)})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.context[context_name]), 1)
+
+
+class CampaignAudienceTest(TestCase):
+    """Test cases for set-based candidate creation in campaign_create"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        self.template = EmailTemplate.objects.create(
+            user_profile=self.profile, name="Template", subject="Subject", body="Body"
+        )
+        self.recipients = [
+            Recipient.objects.create(
+                user_profile=self.profile,
+                first_name=f"User{i}",
+                last_name="Test",
+                email=f"user{i}@example.com",
+                city="NYC" if i % 2 else "London",
+            )
+            for i in range(10)
+        ]
+        other = User.objects.create_user(username="other", password="testpass123")
+        self.other_recipient = Recipient.objects.create(
+            user_profile=other.profile, first_name="Other", last_name="Test", email="other@example.com", city="NYC"
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def post_campaign(self, **data):
+        payload = {
+            'name': 'Campaign',
+            'template': self.template.id,
+            'scheduled_time': '2030-01-01T10:00',
+            'audience': 'selected',
+        }
+        payload.update(data)
+        return self.client.post(reverse('campaign_create'), payload)
+
+    def test_filter_audience_creates_candidates_in_database(self):
+        """Test targeting all filter matches creates one candidate per matching recipient"""
+        response = self.post_campaign(audience='filter', city='NYC')
+
+        self.assertEqual(response.status_code, 302)
+        candidates = EmailSendCandidate.objects.filter(campaign__name='Campaign')
+        self.assertEqual(candidates.count(), 5)
+        self.assertTrue(all(candidate.recipient.city == 'NYC' for candidate in candidates))
+        self.assertFalse(candidates.filter(recipient=self.other_recipient).exists())
+        self.assertEqual(len({candidate.tracking_id for candidate in candidates}), 5)
+        self.assertTrue(all(candidate.user_profile_id == self.profile.id for candidate in candidates))
+        self.assertTrue(all(candidate.template_id == self.template.id for candidate in candidates))
+
+    def test_invalid_filter_audience_creates_no_campaign(self):
+        """Test an invalid filter re-renders the form instead of falling back to the selected recipients"""
+        selected = ",".join(str(recipient.id) for recipient in self.recipients[:3])
+        response = self.post_campaign(audience='filter', email='not-an-address', recipients=selected)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('email', response.context['filter_form'].errors)
+        self.assertIn('audience', response.context['form'].errors)
+        self.assertFalse(EmailCampaign.objects.filter(name='Campaign').exists())
+        self.assertFalse(EmailSendCandidate.objects.exists())
+
+    def test_selected_audience_ignores_foreign_and_invalid_ids(self):
+        """Test posted IDs are scoped to the user and malformed values are skipped"""
+        ids = f"{self.recipients[0].id},{self.recipients[1].id},{self.other_recipient.id},,abc"
+
+        self.post_campaign(recipients=ids)
+
+        recipients = EmailSendCandidate.objects.values_list('recipient_id', flat=True)
+        self.assertEqual(sorted(recipients), [self.recipients[0].id, self.recipients[1].id])
+
+    def test_just_in_time_audience_stores_filter_without_candidates(self):
+        """Test a just-in-time campaign stores its filter and defers candidate creation"""
+        self.post_campaign(audience='filter', city='NYC', just_in_time='on')
+
+        campaign = EmailCampaign.objects.get(name='Campaign')
+        self.assertEqual(campaign.audience_filter['city'], 'NYC')
+        self.assertFalse(EmailSendCandidate.objects.exists())
+
+    def test_candidate_creation_query_count_is_independent_of_audience_size(self):
+        """Test the audience is inserted without loading recipients into Python"""
+        with CaptureQueriesContext(connection) as small:
+            self.post_campaign(audience='filter', city='London', name='Small')
+        for i in range(10, 60):
+            Recipient.objects.create(
+                user_profile=self.profile, first_name="More", last_name="Test", email=f"user{i}@example.com", city="London"
+            )
+        with CaptureQueriesContext(connection) as large:
+            self.post_campaign(audience='filter', city='London', name='Large')
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(EmailSendCandidate.objects.filter(campaign__name='Large').count(), 55)
+
+
+class RecipientSearchTest(TestCase):
+    """Test cases for indexed substring search in filter_recipients_queryset"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = self.user.profile
+        self.acme = Recipient.objects.create(
+            user_profile=self.profile, first_name="John", last_name="Doe", email="john@acme.com", company="Acme Corp"
+        )
+        self.tech = Recipient.objects.create(
+            user_profile=self.profile, first_name="Jane", last_name="Smith", email="jane@tech.io", company="TechCorp"
+        )
+        other = User.objects.create_user(username="other", password="testpass123")
+        Recipient.objects.create(
+            user_profile=other.profile, first_name="John", last_name="Doe", email="john@acme.com", company="Acme Corp"
+        )
+
+    def search(self, **filters):
+        return set(filter_recipients_queryset(self.profile, filters))
+
+    def test_substring_search_is_case_insensitive_and_tenant_scoped(self):
+        """Test substring matches on several columns only return the user's recipients"""
+        self.assertEqual(self.search(company="CORP"), {self.acme, self.tech})
+        self.assertEqual(self.search(company="corp", email="acme"), {self.acme})
+        self.assertEqual(self.search(last_name="mit"), {self.tech})
+        self.assertEqual(self.search(last_name="xyz"), set())
+
+    def test_search_index_follows_updates_and_deletes(self):
+        """Test the side index is kept in sync with the recipient table"""
+        self.tech.company = "Globex"
+        self.tech.save()
+        self.assertEqual(self.search(company="corp"), {self.acme})
+        self.assertEqual(self.search(company="glob"), {self.tech})
+
+        self.acme.delete()
+        self.assertEqual(self.search(company="corp"), set())
+
+    def test_short_terms_and_wildcards_are_matched_literally(self):
+        """Test terms the trigram index cannot serve still filter correctly"""
+        self.assertEqual(self.search(first_name="j"), {self.acme, self.tech})
+        self.assertEqual(self.search(email="@"), {self.acme, self.tech})
+        self.assertEqual(self.search(email="_"), set())
+        self.assertEqual(self.search(company="%Corp"), set())
+
+    def test_sqlite_search_uses_trigram_table(self):
+        """Test long terms are looked up in the FTS5 side table on SQLite"""
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        sql = str(filter_recipients_queryset(self.profile, {"company": "corp"}).query)
+        self.assertIn(RECIPIENT_SEARCH_TABLE, sql)
@@ -0,0 +1,238 @@
+"""
+Unit tests for the batch events webhook and address-only event lookups.
+"""
+
+import json
+import uuid
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from campaign.models import EmailEvent, EmailEventKey, EmailSendCandidate, EmailTemplate, Recipient, SuppressedAddress
+from campaign.webhooks import _sent_candidates_by_email, latest_sent_candidate
+
+
+class EventsWebhookTest(TestCase):
+    """Test cases for events_webhook"""
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = user.profile
+        self.template = EmailTemplate.objects.create(user_profile=self.profile, name="T", subject="S", body="B")
+        self.candidates = [self.make_candidate(i) for i in range(3)]
+
+    def make_candidate(self, i):
+        recipient = Recipient.objects.create(
+            user_profile=self.profile, first_name="User", last_name=str(i), email=f"user{i}@example.com"
+        )
+        return EmailSendCandidate.objects.create(
+            user_profile=self.profile, recipient=recipient, template=self.template,
+            scheduled_time=timezone.now(), sent=True, sent_time=timezone.now(),
+        )
+
+    def post(self, body, content_type="application/json"):
+        return self.client.post(reverse("email_events_webhook"), body, content_type=content_type)
+
+    def test_mixed_batch_reports_each_item(self):
+        """Test a JSON array of mixed events is recorded with per-item results"""
+        events = [
+            {"tracking_id": str(self.candidates[0].tracking_id), "event": "delivered"},
+            {"tracking_id": str(self.candidates[1].tracking_id), "event": "bounced", "bounce_type": "hard"},
+            {"email": "user2@example.com", "event": "complained"},
+            {"tracking_id": str(uuid.uuid4()), "event": "delivered"},
+            {"tracking_id": str(self.candidates[0].tracking_id), "event": "delivered"},
+            {"tracking_id": str(self.candidates[0].tracking_id), "event": "opened"},
+            "not an object",
+        ]
+
+        response = self.post(json.dumps(events))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [result["status"] for result in data["results"]],
+            ["recorded", "recorded", "recorded", "not_found", "duplicate", "invalid", "invalid"],
+        )
+        self.assertEqual(data["recorded"], 3)
+        self.assertEqual(
+            sorted(EmailEvent.objects.values_list("event_type", flat=True)), ["bounced", "complained", "delivered"]
+        )
+        self.assertEqual(
+            sorted(SuppressedAddress.objects.values_list("email", flat=True)),
+            ["user1@example.com", "user2@example.com"],
+        )
+
+    def test_ndjson_body(self):
+        """Test NDJSON bodies are accepted and deliveries are not recorded twice"""
+        EmailEvent.objects.create(
+            email_candidate=self.candidates[0], event_type="delivered",
+            idempotency_key=f"delivered:{self.candidates[0].id}",
+        )
+        body = "\n".join(
+            json.dumps({"tracking_id": str(candidate.tracking_id), "event": "delivered"})
+            for candidate in self.candidates
+        ) + "\n"
+
+        response = self.post(body, content_type="application/x-ndjson")
+
+        statuses = [result["status"] for result in response.json()["results"]]
+        self.assertEqual(statuses, ["duplicate", "recorded", "recorded"])
+        self.assertEqual(EmailEvent.objects.filter(event_type="delivered").count(), 3)
+
+    def test_invalid_body(self):
+        """Test a body that is neither JSON nor NDJSON is rejected"""
+        response = self.post("{not json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_is_independent_of_batch_size(self):
+        """Test a batch is resolved and written with a fixed number of queries"""
+        def batch(candidates):
+            return json.dumps([
+                {"tracking_id": str(candidate.tracking_id), "event": event}
+                for candidate in candidates for event in ("delivered", "bounced")
+            ] + [{"email": candidate.recipient.email, "event": "failed"} for candidate in candidates])
+
+        with CaptureQueriesContext(connection) as small:
+            self.post(batch(self.candidates[:1]))
+        more = [self.make_candidate(i) for i in range(3, 13)]
+        with CaptureQueriesContext(connection) as large:
+            self.post(batch(self.candidates[1:] + more))
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(EmailEvent.objects.count(), 3 * 13)
+
+
+class IdempotentEventTest(TestCase):
+    """Test cases for idempotency keys on provider events"""
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = user.profile
+        template = EmailTemplate.objects.create(user_profile=self.profile, name="T", subject="S", body="B")
+        recipient = Recipient.objects.create(user_profile=self.profile, email="user@example.com")
+        self.candidate = EmailSendCandidate.objects.create(
+            user_profile=self.profile, recipient=recipient, template=template,
+            scheduled_time=timezone.now(), sent=True, sent_time=timezone.now(),
+        )
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), json.dumps(payload), content_type="application/json")
+
+    def test_retried_bounce_is_recorded_once(self):
+        """Test the same bounce notification posted twice creates one event"""
+        payload = {"tracking_id": str(self.candidate.tracking_id), "event": "bounced", "bounce_type": "soft"}
+        self.post("email_bounce_webhook", payload)
+
+        with CaptureQueriesContext(connection) as retry:
+            response = self.post("email_bounce_webhook", payload)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(EmailEvent.objects.filter(event_type="bounced").count(), 1)
+        inserts = [query for query in retry.captured_queries if query["sql"].upper().startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+
+    def test_keys_are_claimed_by_the_insert(self):
+        """Test recording an event claims its key, and a retry finds it claimed"""
+        payload = {"tracking_id": str(self.candidate.tracking_id), "event": "delivered"}
+        self.post("email_delivery_webhook", payload)
+        self.post("email_delivery_webhook", payload)
+
+        event = EmailEvent.objects.get(event_type="delivered")
+        self.assertEqual(
+            list(EmailEventKey.objects.values_list("idempotency_key", "created_at")),
+            [(event.idempotency_key, event.timestamp)],
+        )
+
+    def test_provider_event_id_deduplicates(self):
+        """Test events sharing a provider event id are recorded once, even with different payloads"""
+        base = {"tracking_id": str(self.candidate.tracking_id), "event": "bounced", "sg_event_id": "abc123"}
+        self.post("email_bounce_webhook", dict(base, reason="first attempt"))
+        self.post("email_bounce_webhook", dict(base, reason="second attempt"))
+        response = self.post("email_events_webhook", [dict(base, reason="batched")])
+
+        self.assertEqual(response.json()["results"][0]["status"], "duplicate")
+        self.assertEqual(EmailEvent.objects.filter(event_type="bounced").count(), 1)
+
+    def test_distinct_events_are_kept(self):
+        """Test different events for the same candidate get different keys"""
+        tracking_id = str(self.candidate.tracking_id)
+        self.post("email_bounce_webhook", {"tracking_id": tracking_id, "event": "bounced", "reason": "full"})
+        self.post("email_bounce_webhook", {"tracking_id": tracking_id, "event": "bounced", "reason": "blocked"})
+        self.post("email_delivery_webhook", {"tracking_id": tracking_id, "event": "delivered"})
+        self.post("email_delivery_webhook", {"tracking_id": tracking_id, "event": "delivered", "timestamp": "later"})
+
+        self.assertEqual(EmailEvent.objects.filter(event_type="bounced").count(), 2)
+        self.assertEqual(EmailEvent.objects.filter(event_type="delivered").count(), 1)
+
+
+class EmailFallbackLookupTest(TestCase):
+    """Test cases for resolving events that only carry the recipient address"""
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        self.profile = user.profile
+        self.template = EmailTemplate.objects.create(user_profile=self.profile, name="T", subject="S", body="B")
+        self.recipient = Recipient.objects.create(
+            user_profile=self.profile, first_name="John", last_name="Doe", email="John@Example.com"
+        )
+        now = timezone.now()
+        self.older = self.make_candidate(now - timezone.timedelta(days=1), "news.example.org")
+        self.newer = self.make_candidate(now, "mail.example.net")
+
+    def make_candidate(self, sent_time, sender_domain):
+        return EmailSendCandidate.objects.create(
+            user_profile=self.profile, recipient=self.recipient, template=self.template,
+            scheduled_time=sent_time, sent=True, sent_time=sent_time, sender_domain=sender_domain,
+        )
+
+    def test_latest_sent_candidate_by_address(self):
+        """Test the lookup is case-insensitive, picks the newest send and needs no join"""
+        with CaptureQueriesContext(connection) as queries:
+            candidate = latest_sent_candidate("JOHN@example.com")
+
+        self.assertEqual(candidate, self.newer)
+        self.assertEqual(self.newer.recipient_email, "john@example.com")
+        self.assertNotIn("campaign_recipient", queries.captured_queries[0]["sql"])
+
+    def test_lookup_scoped_by_sending_domain(self):
+        """Test webhooks naming a sending domain match only emails sent from it"""
+        self.assertEqual(latest_sent_candidate("john@example.com", "news.example.org"), self.older)
+        self.assertIsNone(latest_sent_candidate("john@example.com", "other.example.com"))
+
+        response = self.client.post(
+            reverse("email_bounce_webhook"),
+            json.dumps({"email": "john@example.com", "sender": "news@News.Example.org", "event": "bounced"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(EmailEvent.objects.get().email_candidate, self.older)
+
+    def test_batch_lookup_scoped_by_sending_domain(self):
+        """Test batch events resolve addresses per sending domain"""
+        events = [
+            {"email": "john@example.com", "event": "failed"},
+            {"email": "john@example.com", "domain": "news.example.org", "event": "failed"},
+            {"email": "john@example.com", "domain": "other.example.com", "event": "failed"},
+        ]
+
+        response = self.client.post(reverse("email_events_webhook"), json.dumps(events), content_type="application/json")
+
+        self.assertEqual(
+            [result["status"] for result in response.json()["results"]], ["recorded", "recorded", "not_found"]
+        )
+        self.assertEqual(
+            sorted(EmailEvent.objects.values_list("email_candidate_id", flat=True)), sorted([self.older.id, self.newer.id])
+        )
+
+    def test_batch_lookup_reads_one_row_per_address_and_domain(self):
+        """Test only the newest send per address and sending domain is read back"""
+        for days in range(2, 7):
+            self.make_candidate(timezone.now() - timezone.timedelta(days=days), "news.example.org")
+
+        rows = _sent_candidates_by_email({"john@example.com"})["john@example.com"]
+
+        self.assertEqual([row["id"] for row in rows], [self.newer.id, self.older.id])
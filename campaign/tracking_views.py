@@ -1,14 +1,25 @@
 """
-Views for handling email tracking events: opens, clicks, and bounces.
+Views for handling email tracking events: opens, clicks, bounces and
+batches of provider events.
 """
+from django.core.exceptions import ValidationError
 from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from campaign import metrics
 from campaign.models import EmailSendCandidate, EmailEvent
+from campaign.suppression import should_suppress, suppress_addresses
+from campaign.webhooks import (
+    MAX_BATCH_EVENTS, WebhookPayloadError, build_event, event_sender_domain, latest_sent_candidate, parse_events,
+    process_events
+)
 import base64
 
+# 1x1 transparent GIF
+TRACKING_PIXEL = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
 
 def get_client_ip(request):
     """Extract client IP address from request."""
@@ -32,6 +43,7 @@ def tracking_pixel(request, tracking_id):
     Returns:
         1x1 transparent GIF image
     """
+    metrics.TRACKING_HITS.inc(kind="open")
     try:
         email_candidate = get_object_or_404(EmailSendCandidate, tracking_id=tracking_id)
 
@@ -56,12 +68,7 @@ def tracking_pixel(request, tracking_id):
         # Silently fail - don't break the email viewing experience
         pass
 
-    # Return a 1x1 transparent GIF
-    # Base64 encoded 1x1 transparent GIF
-    pixel = base64.b64decode(
-        'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
-    )
-    return HttpResponse(pixel, content_type='image/gif')
+    return HttpResponse(TRACKING_PIXEL, content_type='image/gif')
 
 
 @require_http_methods(["GET"])
@@ -77,6 +84,7 @@ def tracking_click(request, tracking_id):
         Redirect to the original URL
     """
     original_url = request.GET.get('url', '/')
+    metrics.TRACKING_HITS.inc(kind="click")
 
     try:
         email_candidate = get_object_or_404(EmailSendCandidate, tracking_id=tracking_id)
@@ -114,7 +122,8 @@ def bounce_webhook(request):
         "event": "bounced",
         "bounce_type": "hard|soft",
         "reason": "mailbox does not exist",
-        "email": "recipient@example.com"
+        "email": "recipient@example.com",
+        "domain": "sender-domain.com"   (optional, scopes the email lookup)
     }
 
     Returns:
@@ -133,15 +142,13 @@ def bounce_webhook(request):
         if tracking_id:
             try:
                 email_candidate = EmailSendCandidate.objects.get(tracking_id=tracking_id)
-            except EmailSendCandidate.DoesNotExist:
+            except (EmailSendCandidate.DoesNotExist, ValidationError, ValueError):
+                # An unknown or malformed tracking_id falls back to the address
                 pass
 
         if not email_candidate and recipient_email:
             # Try to find by recipient email (get the most recent one)
-            email_candidate = EmailSendCandidate.objects.filter(
-                recipient__email=recipient_email,
-                sent=True
-            ).order_by('-sent_time').first()
+            email_candidate = latest_sent_candidate(recipient_email, event_sender_domain(data))
 
         if email_candidate:
             # Determine event type
@@ -149,18 +156,15 @@ def bounce_webhook(request):
             if event_type not in ['bounced', 'complained', 'failed']:
                 event_type = 'bounced'
 
-            # Record the event
-            EmailEvent.objects.create(
-                email_candidate=email_candidate,
-                event_type=event_type,
-                metadata={
-                    'bounce_type': data.get('bounce_type', 'unknown'),
-                    'reason': data.get('reason', ''),
-                    'raw_data': data,
-                    'timestamp': timezone.now().isoformat()
-                }
+            # Record the event; a retried notification hits the unique idempotency key and is ignored
+            EmailEvent.objects.bulk_create(
+                [build_event(event_type, email_candidate.id, data)], ignore_conflicts=True
             )
 
+            # Hard bounces and complaints are never sent to again
+            if should_suppress(event_type, data.get('bounce_type')):
+                suppress_addresses(email_candidate.user_profile_id, [email_candidate.recipient.email], event_type)
+
             return JsonResponse({'status': 'success', 'message': 'Event recorded'})
         else:
             return JsonResponse(
@@ -204,29 +208,18 @@ def delivery_webhook(request):
         if tracking_id:
             try:
                 email_candidate = EmailSendCandidate.objects.get(tracking_id=tracking_id)
-            except EmailSendCandidate.DoesNotExist:
+            except (EmailSendCandidate.DoesNotExist, ValidationError, ValueError):
+                # An unknown or malformed tracking_id falls back to the address
                 pass
 
         if not email_candidate and recipient_email:
-            email_candidate = EmailSendCandidate.objects.filter(
-                recipient__email=recipient_email,
-                sent=True
-            ).order_by('-sent_time').first()
+            email_candidate = latest_sent_candidate(recipient_email, event_sender_domain(data))
 
         if email_candidate:
-            # Check if not already recorded
-            if not EmailEvent.objects.filter(
-                email_candidate=email_candidate,
-                event_type='delivered'
-            ).exists():
-                EmailEvent.objects.create(
-                    email_candidate=email_candidate,
-                    event_type='delivered',
-                    metadata={
-                        'raw_data': data,
-                        'timestamp': timezone.now().isoformat()
-                    }
-                )
+            # Recorded once per candidate: repeats hit the unique idempotency key and are ignored
+            EmailEvent.objects.bulk_create(
+                [build_event('delivered', email_candidate.id, data)], ignore_conflicts=True
+            )
 
             return JsonResponse({'status': 'success', 'message': 'Delivery recorded'})
         else:
@@ -240,3 +233,39 @@ def delivery_webhook(request):
             {'status': 'error', 'message': str(e)},
             status=400
         )
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def events_webhook(request):
+    """
+    Handle a batch of delivery, bounce and complaint events.
+
+    The body is a JSON array of events, a single event object, or NDJSON
+    with one event per line. Events have the same fields as those posted to
+    bounce_webhook and delivery_webhook, with "event" selecting the type:
+    [
+        {"tracking_id": "uuid-here", "event": "delivered"},
+        {"email": "recipient@example.com", "event": "bounced", "bounce_type": "hard"}
+    ]
+
+    Returns:
+        JSON response with one result per event, in request order
+    """
+    try:
+        items = parse_events(request.body)
+    except WebhookPayloadError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    if len(items) > MAX_BATCH_EVENTS:
+        return JsonResponse(
+            {'status': 'error', 'message': f'At most {MAX_BATCH_EVENTS} events per request'},
+            status=413
+        )
+
+    results = process_events(items)
+    return JsonResponse({
+        'status': 'success',
+        'recorded': sum(1 for result in results if result['status'] == 'recorded'),
+        'results': results,
+    })
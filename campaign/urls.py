@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
-from . import tracking_views
+from . import async_tracking_views, tracking_views
+
+# Async views under ASGI (settings.TRACKING_ASYNC); same URLs and responses
+tracking = async_tracking_views if settings.TRACKING_ASYNC else tracking_views
 
 urlpatterns = [
     path("", views.home, name="home"),  # Home page
@@ -12,19 +16,28 @@ urlpatterns = [
     path("logs/", views.log_list, name="log_list"),
     path("recipients/", views.recipient_list, name="recipient_list"),
     path("recipients/upload/", views.recipient_upload, name="recipient_upload"),
+    path("recipients/imports/<int:job_id>/", views.recipient_import_detail, name="recipient_import_detail"),
+    path("recipients/imports/<int:job_id>/status/", views.recipient_import_status, name="recipient_import_status"),
+    path("segments/", views.segment_list, name="segment_list"),
+    path("segments/create/", views.segment_create, name="segment_create"),
     path("emails/", views.email_list, name="email_list"),
     path("email_send_candidate/<int:pk>/send_now/", views.send_email_now, name="send_email_now"),
     path("emails/create/", views.email_create, name="email_create"),
     path("campaigns/", views.campaign_list, name="campaign_list"),
     path("campaigns/create/", views.campaign_create, name="campaign_create"),
     path("profile/edit/", views.edit_profile, name="edit_profile"),
+    path("exports/<str:kind>/", views.export_data, name="export_data"),
 
     # Email tracking endpoints
-    path("track/pixel/<uuid:tracking_id>/", tracking_views.tracking_pixel, name="email_tracking_pixel"),
-    path("track/click/<uuid:tracking_id>/", tracking_views.tracking_click, name="email_tracking_click"),
-    path("track/bounce/", tracking_views.bounce_webhook, name="email_bounce_webhook"),
-    path("track/delivery/", tracking_views.delivery_webhook, name="email_delivery_webhook"),
+    path("track/pixel/<uuid:tracking_id>/", tracking.tracking_pixel, name="email_tracking_pixel"),
+    path("track/click/<uuid:tracking_id>/", tracking.tracking_click, name="email_tracking_click"),
+    path("track/bounce/", tracking.bounce_webhook, name="email_bounce_webhook"),
+    path("track/delivery/", tracking.delivery_webhook, name="email_delivery_webhook"),
+    path("track/events/", tracking.events_webhook, name="email_events_webhook"),
 
     # Campaign statistics
     path("campaigns/<int:campaign_id>/statistics/", views.campaign_statistics, name="campaign_statistics"),
+
+    # Prometheus metrics
+    path("metrics", views.metrics_view, name="metrics"),
 ]
@@ -1,14 +1,41 @@
-import csv
-import io
+import hmac
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db.models import Count, Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 
-from .forms import EmailCampaignForm, EmailForm, EmailTemplateForm, RecipientFilterForm, RecipientUploadForm, UserProfileForm
-from .models import EmailCampaign, EmailLog, EmailSendCandidate, EmailTemplate, Recipient, UserProfile, EmailEvent, CampaignStatistics
+from .forms import (
+    EmailCampaignForm, EmailForm, EmailLogFilterForm, EmailTemplateForm, RecipientFilterForm,
+    RecipientListFilterForm, RecipientUploadForm, SegmentForm, UserProfileForm
+)
+from .models import (
+    EmailCampaign, EmailSendCandidate, EmailTemplate, Recipient,
+    UserProfile, EmailEvent, CampaignStatistics, RecipientImportJob, Segment, email_logs
+)
+from . import metrics
+from .counters import quota_windows, send_attempts
+from .audiences import create_candidates, filter_recipients_queryset, parse_recipient_ids
+from .exports import EXPORT_COLUMNS, EXPORT_FORMATS, export_filename, iter_export
+from .importers import import_recipients, iter_csv_rows
+from .pagination import cursor_querystring, paginate_keyset
+from .segments import create_segment, segment_recipients
+
+# Keyset orderings; each ends with a unique column and is backed by an index
+RECIPIENT_ORDERINGS = {
+    "id": ("id",),
+    "-id": ("-id",),
+    "email": ("email", "id"),
+    "last_name": ("last_name", "id"),
+}
+LOG_ORDERINGS = {
+    "-sent_time": ("-sent_time", "-id"),
+    "sent_time": ("sent_time", "id"),
+}
 
 
 @login_required
@@ -16,18 +43,24 @@ def home(request):
     user_profile = request.user.profile
     recipient_count = Recipient.objects.filter(user_profile=user_profile).count()
     template_count = EmailTemplate.objects.filter(user_profile=user_profile).count()
-    email_count = EmailSendCandidate.objects.filter(user_profile=user_profile).count()
-    email_sent_count = EmailSendCandidate.objects.filter(user_profile=user_profile, sent=True).count()
-    email_pending_count = EmailSendCandidate.objects.filter(user_profile=user_profile, sent=False).count()
-    email_log_count = EmailLog.objects.filter(user_profile=user_profile).count()
+    # One pass over the user's emails for all three counts
+    email_counts = EmailSendCandidate.objects.filter(user_profile=user_profile).aggregate(
+        total=Count("id"), sent_total=Count("id", filter=Q(sent=True)), pending_total=Count("id", filter=Q(sent=False))
+    )
+    email_log_count = email_logs().filter(user_profile=user_profile).count()
+    # Sending windows are sums over the per-minute send counters
+    windows = quota_windows(timezone.now())
 
     context = {
         "recipient_count": recipient_count,
         "template_count": template_count,
-        "email_count": email_count,
-        "email_sent_count": email_sent_count,
-        "email_pending_count": email_pending_count,
+        "email_count": email_counts["total"],
+        "email_sent_count": email_counts["sent_total"],
+        "email_pending_count": email_counts["pending_total"],
         "email_log_count": email_log_count,
+        "emails_last_hour": send_attempts(windows["max_emails_per_hour"], user_profile),
+        "emails_today": send_attempts(windows["max_emails_per_day"], user_profile),
+        "emails_this_month": send_attempts(windows["max_emails_per_month"], user_profile),
     }
     return render(request, "home.html", context)
 
@@ -54,7 +87,9 @@ def template_create(request):
 
 @login_required
 def queue_list(request):
-    queues = EmailSendCandidate.objects.filter(user_profile=request.user.profile, sent=False)
+    queues = EmailSendCandidate.objects.filter(
+        user_profile=request.user.profile, sent=False
+    ).select_related("recipient", "template")
     return render(request, "queue_list.html", {"queues": queues})
 
 
@@ -77,8 +112,32 @@ def queue_create(request):
 
 @login_required
 def log_list(request):
-    logs = EmailLog.objects.filter(user_profile=request.user.profile)
-    return render(request, "log_list.html", {"logs": logs})
+    logs = email_logs().filter(user_profile=request.user.profile).select_related("campaign")
+    ordering = LOG_ORDERINGS["-sent_time"]
+
+    filter_form = EmailLogFilterForm(request.GET, user_profile=request.user.profile)
+    if filter_form.is_valid():
+        filters = filter_form.cleaned_data
+        if filters.get("status"):
+            logs = logs.filter(status=filters["status"])
+        if filters.get("recipient"):
+            logs = logs.filter(recipient=filters["recipient"])
+        if filters.get("campaign"):
+            logs = logs.filter(campaign=filters["campaign"])
+        if filters.get("sent_after"):
+            logs = logs.filter(sent_time__gte=filters["sent_after"])
+        if filters.get("sent_before"):
+            logs = logs.filter(sent_time__lt=filters["sent_before"])
+        ordering = LOG_ORDERINGS.get(filters.get("order"), ordering)
+
+    page = paginate_keyset(logs, ordering, after=request.GET.get("after"), before=request.GET.get("before"))
+    return render(request, "log_list.html", {
+        "logs": page.object_list,
+        "page": page,
+        "filter_form": filter_form,
+        "next_query": cursor_querystring(request.GET, after=page.next_cursor),
+        "previous_query": cursor_querystring(request.GET, before=page.previous_cursor),
+    })
 
 
 @login_required
@@ -93,42 +152,108 @@ def recipient_upload(request):
                 messages.error(request, "This is not a CSV file")
                 return redirect("recipient_upload")
 
-            # Read the file
-            data_set = csv_file.read().decode("UTF-8")
-            io_string = io.StringIO(data_set)
-            next(io_string)  # Skip the header row
-
-            for row in csv.reader(io_string, delimiter=",", quotechar='"'):
-                _, created = Recipient.objects.update_or_create(
+            # Large files are queued for the process_imports worker instead of
+            # being imported inside the request
+            if csv_file.size > settings.RECIPIENT_IMPORT_SYNC_MAX_SIZE:
+                job = RecipientImportJob.objects.create(
                     user_profile=request.user.profile,
-                    email=row[3],
-                    defaults={
-                        "first_name": row[0],
-                        "last_name": row[1],
-                        "company": row[2],
-                        "country": row[4],
-                        "city": row[5],
-                        "free_field1": row[6],
-                        "free_field2": row[7],
-                        "free_field3": row[8],
-                    },
+                    file=csv_file,
+                    original_name=csv_file.name,
+                    file_size=csv_file.size,
                 )
-            messages.success(request, "Recipients imported successfully")
+                messages.success(request, "Recipient import queued")
+                return redirect("recipient_import_detail", job_id=job.id)
+
+            # Decode and upsert the file incrementally instead of reading it into memory
+            result = import_recipients(request.user.profile, iter_csv_rows(csv_file))
+            messages.success(request, f"Recipients imported successfully ({result})")
+            for line_number, error in result.errors[:10]:
+                messages.warning(request, f"Line {line_number}: {error}")
             return redirect("recipient_list")
     else:
         form = RecipientUploadForm()
     return render(request, "recipient_upload.html", {"form": form})
 
 
+@login_required
+def recipient_import_detail(request, job_id):
+    job = get_object_or_404(RecipientImportJob, id=job_id, user_profile=request.user.profile)
+    return render(request, "recipient_import.html", {"job": job})
+
+
+@login_required
+def recipient_import_status(request, job_id):
+    """
+    Progress of a recipient import job, polled by the import page.
+    """
+    job = get_object_or_404(RecipientImportJob, id=job_id, user_profile=request.user.profile)
+    return JsonResponse({
+        "id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "rows_done": job.rows_done,
+        "inserted": job.inserted_count,
+        "updated": job.updated_count,
+        "failed": job.failed_count,
+        "errors": job.errors,
+        "error_message": job.error_message,
+    })
+
+
 @login_required
 def recipient_list(request):
     recipients = Recipient.objects.filter(user_profile=request.user.profile)
-    return render(request, "recipient_list.html", {"recipients": recipients})
+    ordering = RECIPIENT_ORDERINGS["id"]
+
+    filter_form = RecipientListFilterForm(request.GET)
+    if filter_form.is_valid():
+        recipients = filter_recipients(request, filter_form.cleaned_data)
+        ordering = RECIPIENT_ORDERINGS.get(filter_form.cleaned_data.get("order"), ordering)
+
+    page = paginate_keyset(recipients, ordering, after=request.GET.get("after"), before=request.GET.get("before"))
+    return render(request, "recipient_list.html", {
+        "recipients": page.object_list,
+        "page": page,
+        "filter_form": filter_form,
+        "next_query": cursor_querystring(request.GET, after=page.next_cursor),
+        "previous_query": cursor_querystring(request.GET, before=page.previous_cursor),
+    })
+
+
+@login_required
+def segment_list(request):
+    segments = Segment.objects.filter(user_profile=request.user.profile).order_by("name")
+    return render(request, "segment_list.html", {"segments": segments})
+
+
+@login_required
+def segment_create(request):
+    """
+    Save the posted recipient filter as a segment.
+    """
+    if request.method != "POST":
+        return redirect("segment_list")
+    user_profile = request.user.profile
+    form = SegmentForm(request.POST)
+    filter_form = RecipientFilterForm(request.POST)
+    if form.is_valid() and filter_form.is_valid():
+        name = form.cleaned_data["name"]
+        if Segment.objects.filter(user_profile=user_profile, name=name).exists():
+            messages.error(request, f"A segment named {name} already exists")
+            return redirect("segment_list")
+        filters = {field: value for field, value in filter_form.cleaned_data.items() if value}
+        segment = create_segment(user_profile, name, filters)
+        messages.success(request, f"Segment {segment.name} saved with {segment.member_count} recipients")
+    else:
+        messages.error(request, "Please provide a name for the segment")
+    return redirect("segment_list")
 
 
 @login_required
 def email_list(request):
-    emails = EmailSendCandidate.objects.filter(user_profile=request.user.profile, sent=False)
+    emails = EmailSendCandidate.objects.filter(
+        user_profile=request.user.profile, sent=False
+    ).select_related("recipient", "template")
     return render(request, "email_list.html", {"emails": emails})
 
 
@@ -151,37 +276,44 @@ def email_create(request):
 
 @login_required
 def campaign_create(request):
+    user_profile = request.user.profile
     if request.method == "POST":
-        form = EmailCampaignForm(request.POST)
+        form = EmailCampaignForm(request.POST, user_profile=user_profile)
         filter_form = RecipientFilterForm(request.POST)
+        if form.is_valid() and form.cleaned_data["audience"] == "filter" and not filter_form.is_valid():
+            # Never fall back to another audience; show the filter errors instead
+            form.add_error("audience", "The recipient filter is invalid; correct it below.")
         if form.is_valid():
             campaign = form.save(commit=False)
-            campaign.user_profile = request.user.profile
+            campaign.user_profile = user_profile
+            audience = form.cleaned_data["audience"]
+            segment = form.cleaned_data["segment"] if audience == "segment" else None
+            filter_audience = audience == "filter"
+            campaign.segment = segment
+            if (filter_audience or segment) and form.cleaned_data["just_in_time"]:
+                # send_emails creates candidates batch by batch from the segment or stored filter
+                campaign.audience_filter = segment.filters if segment else filter_form.cleaned_data
+                campaign.save()
+                messages.success(request, "Campaign created; recipients will be queued while sending")
+                return redirect("campaign_list")
             campaign.save()
-            recipient_ids = request.POST.get("recipients", "")
-            recipient_ids_list = recipient_ids.split(",")
-            recipients = Recipient.objects.filter(
-                user_profile=request.user.profile,
-                id__in=recipient_ids_list
-            )
-            email_send_candidates = [
-                EmailSendCandidate(
-                    user_profile=request.user.profile,
-                    campaign=campaign,
-                    recipient=recipient,
-                    template=campaign.template,
-                    scheduled_time=campaign.scheduled_time,
+            if segment:
+                recipients = segment_recipients(segment)
+            elif filter_audience:
+                # Everyone matching the filter, without posting or loading their IDs
+                recipients = filter_recipients(request, filter_form.cleaned_data)
+            else:
+                recipients = Recipient.objects.filter(
+                    user_profile=user_profile,
+                    id__in=parse_recipient_ids(request.POST.get("recipients", "")),
                 )
-                for recipient in recipients
-            ]
-            EmailSendCandidate.objects.bulk_create(email_send_candidates)
+            created = create_candidates(campaign, recipients)
+            messages.success(request, f"Campaign created with {created} recipients")
             return redirect("campaign_list")
     else:
-        form = EmailCampaignForm()
-        # Filter template choices by user profile
-        form.fields['template'].queryset = EmailTemplate.objects.filter(user_profile=request.user.profile)
+        form = EmailCampaignForm(user_profile=user_profile)
         filter_form = RecipientFilterForm()
-        recipients = Recipient.objects.filter(user_profile=request.user.profile)
+        recipients = Recipient.objects.filter(user_profile=user_profile)
 
     # Handle filtering
     if request.method == "GET" and "filter" in request.GET:
@@ -210,31 +342,14 @@ def campaign_create(request):
 
 @login_required
 def filter_recipients(request, filters):
-    qs = Recipient.objects.filter(user_profile=request.user.profile)
-    if filters.get("first_name"):
-        qs = qs.filter(first_name__icontains=filters["first_name"])
-    if filters.get("last_name"):
-        qs = qs.filter(last_name__icontains=filters["last_name"])
-    if filters.get("company"):
-        qs = qs.filter(company__icontains=filters["company"])
-    if filters.get("email"):
-        qs = qs.filter(email__icontains=filters["email"])
-    if filters.get("country"):
-        qs = qs.filter(country__icontains=filters["country"])
-    if filters.get("city"):
-        qs = qs.filter(city__icontains=filters["city"])
-    if filters.get("free_field1"):
-        qs = qs.filter(free_field1__icontains=filters["free_field1"])
-    if filters.get("free_field2"):
-        qs = qs.filter(free_field2__icontains=filters["free_field2"])
-    if filters.get("free_field3"):
-        qs = qs.filter(free_field3__icontains=filters["free_field3"])
-    return qs
+    return filter_recipients_queryset(request.user.profile, filters)
 
 
 @login_required
 def campaign_list(request):
-    campaigns = EmailCampaign.objects.filter(user_profile=request.user.profile)
+    campaigns = EmailCampaign.objects.filter(user_profile=request.user.profile).select_related(
+        "template"
+    ).annotate(recipient_count=Count("recipients"))
     return render(request, "campaign_list.html", {"campaigns": campaigns})
 
 
@@ -320,3 +435,55 @@ def campaign_statistics(request, campaign_id):
     }
 
     return render(request, 'campaign_statistics.html', context)
+
+
+@login_required
+def export_data(request, kind):
+    """
+    Stream the user's recipients, email logs or email events as CSV or NDJSON.
+
+    Query parameters: format (csv|ndjson), gzip (1 to compress), campaign (id).
+    """
+    export_format = request.GET.get("format", "csv")
+    if kind not in EXPORT_COLUMNS or export_format not in EXPORT_FORMATS:
+        raise Http404("Unknown export")
+    compress = request.GET.get("gzip") in ("1", "true")
+
+    campaign_id = request.GET.get("campaign")
+    if campaign_id:
+        if not campaign_id.isdigit():
+            raise Http404("Unknown campaign")
+        campaign_id = get_object_or_404(EmailCampaign, id=campaign_id, user_profile=request.user.profile).id
+
+    content_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    if compress:
+        content_type = "application/gzip"
+    response = StreamingHttpResponse(
+        iter_export(request.user.profile, kind, export_format, compress=compress, campaign_id=campaign_id),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="{export_filename(kind, export_format, compress)}"'
+    return response
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics in the text exposition format.
+
+    Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>"; when
+    no token is configured only logged-in staff users may read the metrics.
+    """
+    if settings.METRICS_TOKEN:
+        supplied = request.META.get("HTTP_AUTHORIZATION", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied.encode(), settings.METRICS_TOKEN.encode()):
+            return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+    elif not request.user.is_staff:
+        return HttpResponse("Forbidden", status=403, content_type="text/plain")
+
+    due = (
+        EmailSendCandidate.objects.filter(sent=False, scheduled_time__lte=timezone.now())
+        .values("user_profile_id").annotate(pending=Count("id")).order_by()
+    )
+    queue_depth = [({"tenant": row["user_profile_id"]}, row["pending"]) for row in due]
+    gauges = [("djangomailer_queue_depth", "Emails due to be sent, per tenant", queue_depth)]
+    return HttpResponse(metrics.render(gauges), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,345 @@
+"""
+Batch processing of delivery, bounce and complaint events posted by email
+service providers.
+
+A batch is resolved and written with a fixed number of queries regardless
+of its size: one IN query for tracking IDs, one for email-only events (on
+the denormalized EmailSendCandidate.recipient_email), one for events already
+recorded and one conflict-ignoring bulk_create for the new events. Every
+event carries an idempotency key that the database claims in EmailEventKey
+on insert, so concurrent retries of the same webhook never create duplicate
+rows.
+"""
+import hashlib
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from campaign import metrics
+from campaign.models import EmailEvent, EmailSendCandidate
+from campaign.suppression import normalize_email, should_suppress, suppress_addresses
+
+# Event types accepted from providers
+WEBHOOK_EVENT_TYPES = ("delivered", "bounced", "complained", "failed")
+
+# Payload fields holding the provider's own event id (generic, SendGrid, Mailgun)
+PROVIDER_EVENT_ID_FIELDS = ("event_id", "sg_event_id", "id")
+
+# Largest batch accepted in one request
+MAX_BATCH_EVENTS = 10000
+
+
+class WebhookPayloadError(ValueError):
+    """Raised when a request body is neither JSON nor NDJSON."""
+
+
+def parse_events(body):
+    """
+    Decode a webhook body into a list of event items.
+
+    Accepts a JSON array, a single JSON object, or NDJSON (one object per line).
+    Items that are not JSON objects are kept, and reported as invalid later.
+    """
+    try:
+        text = body.decode("utf-8") if isinstance(body, bytes) else body
+    except UnicodeDecodeError as e:
+        raise WebhookPayloadError(f"Body is not UTF-8: {e}")
+    try:
+        data = json.loads(text)
+    except ValueError:
+        try:
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        except ValueError as e:
+            raise WebhookPayloadError(f"Body is neither JSON nor NDJSON: {e}")
+    return data if isinstance(data, list) else [data]
+
+
+def address_domain(address):
+    """Lowercase domain part of an email address, or "" if there is none."""
+    return address.rpartition("@")[2].strip().lower() if address and "@" in address else ""
+
+
+def event_sender_domain(item):
+    """
+    Sending domain a webhook event is scoped to, from its "domain" field or
+    the address in its "sender" field; "" when the event names neither.
+    """
+    domain = item.get("domain")
+    if isinstance(domain, str) and domain:
+        return domain.strip().lower()
+    sender = item.get("sender")
+    return address_domain(sender) if isinstance(sender, str) else ""
+
+
+def latest_sent_candidate(email, sender_domain=""):
+    """
+    The most recently sent candidate for an address, for events without a tracking_id.
+
+    Served by the partial (recipient_email, sent_time) index; no join on Recipient.
+
+    Args:
+        email: Recipient address from the webhook payload
+        sender_domain: Optional sending domain to restrict the match to
+
+    Returns:
+        EmailSendCandidate or None
+    """
+    return _sent_candidates_newest_first(email, sender_domain).first()
+
+
+async def alatest_sent_candidate(email, sender_domain=""):
+    """Async version of latest_sent_candidate()."""
+    return await _sent_candidates_newest_first(email, sender_domain).afirst()
+
+
+def _sent_candidates_newest_first(email, sender_domain):
+    candidates = EmailSendCandidate.objects.filter(sent=True, recipient_email=normalize_email(email))
+    if sender_domain:
+        candidates = candidates.filter(sender_domain=sender_domain)
+    return candidates.order_by("-sent_time")
+
+
+def _parse_tracking_id(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def process_events(items):
+    """
+    Record a batch of webhook events.
+
+    Args:
+        items: List of event dicts with "event" and "tracking_id" and/or "email"
+
+    Returns:
+        List with one result dict per item, in input order, each holding the
+        item's index and a status of "recorded", "duplicate", "not_found" or
+        "invalid"
+    """
+    results = [{"index": index, "status": "invalid"} for index in range(len(items))]
+    pending = []  # (index, item, event_type, tracking_id)
+    for index, item in enumerate(items):
+        try:
+            event_type, tracking_id = _validate_event(item)
+        except WebhookPayloadError as e:
+            results[index]["message"] = str(e)
+            continue
+        pending.append((index, item, event_type, tracking_id))
+
+    resolved = _resolve_candidates(pending, results)
+    events, suppressions = _build_events(resolved, results)
+
+    # Only reports duplicates; the database prevents them (see campaign.partitions on PostgreSQL)
+    seen = set(
+        EmailEvent.objects.filter(idempotency_key__in=list(events)).values_list("idempotency_key", flat=True)
+    ) if events else set()
+    new_events = []
+    for key, (index, event) in events.items():
+        if key in seen:
+            results[index]["status"] = "duplicate"
+        else:
+            results[index]["status"] = "recorded"
+            new_events.append(event)
+
+    with transaction.atomic():
+        EmailEvent.objects.bulk_create(new_events, ignore_conflicts=True)
+        for (user_profile_id, reason), emails in suppressions.items():
+            suppress_addresses(user_profile_id, emails, reason)
+    return results
+
+
+def _validate_event(item):
+    """
+    The event type and parsed tracking_id of a batch item.
+
+    Raises:
+        WebhookPayloadError: If the item cannot be recorded
+    """
+    if not isinstance(item, dict):
+        raise WebhookPayloadError("Event must be a JSON object")
+    event_type = item.get("event", "bounced")
+    if event_type not in WEBHOOK_EVENT_TYPES:
+        raise WebhookPayloadError(f"Unknown event type: {event_type}")
+    tracking_id = _parse_tracking_id(item["tracking_id"]) if item.get("tracking_id") else None
+    if not isinstance(item.get("email", ""), str):
+        raise WebhookPayloadError("email must be a string")
+    if tracking_id is None and not item.get("email"):
+        raise WebhookPayloadError("Event needs a valid tracking_id or an email")
+    return event_type, tracking_id
+
+
+def _resolve_candidates(pending, results):
+    """
+    The candidate of each pending item, with two queries for the whole batch;
+    items without one are marked "not_found" in `results`.
+
+    Returns:
+        List of (index, item, event_type, candidate) tuples
+    """
+    by_tracking_id = _candidates_by_tracking_id({tracking_id for _, _, _, tracking_id in pending if tracking_id})
+    unresolved_emails = {
+        normalize_email(item["email"]) for _, item, _, tracking_id in pending
+        if item.get("email") and by_tracking_id.get(tracking_id) is None
+    }
+    by_email = _sent_candidates_by_email(unresolved_emails)
+
+    resolved = []
+    for index, item, event_type, tracking_id in pending:
+        candidate = by_tracking_id.get(tracking_id)
+        if candidate is None and item.get("email"):
+            candidate = _latest_for_domain(by_email.get(normalize_email(item["email"]), []), event_sender_domain(item))
+        if candidate is None:
+            results[index].update(status="not_found", message="Email candidate not found")
+            continue
+        resolved.append((index, item, event_type, candidate))
+    return resolved
+
+
+def _build_events(resolved, results):
+    """
+    Unsaved events for the resolved items, one per idempotency key; repeats
+    within the batch are marked "duplicate" in `results`.
+
+    Returns:
+        (events, suppressions): idempotency key -> (index, event), and
+        (user_profile_id, reason) -> addresses to suppress
+    """
+    events = {}
+    suppressions = defaultdict(set)
+    for index, item, event_type, candidate in resolved:
+        event = build_event(event_type, candidate["id"], item)
+        if event.idempotency_key in events:
+            results[index]["status"] = "duplicate"
+            continue
+        events[event.idempotency_key] = (index, event)
+        if should_suppress(event_type, item.get("bounce_type")):
+            suppressions[(candidate["user_profile_id"], event_type)].add(candidate["email"])
+    return events, suppressions
+
+
+def event_idempotency_key(event_type, candidate_id, item):
+    """
+    Deduplication key of a provider event.
+
+    Deliveries are recorded once per candidate. Other events use the
+    provider's event id when the payload has one, and otherwise a hash of
+    the payload, so a retried webhook maps to the same key.
+    """
+    if event_type == "delivered":
+        return f"delivered:{candidate_id}"
+    provider_id = next((item[field] for field in PROVIDER_EVENT_ID_FIELDS if item.get(field)), None)
+    if provider_id is not None:
+        return "provider:" + hashlib.sha256(str(provider_id).encode()).hexdigest()
+    payload = json.dumps(item, sort_keys=True, default=str)
+    return f"{event_type}:" + hashlib.sha256(f"{candidate_id}:{payload}".encode()).hexdigest()
+
+
+def provider_event_time(item):
+    """
+    When the provider says an event happened, from its "timestamp" field as a
+    Unix time or an ISO 8601 string; None when missing or unreadable.
+    """
+    value = item.get("timestamp")
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str):
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            return None
+        if moment is not None and timezone.is_naive(moment):
+            moment = timezone.make_aware(moment, dt_timezone.utc)
+        return moment
+    return None
+
+
+def build_event(event_type, candidate_id, item):
+    """
+    Unsaved EmailEvent for a provider event, with its idempotency key set.
+
+    Save it with bulk_create(..., ignore_conflicts=True) so that a retry is a
+    single INSERT that the unique constraint turns into a no-op.
+    """
+    received = timezone.now()
+    occurred = provider_event_time(item)
+    if occurred is not None:
+        metrics.EVENT_FLUSH_LAG_SECONDS.observe(max((received - occurred).total_seconds(), 0))
+    now = received.isoformat()
+    if event_type == "delivered":
+        metadata = {"raw_data": item, "timestamp": now}
+    else:
+        metadata = {
+            "bounce_type": item.get("bounce_type", "unknown"),
+            "reason": item.get("reason", ""),
+            "raw_data": item,
+            "timestamp": now,
+        }
+    return EmailEvent(
+        email_candidate_id=candidate_id,
+        event_type=event_type,
+        metadata=metadata,
+        idempotency_key=event_idempotency_key(event_type, candidate_id, item),
+    )
+
+
+def _candidates_by_tracking_id(tracking_ids):
+    if not tracking_ids:
+        return {}
+    rows = EmailSendCandidate.objects.filter(tracking_id__in=tracking_ids).values(
+        "id", "tracking_id", "user_profile_id", email=F("recipient__email")
+    )
+    return {row["tracking_id"]: row for row in rows}
+
+
+def _sent_candidates_by_email(emails):
+    """
+    The most recently sent candidate of each address and sending domain,
+    most recent first per address.
+
+    Only those rows are read back, however many emails an address was sent:
+    DISTINCT ON on PostgreSQL, a ROW_NUMBER() window elsewhere.
+    """
+    if not emails:
+        return {}
+    sent = EmailSendCandidate.objects.filter(recipient_email__in=emails, sent=True)
+    fields = ("id", "user_profile_id", "sender_domain", "sent_time")
+    if connection.features.can_distinct_on_fields:
+        latest = sent.order_by("recipient_email", "sender_domain", "-sent_time").distinct(
+            "recipient_email", "sender_domain"
+        )
+    else:
+        latest = sent.annotate(recency=Window(
+            RowNumber(), partition_by=[F("recipient_email"), F("sender_domain")], order_by=F("sent_time").desc()
+        )).filter(recency=1)
+    by_email = defaultdict(list)
+    for row in latest.values(*fields, email=F("recipient_email")):
+        by_email[row["email"]].append(row)
+    for rows in by_email.values():
+        rows.sort(key=_sent_time_key, reverse=True)
+    return by_email
+
+
+def _sent_time_key(row):
+    # Rows without a sent_time sort as the oldest
+    return (row["sent_time"] is not None, row["sent_time"] or 0)
+
+
+def _latest_for_domain(candidates, sender_domain):
+    for candidate in candidates:
+        if not sender_domain or candidate["sender_domain"] == sender_domain:
+            return candidate
+    return None
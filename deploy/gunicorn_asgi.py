@@ -0,0 +1,20 @@
+"""
+Gunicorn settings for serving djangoMailer under ASGI with Uvicorn workers:
+
+    gunicorn -c deploy/gunicorn_asgi.py djangoMailer.asgi:application
+
+Each worker runs one event loop that serves many requests at a time. The
+ASGI entry point routes tracking to the async views, which answer opens and
+clicks without waiting for the database and write their events in batches,
+so a few workers absorb open storms that would need dozens of sync workers.
+Pages and the admin keep working; Django runs their sync views in a thread.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+timeout = 30
+# Room for the lifespan shutdown to write the queued tracking events
+graceful_timeout = 30
@@ -12,5 +12,28 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djangoMailer.settings")
+# Serve opens, clicks and webhooks with the async tracking views
+os.environ.setdefault("TRACKING_ASYNC", "true")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from campaign.event_writer import drain_event_writer  # noqa: E402 (needs the app registry)
+
+
+async def application(scope, receive, send):
+    """
+    Django's ASGI handler, plus the lifespan protocol Django does not speak,
+    so that a server shutting down gracefully waits for queued tracking events
+    to be written.
+    """
+    if scope["type"] != "lifespan":
+        await django_application(scope, receive, send)
+        return
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await drain_event_writer()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
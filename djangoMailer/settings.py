@@ -98,6 +98,33 @@ CRONJOBS = [
         ["send_emails"],
         {"stdout": ">> /path/to/logs/send_emails.log", "stderr": ">> /path/to/logs/send_emails_errors.log"},
     ),
+    (
+        "* * * * *",
+        "django.core.management.call_command",
+        ["process_imports"],
+        {"stdout": ">> /path/to/logs/process_imports.log", "stderr": ">> /path/to/logs/process_imports_errors.log"},
+    ),
+    (
+        "30 3 * * *",
+        "django.core.management.call_command",
+        ["refresh_segments"],
+        {"stdout": ">> /path/to/logs/refresh_segments.log", "stderr": ">> /path/to/logs/refresh_segments_errors.log"},
+    ),
+    (
+        "15 2 * * *",
+        "django.core.management.call_command",
+        ["manage_event_partitions"],
+        {
+            "stdout": ">> /path/to/logs/manage_event_partitions.log",
+            "stderr": ">> /path/to/logs/manage_event_partitions_errors.log",
+        },
+    ),
+    (
+        "45 2 * * 0",
+        "django.core.management.call_command",
+        ["archive_events"],
+        {"stdout": ">> /path/to/logs/archive_events.log", "stderr": ">> /path/to/logs/archive_events_errors.log"},
+    ),
 ]
 
 CSRF_TRUSTED_ORIGINS = [
@@ -169,6 +196,9 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = os.environ.get("STATIC_ROOT", BASE_DIR / "staticfiles")
 
+# Uploaded files (queued recipient imports)
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", BASE_DIR / "media")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -210,3 +240,43 @@ CACHES = {
 # SITE_URL is used for generating tracking pixel and click tracking URLs
 # Set this to your production domain (e.g., https://yourdomain.com)
 SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+
+# Recipient CSV uploads larger than this (in bytes) are imported in the
+# background by the process_imports command instead of inside the request
+RECIPIENT_IMPORT_SYNC_MAX_SIZE = int(os.environ.get('RECIPIENT_IMPORT_SYNC_MAX_SIZE', 1024 * 1024))
+
+# Put hard-bounced and complaining addresses on the suppression list of every
+# user instead of only the user whose email bounced
+SUPPRESSION_GLOBAL = os.environ.get('SUPPRESSION_GLOBAL', 'False').lower() in ('true', '1', 'yes')
+
+# Days of EmailEvent history kept on PostgreSQL; manage_event_partitions drops
+# monthly partitions that only hold older events. 0 keeps everything.
+EVENT_RETENTION_DAYS = int(os.environ.get('EVENT_RETENTION_DAYS', 0))
+
+# Email events from months that ended more than EVENT_ARCHIVE_DAYS ago are
+# moved by archive_events into compressed files under EVENT_ARCHIVE_ROOT
+EVENT_ARCHIVE_DAYS = int(os.environ.get('EVENT_ARCHIVE_DAYS', 180))
+EVENT_ARCHIVE_ROOT = os.environ.get('EVENT_ARCHIVE_ROOT', BASE_DIR / 'archive')
+
+# Serve email logs from the campaign_emaillog_derived view over sent/failed
+# EmailEvents instead of writing an EmailLog row for every send. Derived logs
+# go with their events, when they are archived or their recipient is deleted
+EMAIL_LOG_FROM_EVENTS = os.environ.get('EMAIL_LOG_FROM_EVENTS', 'False').lower() in ('true', '1', 'yes')
+
+# Prometheus metrics: every process adds its samples to the SQLite file
+# METRICS_DB at most once per METRICS_FLUSH_INTERVAL seconds, and /metrics
+# renders it. With METRICS_TOKEN set, scrapers send it as a Bearer token;
+# otherwise only staff users can read the metrics.
+METRICS_DB = os.environ.get('METRICS_DB', BASE_DIR / 'metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Route the tracking URLs to the async views in campaign.async_tracking_views.
+# Only for ASGI servers; djangoMailer/asgi.py turns it on by default. Opens
+# and clicks are queued and written by a background task in batches of up to
+# TRACKING_WRITE_BATCH_SIZE, gathered for TRACKING_WRITE_INTERVAL seconds;
+# once TRACKING_WRITE_QUEUE_SIZE hits are waiting, requests write their own.
+TRACKING_ASYNC = os.environ.get('TRACKING_ASYNC', 'False').lower() in ('true', '1', 'yes')
+TRACKING_WRITE_BATCH_SIZE = int(os.environ.get('TRACKING_WRITE_BATCH_SIZE', 500))
+TRACKING_WRITE_INTERVAL = float(os.environ.get('TRACKING_WRITE_INTERVAL', 0.05))
+TRACKING_WRITE_QUEUE_SIZE = int(os.environ.get('TRACKING_WRITE_QUEUE_SIZE', 10000))
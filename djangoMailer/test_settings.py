@@ -2,6 +2,9 @@
 Test settings for djangoMailer project.
 """
 
+import os
+import tempfile
+
 from .settings import *  # noqa
 
 # Use SQLite for testing
@@ -26,3 +29,6 @@ SECRET_KEY = 'test-secret-key-for-testing'
 
 # Debug mode
 DEBUG = True
+
+# Keep test metrics out of the project's metrics file
+METRICS_DB = os.path.join(tempfile.gettempdir(), f'djangomailer-test-metrics-{os.getpid()}.sqlite3')